@@ -0,0 +1,365 @@
+"""
+Offline batch grader for answer dumps (paper exam imports, historical regrades, policy
+experiments) that runs the same grading engine as the API, without a server or a database.
+
+Questions are read from a JSONL or CSV file (id, question_type, points, correct_answer and,
+optionally, reference_answers and options; in CSV these two hold JSON). Answers are streamed
+from another JSONL or CSV file (question_id and answer, plus any other fields such as
+student_id, which are copied to the output). Chunks of answers are graded across a process
+pool, at most two chunks per worker in flight, so memory stays flat however large the dump
+is. Grades are written in input order, as JSONL or CSV depending on the output's extension,
+with the grading tier and the keyword, semantic and string scores of each answer. An answer
+that cannot be graded (unknown question, malformed question data) gets the reason in its
+error field instead, and the run goes on. Questions are validated before any worker starts:
+an invalid question (unknown type, bad points, unreadable JSON) is reported on stderr and
+each of its answers gets the reason as its error.
+
+After each chunk is written, a checkpoint records how many answers are done and how long the
+output is. Running the same command again after an interruption truncates the output to the
+checkpoint and resumes from the next answer. The checkpoint is removed once the run completes.
+
+Examples:
+    python batch_grade.py --questions questions.jsonl --answers answers.csv --output grades.jsonl
+
+    # Policy experiment: grade a past exam under other thresholds, 8 processes
+    python batch_grade.py --questions q.jsonl --answers a.jsonl --output trial.csv \\
+        --policy policy.json --workers 8
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Grading needs no database, but importing the models configures one
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+# Fields of the output records besides the input fields
+GRADE_FIELDS = ["is_correct", "points_earned", "points_possible", "tier", "keyword", "semantic", "string", "error"]
+
+# Set in each worker process by _init_worker
+_questions: Dict[str, Any] = {}
+_invalid_questions: Dict[str, str] = {}
+_policy = None
+_include_feedback = False
+
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream the records of a JSONL or CSV file (by extension)"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def question_fields(record: Dict[str, Any]) -> Dict[str, Any]:
+    """The Question fields of a question record; raises ValueError if the record is invalid"""
+    from models import QuestionType
+
+    question_types = [question_type.value for question_type in QuestionType]
+    if record.get("question_type") not in question_types:
+        raise ValueError(f"question_type must be one of {', '.join(question_types)}, "
+                         f"not {record.get('question_type')!r}")
+    try:
+        points = float(record.get("points") or 1.0)
+    except (TypeError, ValueError):
+        raise ValueError(f"points must be a number, not {record.get('points')!r}")
+    if not math.isfinite(points) or points < 0:
+        raise ValueError(f"points must be a non-negative number, not {record.get('points')!r}")
+
+    fields = {
+        "id": record["id"],
+        "question_type": record["question_type"],
+        "points": points,
+        "correct_answer": record.get("correct_answer") or None,
+        "reference_answers": record.get("reference_answers") or None,
+        "options": record.get("options") or None,
+    }
+    for key in ("reference_answers", "options"):
+        # CSV cells hold the JSON of list fields
+        if isinstance(fields[key], str):
+            try:
+                fields[key] = json.loads(fields[key])
+            except ValueError as e:
+                raise ValueError(f"{key} is not valid JSON: {e}")
+        if fields[key] is not None and not isinstance(fields[key], list):
+            raise ValueError(f"{key} must be a list")
+    if fields["options"] and not all(isinstance(option, dict) for option in fields["options"]):
+        raise ValueError("options must be objects with an id")
+    if fields["reference_answers"] and not all(isinstance(answer, str) for answer in fields["reference_answers"]):
+        raise ValueError("reference_answers must be strings")
+    return fields
+
+
+def load_questions(path: str) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+    """
+    Question fields by question id (as a string, since CSV ids are strings), and the reason
+    each invalid question was rejected, by question id
+    """
+    questions, invalid = {}, {}
+    for line, record in enumerate(read_records(path), start=1):
+        if record.get("id") in (None, ""):
+            print(f"Question record {line} has no id, skipped", file=sys.stderr)
+            continue
+        question_id = str(record["id"])
+        try:
+            questions[question_id] = question_fields(record)
+        except ValueError as e:
+            invalid[question_id] = str(e)
+            print(f"Question {question_id} is invalid, its answers will not be graded: {e}", file=sys.stderr)
+    return questions, invalid
+
+
+def _init_worker(questions: Dict[str, Dict[str, Any]], invalid_questions: Dict[str, str],
+                 policy_config: Optional[Dict[str, Any]], answer_budget_ms: Optional[float], include_feedback: bool):
+    """Build the questions and the policy once per worker process"""
+    global _questions, _invalid_questions, _policy, _include_feedback
+    from config import settings
+    from grading.policy import compile_policy
+    from models import Question, QuestionType
+
+    # Offline grading waits for every stage unless a budget is given
+    settings.GRADING_ANSWER_BUDGET_MS = answer_budget_ms or float("inf")
+    _questions = {
+        question_id: Question(**{**fields, "question_type": QuestionType(fields["question_type"])})
+        for question_id, fields in questions.items()
+    }
+    _invalid_questions = invalid_questions
+    _policy = compile_policy(policy_config)
+    _include_feedback = include_feedback
+
+
+def _grade_pairs(pairs: List[tuple]) -> List[Any]:
+    """Grades of (question, answer) pairs, or the exception raised for the pairs that failed"""
+    from grading.engine import grading_engine
+
+    try:
+        return grading_engine.grade_batch(pairs, _policy)
+    except Exception:
+        # Grade one by one to find the failing answers, so the rest of the chunk is still graded
+        grades = []
+        for question, answer in pairs:
+            try:
+                grades.append(grading_engine.grade(question, answer, _policy))
+            except Exception as e:
+                grades.append(e)
+        return grades
+
+
+def grade_chunk(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Grade a chunk of answer records with the grading engine (runs in a worker process)"""
+    known = [record for record in records if str(record.get("question_id")) in _questions]
+    grades = iter(_grade_pairs(
+        [(_questions[str(record["question_id"])], record.get("answer") or "") for record in known]
+    ))
+
+    output = []
+    for record in records:
+        row = {key: value for key, value in record.items() if key != "answer"}
+        question = _questions.get(str(record.get("question_id")))
+        if question is None:
+            reason = _invalid_questions.get(str(record.get("question_id")))
+            row["error"] = f"invalid question: {reason}" if reason else "unknown question"
+            output.append(row)
+            continue
+
+        grade = next(grades)
+        if isinstance(grade, Exception):
+            row["error"] = f"{type(grade).__name__}: {grade}"
+            output.append(row)
+            continue
+
+        scores = grade.scores or {}
+        row.update({
+            "is_correct": grade.is_correct,
+            "points_earned": grade.points_earned,
+            "points_possible": question.points,
+            "tier": scores.get("tier", "choice"),
+            "keyword": scores.get("keyword"),
+            "semantic": scores.get("semantic"),
+            "string": scores.get("string"),
+        })
+        if _include_feedback:
+            row["feedback"] = grade.feedback
+        output.append(row)
+    return output
+
+
+def chunked(records: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Checkpoint:
+    """Number of answers graded and output size after the last completed chunk"""
+
+    def __init__(self, path: str, answers_path: str):
+        self.path = path
+        self.answers_path = os.path.abspath(answers_path)
+        self.records = 0
+        self.output_bytes = 0
+
+    def load(self) -> bool:
+        """Read an existing checkpoint of the same answers file (False if there is none)"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            state = json.load(f)
+        if state.get("answers") != self.answers_path:
+            raise SystemExit(f"Checkpoint {self.path} belongs to {state.get('answers')}; use --restart to discard it")
+        self.records = state["records"]
+        self.output_bytes = state["output_bytes"]
+        return True
+
+    def save(self, records: int, output_bytes: int):
+        self.records = records
+        self.output_bytes = output_bytes
+        # Written to a temporary file and renamed, so an interruption never leaves half a checkpoint
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump({"answers": self.answers_path, "records": records, "output_bytes": output_bytes}, f)
+        os.replace(temporary, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class OutputWriter:
+    """Appends graded records to a JSONL or CSV file (by extension)"""
+
+    def __init__(self, path: str, resume_at: int, include_feedback: bool):
+        self.is_csv = path.endswith(".csv")
+        # Anything written after the checkpoint is discarded and written again
+        self.file = open(path, "r+" if resume_at else "w", newline="", encoding="utf-8")
+        self.file.truncate(resume_at)
+        self.file.seek(resume_at)
+        self.include_feedback = include_feedback
+        self.csv_writer = None
+
+    def write(self, rows: List[Dict[str, Any]]):
+        if not self.is_csv:
+            self.file.writelines(json.dumps(row, default=str) + "\n" for row in rows)
+            return
+        if self.csv_writer is None:
+            # Columns: the input fields of the first record, then the grade fields
+            input_fields = [key for key in rows[0] if key not in GRADE_FIELDS and key != "feedback"]
+            fieldnames = input_fields + GRADE_FIELDS + (["feedback"] if self.include_feedback else [])
+            self.csv_writer = csv.DictWriter(self.file, fieldnames=fieldnames, extrasaction="ignore")
+            if self.file.tell() == 0:
+                self.csv_writer.writeheader()
+        self.csv_writer.writerows(rows)
+
+    def flush(self) -> int:
+        """Flush to disk and return the output's size"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    questions, invalid_questions = load_questions(args.questions)
+    policy_config = None
+    if args.policy:
+        with open(args.policy) as f:
+            policy_config = json.load(f)
+        # Fail on an invalid policy before any worker starts
+        from grading.policy import compile_policy
+        compile_policy(policy_config)
+
+    checkpoint = Checkpoint(args.checkpoint or f"{args.output}.checkpoint", args.answers)
+    if args.restart:
+        checkpoint.remove()
+    elif checkpoint.load():
+        print(f"Resuming after {checkpoint.records} answers", file=sys.stderr)
+
+    records = read_records(args.answers)
+    # Answers graded before the interruption are skipped
+    for _ in islice(records, checkpoint.records):
+        pass
+
+    writer = OutputWriter(args.output, checkpoint.output_bytes, args.feedback)
+    done = checkpoint.records
+    graded_now = 0
+    tiers = Counter()
+    start = last_report = time.perf_counter()
+    pending = deque()
+    chunks = chunked(records, args.chunk_size)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=_init_worker,
+            initargs=(questions, invalid_questions, policy_config, args.answer_budget_ms, args.feedback)
+        ) as pool:
+            while True:
+                # Keep at most two chunks per worker in flight; results are written in input order
+                while len(pending) < 2 * args.workers:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    pending.append(pool.submit(grade_chunk, chunk))
+                if not pending:
+                    break
+
+                rows = pending.popleft().result()
+                writer.write(rows)
+                done += len(rows)
+                graded_now += len(rows)
+                tiers.update(row.get("tier") or "error" for row in rows)
+                checkpoint.save(done, writer.flush())
+
+                now = time.perf_counter()
+                if now - last_report >= args.progress_interval:
+                    print(f"{done} answers graded ({graded_now / (now - start):.1f}/s)", file=sys.stderr)
+                    last_report = now
+    finally:
+        writer.close()
+
+    checkpoint.remove()
+    elapsed = time.perf_counter() - start
+    return {
+        "answers": done,
+        "graded_this_run": graded_now,
+        "elapsed_seconds": round(elapsed, 2),
+        "answers_per_second": round(graded_now / elapsed, 1) if elapsed > 0 else None,
+        "workers": args.workers,
+        "invalid_questions": len(invalid_questions),
+        "tiers": dict(tiers.most_common()),
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Grade a dump of answers offline with the grading engine")
+    parser.add_argument("--questions", required=True, help="Questions file (.jsonl or .csv)")
+    parser.add_argument("--answers", required=True, help="Answers file (.jsonl or .csv), streamed")
+    parser.add_argument("--output", required=True, help="Grades file (.jsonl or .csv)")
+    parser.add_argument("--policy", default=None, help="JSON file with a grading policy (default policy if omitted)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Grading processes")
+    parser.add_argument("--chunk-size", type=int, default=200, help="Answers per task sent to a worker")
+    parser.add_argument("--answer-budget-ms", type=float, default=None,
+                        help="Time budget per answer (default: none, every stage runs)")
+    parser.add_argument("--feedback", action="store_true", help="Include the feedback text in the output")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and start over")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress lines")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    summary = run(parse_args())
+    print(json.dumps(summary, indent=2))
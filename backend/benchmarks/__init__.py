@@ -0,0 +1,5 @@
+"""
+Benchmarks for the Online Exam System backend.
+
+Run from the backend directory, e.g. `python -m benchmarks.serialization`.
+"""
@@ -0,0 +1,107 @@
+"""
+Benchmark: near-duplicate screening of one question's answers across cohort sizes.
+
+Generates a cohort of descriptive answers drawn from a shared topic vocabulary (so unrelated
+answers still overlap a little), where 5% of the students copied another student's answer
+and changed a few words. Compares MinHash/LSH screening with the exact all-pairs Jaccard
+scan it replaces, and reports the share of copied pairs found. The all-pairs SequenceMatcher
+time is measured on a sample of pairs and extrapolated.
+
+    python -m benchmarks.plagiarism --sizes 500 1000 2000 5000
+"""
+import argparse
+import os
+import random
+import time
+from difflib import SequenceMatcher
+from itertools import combinations
+from typing import List, Set, Tuple
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from grading.plagiarism import find_near_duplicates, jaccard, shingles
+
+TOPIC_WORDS = (
+    "photosynthesis light energy chlorophyll plants convert carbon dioxide water glucose oxygen "
+    "leaves chloroplast sunlight absorb produce release process cells stored chemical reaction "
+    "stomata roots transport sugar respiration green pigment wavelength electrons membrane cycle"
+).split()
+FILLER_WORDS = "the a of and in to is which by from this that it their with as".split()
+
+
+def make_cohort(size: int, copy_rate: float = 0.05, seed: int = 7) -> Tuple[List[Tuple[int, str]], Set[Tuple[int, int]]]:
+    """Answers and the (original, copy) pairs that were planted"""
+    rng = random.Random(seed)
+    answers: List[Tuple[int, str]] = []
+    planted: Set[Tuple[int, int]] = set()
+    for submission_id in range(1, size + 1):
+        if answers and rng.random() < copy_rate:
+            original_id, original = rng.choice(answers)
+            words = original.split()
+            # Change a few words, as a student disguising a copy would
+            for _ in range(max(1, len(words) // 15)):
+                words[rng.randrange(len(words))] = rng.choice(TOPIC_WORDS)
+            answers.append((submission_id, " ".join(words)))
+            planted.add((original_id, submission_id))
+        else:
+            length = rng.randint(30, 60)
+            words = [rng.choice(TOPIC_WORDS) if rng.random() < 0.6 else rng.choice(FILLER_WORDS) for _ in range(length)]
+            answers.append((submission_id, " ".join(words)))
+    return answers, planted
+
+
+def exact_scan(answers: List[Tuple[int, str]], threshold: float) -> Set[Tuple[int, int]]:
+    """All-pairs Jaccard: the quadratic baseline (with the same shingles)"""
+    shingle_sets = [(submission_id, shingles(text)) for submission_id, text in answers]
+    return {
+        (id_a, id_b)
+        for (id_a, set_a), (id_b, set_b) in combinations(shingle_sets, 2)
+        if jaccard(set_a, set_b) >= threshold
+    }
+
+
+def sequence_matcher_estimate(answers: List[Tuple[int, str]], samples: int = 2000) -> float:
+    """Seconds an all-pairs SequenceMatcher scan would take, from a random sample of pairs"""
+    rng = random.Random(1)
+    started = time.perf_counter()
+    for _ in range(samples):
+        (_, text_a), (_, text_b) = rng.sample(answers, 2)
+        SequenceMatcher(None, text_a, text_b).ratio()
+    per_pair = (time.perf_counter() - started) / samples
+    return per_pair * len(answers) * (len(answers) - 1) / 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 1000, 2000, 5000])
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--exact-limit", type=int, default=2000,
+                        help="largest cohort for which the exact all-pairs Jaccard scan is run")
+    args = parser.parse_args()
+
+    print(f"{'students':>8} {'minhash/lsh':>12} {'exact jaccard':>14} {'seqmatcher (est.)':>18} "
+          f"{'planted found':>14} {'exact found':>12}")
+    for size in args.sizes:
+        answers, planted = make_cohort(size)
+
+        started = time.perf_counter()
+        found = {tuple(pair["submission_ids"]) for pair in find_near_duplicates(answers, args.threshold)}
+        lsh_seconds = time.perf_counter() - started
+
+        if size <= args.exact_limit:
+            started = time.perf_counter()
+            exact = exact_scan(answers, args.threshold)
+            exact_seconds = f"{time.perf_counter() - started:13.2f}s"
+            # Recall against the exact scan: every pair above the threshold, planted or not
+            exact_recall = f"{len(found & exact) / len(exact) * 100:11.1f}%" if exact else f"{'-':>12}"
+        else:
+            exact_seconds = f"{'skipped':>14}"
+            exact_recall = f"{'-':>12}"
+
+        planted_recall = len(found & planted) / len(planted) * 100 if planted else 100.0
+        print(f"{size:8d} {lsh_seconds:11.2f}s {exact_seconds} {sequence_matcher_estimate(answers):17.1f}s "
+              f"{planted_recall:13.1f}% {exact_recall}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Accuracy check: semantic similarity on quantized embeddings vs. float32.
+
+For every (reference, student answer) pair, compares the float32 cosine similarity that
+get_semantic_similarity computes without the store against the similarity computed on
+float16 and int8 vectors, and checks whether the grade band of the combined score
+(thresholds 0.85 / 0.70 / 0.55 / 0.35, semantic weight 0.5) changes for any pair. The last
+column is the largest distance from a threshold of a pair whose grade changed: changes are
+confined to pairs whose float32 score already sits within the quantization error of a
+threshold, i.e. the thresholds themselves do not shift.
+
+Pairs come from the database (short answer and descriptive submissions) with --from-db.
+Without sentence-transformers, or with --synthetic, random 384-dimensional vectors with
+similarities spread over [0, 1] stand in for MiniLM embeddings.
+
+    python -m benchmarks.quantization --synthetic --pairs 20000
+    python -m benchmarks.quantization --from-db
+"""
+import argparse
+import os
+from typing import List, Tuple
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import numpy as np
+
+from grading.quantization import paired_cosine_similarity, quantize
+
+THRESHOLDS = (0.35, 0.55, 0.7, 0.85)
+
+
+def grade_band(scores: np.ndarray) -> np.ndarray:
+    return np.searchsorted(THRESHOLDS, scores, side="right")
+
+
+def synthetic_pairs(pairs: int, dim: int = 384) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Reference/answer embeddings with target similarities uniform in [0, 1], plus other score parts"""
+    rng = np.random.default_rng(42)
+    references = rng.normal(size=(pairs, dim)).astype(np.float32)
+    noise = rng.normal(size=(pairs, dim)).astype(np.float32)
+    # Remove the component of the noise along the reference, then mix to the target angle
+    references /= np.linalg.norm(references, axis=1, keepdims=True)
+    noise -= (noise * references).sum(axis=1, keepdims=True) * references
+    noise /= np.linalg.norm(noise, axis=1, keepdims=True)
+    target = rng.uniform(0, 1, size=(pairs, 1)).astype(np.float32)
+    answers = references * target + noise * np.sqrt(1 - target ** 2)
+    # Embedding magnitudes vary in practice; quantization must not depend on them
+    answers *= rng.uniform(0.5, 3.0, size=(pairs, 1)).astype(np.float32)
+    other_parts = rng.uniform(0, 1, size=pairs) * 0.4 + rng.uniform(0, 1, size=pairs) * 0.1
+    return references, answers, other_parts
+
+
+def database_pairs() -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Embeddings of stored reference/student answer pairs, plus their keyword and string scores"""
+    from difflib import SequenceMatcher
+
+    from database import SessionLocal
+    from grading.descriptive import (
+        TRANSFORMERS_AVAILABLE, basic_clean_text, model, nlp_clean_text, nlp_keyword_match
+    )
+    from models import Question, QuestionType, Submission
+
+    if not TRANSFORMERS_AVAILABLE:
+        raise SystemExit("sentence-transformers is not available; use --synthetic")
+
+    db = SessionLocal()
+    try:
+        rows: List[Tuple[str, str]] = db.query(Question.correct_answer, Submission.answer).join(
+            Submission, Submission.question_id == Question.id
+        ).filter(
+            Question.question_type.in_([QuestionType.SHORT_ANSWER, QuestionType.DESCRIPTIVE]),
+            Question.correct_answer.isnot(None),
+            Submission.answer.isnot(None)
+        ).all()
+    finally:
+        db.close()
+    if not rows:
+        raise SystemExit("No short answer or descriptive submissions in the database")
+
+    references = np.asarray(model.encode([reference for reference, _ in rows]), dtype=np.float32)
+    answers = np.asarray(model.encode([answer for _, answer in rows]), dtype=np.float32)
+    other_parts = np.array([
+        nlp_keyword_match(nlp_clean_text(reference), nlp_clean_text(answer)) * 0.4
+        + SequenceMatcher(None, basic_clean_text(reference), basic_clean_text(answer)).ratio() * 0.1
+        for reference, answer in rows
+    ])
+    return references, answers, other_parts
+
+
+def pairwise_similarity(references: np.ndarray, answers: np.ndarray, fmt: str) -> np.ndarray:
+    """Cosine similarity of each reference with its answer, clipped like get_semantic_similarity"""
+    scores = paired_cosine_similarity(quantize(references, fmt), quantize(answers, fmt), fmt)
+    return np.clip(scores, 0.0, 1.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--synthetic", action="store_true", help="use random embeddings (default)")
+    source.add_argument("--from-db", action="store_true", help="use submissions stored in DATABASE_URL")
+    parser.add_argument("--pairs", type=int, default=20000, help="number of synthetic pairs")
+    args = parser.parse_args()
+
+    if args.from_db:
+        references, answers, other_parts = database_pairs()
+    else:
+        references, answers, other_parts = synthetic_pairs(args.pairs)
+
+    baseline = pairwise_similarity(references, answers, "float32")
+    baseline_combined = other_parts + baseline * 0.5
+    baseline_bands = grade_band(baseline_combined)
+    # How far each pair's float32 combined score is from the nearest grade threshold
+    threshold_distance = np.abs(baseline_combined[:, np.newaxis] - np.array(THRESHOLDS)).min(axis=1)
+
+    print(f"{len(baseline)} pairs, dimension {references.shape[1]}")
+    print(f"{'format':8} {'bytes/vector':>12} {'max |error|':>12} {'mean |error|':>13} "
+          f"{'grade changes':>14} {'changed within':>15}")
+
+    for fmt in ("float32", "float16", "int8"):
+        scores = pairwise_similarity(references, answers, fmt)
+        error = np.abs(scores - baseline)
+        changed = grade_band(other_parts + scores * 0.5) != baseline_bands
+        # A change is only expected for pairs closer to a threshold than the score error
+        changed_within = threshold_distance[changed].max() if changed.any() else 0.0
+        bytes_per_vector = quantize(references[:1], fmt).itemsize
+        print(f"{fmt:8} {bytes_per_vector:12d} {error.max():12.6f} {error.mean():13.6f} "
+              f"{int(changed.sum()):14d} {changed_within:15.6f}")
+
+
+if __name__ == "__main__":
+    main()
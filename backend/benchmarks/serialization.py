@@ -0,0 +1,97 @@
+"""
+Benchmark: serializing a 10k-row result list.
+
+Compares the previous response path (ORM objects validated through schemas.ResultResponse
+and encoded with the standard JSON encoder) with the column projection + orjson path used
+by the list endpoints, and checks both produce the same JSON.
+
+    python -m benchmarks.serialization --rows 10000
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from typing import List
+
+from database import Base, SessionLocal, engine
+from models import Exam, Result, User
+from schemas import ResultResponse
+from serialization import ORJSON_AVAILABLE, RESULT_RESPONSE_COLUMNS, dumps, rows_to_dicts
+
+
+def populate(rows: int):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    now = datetime.now()
+    db.bulk_insert_mappings(User, [
+        {"id": i + 1, "email": f"student{i}@example.com", "username": f"student{i}", "hashed_password": "x"}
+        for i in range(2000)
+    ])
+    db.bulk_insert_mappings(Exam, [{"id": i + 1, "title": f"Exam {i + 1}"} for i in range(rows // 2000 + 1)])
+    db.bulk_insert_mappings(Result, [
+        {
+            "student_id": i % 2000 + 1,
+            "exam_id": i // 2000 + 1,
+            "total_points": float(i % 50),
+            "percentage_score": (i % 50) * 2.0,
+            "passed": i % 50 >= 25,
+            "started_at": now - timedelta(minutes=60, seconds=i),
+            "completed_at": now - timedelta(seconds=i),
+            "created_at": now - timedelta(seconds=i),
+        }
+        for i in range(rows)
+    ])
+    db.commit()
+    db.close()
+
+
+def orm_path() -> bytes:
+    """Previous path: ORM rows -> response_model validation -> jsonable_encoder -> json.dumps"""
+    db = SessionLocal()
+    results = db.query(Result).all()
+    validated = TypeAdapter(List[ResultResponse]).validate_python(results, from_attributes=True)
+    body = json.dumps(jsonable_encoder(validated), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    db.close()
+    return body
+
+
+def projection_path() -> bytes:
+    """New path: column projection -> dicts -> orjson"""
+    db = SessionLocal()
+    body = dumps(rows_to_dicts(db.query(*RESULT_RESPONSE_COLUMNS).all()))
+    db.close()
+    return body
+
+
+def best_of(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    populate(args.rows)
+
+    before, after = orm_path(), projection_path()
+    assert json.loads(before) == json.loads(after), "Projection output differs from the ResultResponse output"
+
+    orm_time = best_of(orm_path, args.repeat)
+    projection_time = best_of(projection_path, args.repeat)
+    print(f"Rows: {args.rows}  (orjson available: {ORJSON_AVAILABLE})")
+    print(f"ORM + ResultResponse + json:  {orm_time * 1000:8.1f} ms  ({len(before)} bytes)")
+    print(f"Projection + fast encoder:    {projection_time * 1000:8.1f} ms  ({len(after)} bytes)")
+    print(f"Speedup: {orm_time / projection_time:.1f}x")
@@ -0,0 +1,118 @@
+"""
+Benchmark: memory of gunicorn workers with and without preloading the app in the master.
+
+Starts gunicorn with gunicorn.conf.py twice (GUNICORN_PRELOAD=0, then 1), waits until it
+serves requests and reports per-worker memory from /proc/<pid>/smaps_rollup (Linux only):
+
+    RSS  resident pages, counting pages shared with the master and other workers in full
+    PSS  proportional set size, shared pages divided among the processes sharing them
+    USS  pages private to the worker (what killing it would free)
+
+With preloading, RSS stays similar but PSS/USS drop: the model and corpora are shared.
+
+    python -m benchmarks.worker_memory --workers 4
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    """RSS, PSS and USS of a process in kB"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "uss": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+def child_pids(pid: int) -> List[int]:
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def wait_until_serving(url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError(f"Server did not come up within {timeout:.0f}s")
+
+
+def measure(preload: bool, workers: int, timeout: float, settle: float) -> Dict[str, List[Dict[str, int]]]:
+    port = free_port()
+    database_path = os.path.join(tempfile.mkdtemp(), "worker_memory.db")
+    env = {
+        **os.environ,
+        "GUNICORN_PRELOAD": "1" if preload else "0",
+        "WEB_CONCURRENCY": str(workers),
+        "BIND": f"127.0.0.1:{port}",
+        "DATABASE_URL": os.environ.get("DATABASE_URL", f"sqlite:///{database_path}"),
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.conf.py"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_serving(f"http://127.0.0.1:{port}/", timeout)
+        # Give every worker time to finish booting
+        time.sleep(settle)
+        return {
+            "master": [memory_kb(server.pid)],
+            "workers": [memory_kb(pid) for pid in child_pids(server.pid)],
+        }
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+def report(label: str, result: Dict[str, List[Dict[str, int]]]):
+    workers = result["workers"]
+    print(f"{label}")
+    print(f"  master: RSS {result['master'][0]['rss'] / 1024:7.1f} MB")
+    for index, worker in enumerate(workers):
+        print(f"  worker {index}: RSS {worker['rss'] / 1024:7.1f} MB   "
+              f"PSS {worker['pss'] / 1024:7.1f} MB   USS {worker['uss'] / 1024:7.1f} MB")
+    total_pss = sum(worker["pss"] for worker in workers) + result["master"][0]["pss"]
+    print(f"  total PSS (master + workers): {total_pss / 1024:.1f} MB")
+    return total_pss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=180.0, help="seconds to wait for the server")
+    parser.add_argument("--settle", type=float, default=3.0, help="seconds to wait after the first response")
+    args = parser.parse_args()
+
+    before = report("Without preload (every worker loads the app)", measure(False, args.workers, args.timeout, args.settle))
+    after = report("With preload (workers share the master's copy)", measure(True, args.workers, args.timeout, args.settle))
+    print(f"Total PSS: {before / 1024:.1f} MB -> {after / 1024:.1f} MB ({(1 - after / before) * 100:.0f}% less)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -17,6 +18,83 @@ class Settings(BaseSettings):
         "mysql+pymysql://root:@localhost/exam_system"
     )
 
+    # Optional read replica used by read-only endpoints
+    DATABASE_READ_URL: Optional[str] = os.getenv("DATABASE_READ_URL")
+    # After a write, a user's reads go to the primary for this long (read-your-writes)
+    READ_STICKINESS_SECONDS: float = float(os.getenv("READ_STICKINESS_SECONDS", "5"))
+
+    # SQLite settings (used when DATABASE_URL starts with "sqlite")
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))  # 64 MB page cache
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # 256 MB
+
+    # SQL statement tracking per request (opt-in, for diagnosing slow and N+1 requests)
+    SQL_QUERY_TRACKING: bool = os.getenv("SQL_QUERY_TRACKING", "false").lower() in ("1", "true", "yes")
+    SLOW_REQUEST_MS: float = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+    SQL_QUERY_WARN_COUNT: int = int(os.getenv("SQL_QUERY_WARN_COUNT", "50"))
+    SQL_REPEAT_WARN_COUNT: int = int(os.getenv("SQL_REPEAT_WARN_COUNT", "10"))
+
+    # Bearer token Prometheus must send to scrape /metrics; /metrics is not served without one
+    METRICS_TOKEN: Optional[str] = os.getenv("METRICS_TOKEN") or None
+
+    # Per-request profiling for admins (X-Profile header)
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "./profiles")
+    PROFILE_MAX_FILES: int = int(os.getenv("PROFILE_MAX_FILES", "50"))
+
+    # Responses larger than this many bytes are gzip-compressed
+    GZIP_MINIMUM_SIZE: int = int(os.getenv("GZIP_MINIMUM_SIZE", "1024"))
+
+    # Pre-rendered question payloads (exam-start thundering herd protection)
+    QUESTION_CACHE_MAX_EXAMS: int = int(os.getenv("QUESTION_CACHE_MAX_EXAMS", "256"))
+    QUESTION_CACHE_WAIT_SECONDS: float = float(os.getenv("QUESTION_CACHE_WAIT_SECONDS", "10"))
+
+    # Draft answer autosave buffer: saves are coalesced in memory and flushed in bulk.
+    # DRAFT_FLUSH_INTERVAL_SECONDS bounds how much autosave work a crash can lose.
+    DRAFT_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("DRAFT_FLUSH_INTERVAL_SECONDS", "5"))
+    DRAFT_BUFFER_MAX_ENTRIES: int = int(os.getenv("DRAFT_BUFFER_MAX_ENTRIES", "5000"))
+    # Rows per upsert statement, and failed flushes after which a draft is dropped
+    DRAFT_UPSERT_CHUNK_SIZE: int = int(os.getenv("DRAFT_UPSERT_CHUNK_SIZE", "500"))
+    DRAFT_FLUSH_MAX_ATTEMPTS: int = int(os.getenv("DRAFT_FLUSH_MAX_ATTEMPTS", "5"))
+
+    # On-disk store of sentence embeddings, so regrades and reports skip inference
+    # for texts that were already encoded (see grading/embedding_store.py). Opt-in; the
+    # directory defaults to backend/embedding_store whatever the working directory.
+    EMBEDDING_STORE_ENABLED: bool = os.getenv("EMBEDDING_STORE_ENABLED", "false").lower() in ("1", "true", "yes")
+    EMBEDDING_STORE_DIR: str = os.path.abspath(os.getenv(
+        "EMBEDDING_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding_store")
+    ))
+    # Format of stored vectors: float32, float16 (half the size) or int8 (a quarter)
+    EMBEDDING_STORE_FORMAT: str = os.getenv("EMBEDDING_STORE_FORMAT", "float16")
+
+    # Regrading after a question's answer key changes: submissions are streamed, regraded and
+    # updated REGRADE_BATCH_SIZE at a time, one transaction per batch
+    REGRADE_BATCH_SIZE: int = int(os.getenv("REGRADE_BATCH_SIZE", "500"))
+
+    # Long answers are scored for semantic similarity sentence by sentence instead of as one
+    # (truncated) embedding: a text longer than LONG_ANSWER_MIN_WORDS words (0 disables this) is
+    # split into at most LONG_ANSWER_MAX_SENTENCES segments, which bounds the encoding cost
+    LONG_ANSWER_MIN_WORDS: int = int(os.getenv("LONG_ANSWER_MIN_WORDS", "80"))
+    LONG_ANSWER_MAX_SENTENCES: int = int(os.getenv("LONG_ANSWER_MAX_SENTENCES", "24"))
+
+    # Grading time budgets: costly stages (transformer, then NLTK) are skipped when an answer's
+    # GRADING_ANSWER_BUDGET_MS, or its exam submission's GRADING_SUBMISSION_BUDGET_MS, cannot
+    # cover them. A stage that fails or overruns GRADING_BREAKER_FAILURES times in a row is
+    # skipped for GRADING_BREAKER_COOLDOWN_SECONDS (see grading/budget.py)
+    GRADING_ANSWER_BUDGET_MS: float = float(os.getenv("GRADING_ANSWER_BUDGET_MS", "3000"))
+    GRADING_SUBMISSION_BUDGET_MS: float = float(os.getenv("GRADING_SUBMISSION_BUDGET_MS", "20000"))
+    GRADING_BREAKER_FAILURES: int = int(os.getenv("GRADING_BREAKER_FAILURES", "5"))
+    GRADING_BREAKER_COOLDOWN_SECONDS: float = float(os.getenv("GRADING_BREAKER_COOLDOWN_SECONDS", "60"))
+
+    # Idempotency keys for submissions: stored responses are replayed to retries for
+    # IDEMPOTENCY_KEY_TTL_HOURS. A key whose first request has not finished after
+    # IDEMPOTENCY_LOCK_TIMEOUT_SECONDS is treated as abandoned (e.g. the worker died).
+    IDEMPOTENCY_KEY_TTL_HOURS: float = float(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+    IDEMPOTENCY_LOCK_TIMEOUT_SECONDS: float = float(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT_SECONDS", "120"))
+    IDEMPOTENCY_CACHE_MAX_ENTRIES: int = int(os.getenv("IDEMPOTENCY_CACHE_MAX_ENTRIES", "10000"))
+
     # JWT settings
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-for-jwt")
     ALGORITHM: str = "HS256"
@@ -0,0 +1,132 @@
+"""
+Shared pytest fixtures.
+
+Tests run the app through a TestClient against their own database: an in-memory SQLite
+database unless TEST_DATABASE_URL is set. client is shared by the whole session; headers
+(a student's), teacher_headers and exam_id (an active exam with a few questions) are new
+for every test, and auth_headers and create_exam make more users and exams.
+
+query_budget asserts that a block of code (typically one API call through a TestClient)
+stays within a declared number of SQL statements, so N+1 regressions fail the build:
+
+    def test_exam_results_query_budget(client, headers, exam_id, query_budget):
+        with query_budget(4):
+            client.get(f"/api/v1/submissions/results/exams/{exam_id}", headers=headers)
+"""
+import itertools
+import os
+from contextlib import contextmanager
+
+import pytest
+
+# Never run tests against the database configured for development
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", "sqlite://")
+os.environ.pop("DATABASE_READ_URL", None)
+os.environ["METRICS_TOKEN"] = "test-metrics-token"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from database import engine, read_engine  # noqa: E402
+from query_tracker import count_queries, instrument_engines  # noqa: E402
+
+API = "/api/v1"
+PASSWORD = "Passw0rd-test"
+
+# Questions of the exam_id fixture: multiple choice and true/false, graded without NLTK
+DEFAULT_QUESTIONS = [
+    {
+        "text": "What is the output of print(2 + 2)?",
+        "question_type": "multiple_choice",
+        "points": 2.0,
+        "options": [
+            {"id": "A", "text": "4", "is_correct": True},
+            {"id": "B", "text": "22", "is_correct": False},
+        ],
+        "correct_answer": "A",
+    },
+    {"text": "Python is dynamically typed.", "question_type": "true_false", "correct_answer": "true"},
+    {"text": "Lists are immutable.", "question_type": "true_false", "correct_answer": "false"},
+]
+
+_usernames = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    """TestClient of the app; its startup creates the tables"""
+    from main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Factory registering a new user with a role and returning their Authorization header"""
+
+    def register(role: str = "student") -> dict:
+        username = f"{role}{next(_usernames)}"
+        response = client.post(f"{API}/auth/register", json={
+            "email": f"{username}@example.com", "username": username, "password": PASSWORD, "role": role
+        })
+        assert response.status_code == 201, response.text
+        token = client.post(f"{API}/auth/login", json={"username": username, "password": PASSWORD}).json()
+        return {"Authorization": f"Bearer {token['access_token']}"}
+
+    return register
+
+
+@pytest.fixture
+def headers(auth_headers):
+    """A new student's Authorization header"""
+    return auth_headers("student")
+
+
+@pytest.fixture
+def teacher_headers(auth_headers):
+    """A new teacher's Authorization header"""
+    return auth_headers("teacher")
+
+
+@pytest.fixture
+def create_exam(client, teacher_headers):
+    """Factory creating an active exam owned by teacher_headers and returning its id"""
+
+    def create(questions=DEFAULT_QUESTIONS, **exam_fields) -> int:
+        exam = client.post(f"{API}/exams/", headers=teacher_headers, json={
+            "title": "Test exam", "status": "active", **exam_fields
+        })
+        assert exam.status_code == 201, exam.text
+        exam_id = exam.json()["id"]
+        for question in questions:
+            response = client.post(f"{API}/exams/questions/", headers=teacher_headers,
+                                   json={**question, "exam_id": exam_id})
+            assert response.status_code == 201, response.text
+        return exam_id
+
+    return create
+
+
+@pytest.fixture
+def exam_id(create_exam):
+    """An active exam with DEFAULT_QUESTIONS"""
+    return create_exam()
+
+
+@pytest.fixture
+def query_budget():
+    """Context manager factory failing the test when a block runs more than `max_queries` statements"""
+    instrument_engines({engine, read_engine})
+
+    @contextmanager
+    def budget(max_queries: int):
+        with count_queries() as collector:
+            yield collector
+        if collector.count > max_queries:
+            pytest.fail(
+                f"Query budget exceeded: {collector.count} statements executed, budget is {max_queries}\n"
+                f"{collector.format_statements()}",
+                pytrace=False
+            )
+
+    return budget
@@ -1,7 +1,12 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+import os
 import re
+import threading
+import time
 import urllib.parse
 
 from config import settings
@@ -10,52 +15,162 @@ from config import settings
 Base = declarative_base()
 
 
+def is_sqlite_url(database_url: str) -> bool:
+    """Check whether a database URL points to an SQLite database"""
+    return make_url(database_url).get_backend_name() == "sqlite"
+
+
 def get_database_name():
     """Extract database name from the DATABASE_URL"""
+    if is_sqlite_url(settings.DATABASE_URL):
+        return make_url(settings.DATABASE_URL).database
     parsed = urllib.parse.urlparse(settings.DATABASE_URL)
     return parsed.path.strip('/')
 
 
-def create_database_if_not_exists():
-    """Create the database if it doesn't exist"""
-    db_name = get_database_name()
+def _create_sqlite_database(database_url: str):
+    """Make sure the directory holding an SQLite database file exists"""
+    db_path = make_url(database_url).database
+    if not db_path or db_path == ":memory:":
+        print("Using in-memory SQLite database.")
+        return
+
+    db_dir = os.path.dirname(os.path.abspath(db_path))
+    os.makedirs(db_dir, exist_ok=True)
+    print(f"Using SQLite database at {os.path.abspath(db_path)}")
+
+
+def _create_mysql_database(database_url: str):
+    """Create a MySQL database if it doesn't exist"""
+    parsed = urllib.parse.urlparse(database_url)
+    db_name = parsed.path.strip('/')
     if not db_name:
         print("Could not extract database name from DATABASE_URL")
         return
 
-    # Extract connection details without database name
-    parsed = urllib.parse.urlparse(settings.DATABASE_URL)
-
     # Create URL to connect to server without specific database
     server_url = f"{parsed.scheme}://{parsed.netloc}"
 
+    # Connect to the MySQL server (without specifying a database)
+    engine = create_engine(server_url)
+
+    # Check if database exists
+    with engine.connect() as connection:
+        result = connection.execute(text("SHOW DATABASES"))
+        databases = [row[0] for row in result]
+
+        if db_name.lower() not in [db.lower() for db in databases]:
+            print(f"Creating database {db_name}...")
+            connection.execute(text(f"CREATE DATABASE `{db_name}`"))
+            print(f"Database {db_name} created successfully!")
+        else:
+            print(f"Database {db_name} already exists.")
+
+
+def create_database_if_not_exists(database_url: str = None):
+    """Create the database if it doesn't exist"""
+    database_url = database_url or settings.DATABASE_URL
+
     try:
-        # Connect to the MySQL server (without specifying a database)
-        engine = create_engine(server_url)
-
-        # Check if database exists
-        with engine.connect() as connection:
-            result = connection.execute(text("SHOW DATABASES"))
-            databases = [row[0] for row in result]
-
-            if db_name.lower() not in [db.lower() for db in databases]:
-                print(f"Creating database {db_name}...")
-                connection.execute(text(f"CREATE DATABASE `{db_name}`"))
-                print(f"Database {db_name} created successfully!")
-            else:
-                print(f"Database {db_name} already exists.")
+        if is_sqlite_url(database_url):
+            _create_sqlite_database(database_url)
+        else:
+            _create_mysql_database(database_url)
     except Exception as e:
         print(f"Error connecting to database server or creating database: {e}")
 
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply WAL mode and tuned pragmas to every new SQLite connection"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    # Negative cache_size is interpreted by SQLite as KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def make_engine(database_url: str):
+    """
+    Create an SQLAlchemy engine with dialect-specific settings.
+    SQLite engines are shared across threads and tuned for concurrent readers (WAL).
+    """
+    if not is_sqlite_url(database_url):
+        return create_engine(
+            database_url,
+            pool_pre_ping=True,  # Verify connection before using from pool
+        )
+
+    engine_kwargs = {
+        # FastAPI runs sync endpoints in a threadpool, so connections move between threads
+        "connect_args": {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000},
+    }
+    database = make_url(database_url).database
+    if not database or database == ":memory:":
+        # An in-memory database only lives as long as its connection, so share a single one
+        engine_kwargs["poolclass"] = StaticPool
+
+    sqlite_engine = create_engine(database_url, **engine_kwargs)
+    event.listen(sqlite_engine, "connect", _set_sqlite_pragmas)
+    return sqlite_engine
+
+
 # Create SQLAlchemy engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,  # Verify connection before using from pool
-)
+engine = make_engine(settings.DATABASE_URL)
 
-# Create session factory
+# Engine for read-only endpoints, falls back to the primary when no replica is configured
+read_engine = make_engine(settings.DATABASE_READ_URL) if settings.DATABASE_READ_URL else engine
+
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Last write time per user id, used to pin a user's reads to the primary for a short while.
+# This is per-process state: with several workers a user may still hit a replica from another worker.
+_last_write_at = {}
+_last_write_lock = threading.Lock()
+
+
+def mark_user_write(user_id: int):
+    """Record that a user has just committed a write to the primary"""
+    now = time.monotonic()
+    with _last_write_lock:
+        _last_write_at[user_id] = now
+
+        # Drop expired entries once the map grows, so it stays bounded by active writers
+        if len(_last_write_at) > 10000:
+            cutoff = now - settings.READ_STICKINESS_SECONDS
+            for uid in [uid for uid, ts in _last_write_at.items() if ts < cutoff]:
+                del _last_write_at[uid]
+
+
+def has_recent_write(user_id: int) -> bool:
+    """Check whether a user wrote within the stickiness window"""
+    written_at = _last_write_at.get(user_id)
+    return written_at is not None and time.monotonic() - written_at < settings.READ_STICKINESS_SECONDS
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _flag_session_writes(session, flush_context):
+    session.info["has_writes"] = True
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _flag_statement_writes(orm_execute_state):
+    # Bulk insert/update/delete statements run through session.execute() bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _record_session_writes(session):
+    # get_current_user stores the authenticated user's id on the session
+    if session.info.pop("has_writes", False) and session.info.get("user_id") is not None:
+        mark_user_write(session.info["user_id"])
 
 
 # Dependency to get DB session
@@ -67,6 +182,60 @@ def get_db():
         db.close()
 
 
+def get_read_session(user_id: int = None):
+    """
+    Yield a session for read-only work. Uses the read replica unless no replica
+    is configured or the user wrote recently and must see their own writes.
+    """
+    if read_engine is engine or (user_id is not None and has_recent_write(user_id)):
+        db = SessionLocal()
+    else:
+        db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Columns added to tables after their first release, as (table, column). Each is nullable or
+# has a server default. create_all never alters an existing table, so add_missing_columns adds these.
+ADDED_COLUMNS = [
+    ("questions", "reference_answers"),
+    ("submissions", "grading_scores"),
+    ("exams", "grading_policy"),
+    ("exams", "version"),
+    ("idempotency_keys", "reservation"),
+    ("submissions", "graded_manually"),
+]
+
+
+def add_missing_columns(bind):
+    """Add the ADDED_COLUMNS an existing database lacks (existing rows get null or the server default)"""
+    inspector = inspect(bind)
+    preparer = bind.dialect.identifier_preparer
+    for table_name, column_name in ADDED_COLUMNS:
+        if not inspector.has_table(table_name):
+            continue
+        if column_name in {column["name"] for column in inspector.get_columns(table_name)}:
+            continue
+
+        column = Base.metadata.tables[table_name].c[column_name]
+        statement = (f"ALTER TABLE {preparer.quote(table_name)} ADD COLUMN {preparer.quote(column_name)} "
+                     f"{column.type.compile(dialect=bind.dialect)}")
+        if column.nullable:
+            statement += " NULL"
+        else:
+            statement += f" NOT NULL DEFAULT {column.server_default.arg}"
+        try:
+            with bind.begin() as connection:
+                connection.execute(text(statement))
+            print(f"Added column {table_name}.{column_name}")
+        except Exception:
+            # Another worker starting at the same time may have added it first
+            if column_name not in {column["name"] for column in inspect(bind).get_columns(table_name)}:
+                raise
+
+
 # Function to create tables
 def create_tables():
     """Create all tables in the database"""
@@ -74,8 +243,15 @@ def create_tables():
         # First, ensure database exists
         create_database_if_not_exists()
 
-        # Then create tables
+        # Then create tables, and add columns that tables created by older versions lack
         Base.metadata.create_all(bind=engine)
+        add_missing_columns(engine)
+
+        # A local SQLite replica (e.g. for testing) has to get the schema too
+        if read_engine is not engine and is_sqlite_url(settings.DATABASE_READ_URL):
+            create_database_if_not_exists(settings.DATABASE_READ_URL)
+            Base.metadata.create_all(bind=read_engine)
+            add_missing_columns(read_engine)
         print("Tables created successfully.")
     except Exception as e:
-        print(f"Error creating tables: {e}")
\ No newline at end of file
+        print(f"Error creating tables: {e}")
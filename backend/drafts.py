@@ -0,0 +1,229 @@
+"""
+Write-behind buffer for autosaved draft answers.
+
+Students autosave every few seconds. Instead of one insert-and-commit per save, saves
+are coalesced in memory per (student, question), keeping only the latest answer, and a
+background thread flushes them as one bulk upsert every DRAFT_FLUSH_INTERVAL_SECONDS
+(or sooner when DRAFT_BUFFER_MAX_ENTRIES is reached). A student's drafts are flushed
+immediately when they submit the exam. A flush upserts DRAFT_UPSERT_CHUNK_SIZE rows per
+statement, all in one transaction.
+
+Durability bound: on a crash, at most the last DRAFT_FLUSH_INTERVAL_SECONDS of autosaves
+are lost; answers submitted through /submissions are never buffered. A failed flush keeps its
+drafts buffered for the next one, but a draft whose flush failed DRAFT_FLUSH_MAX_ATTEMPTS times
+is dropped and logged, so a database outage cannot grow the buffer without bound.
+
+With several worker processes each has its own buffer, and a student's saves can land in
+different workers. The upsert only replaces a stored draft with a save at least as recent
+(by saved_at), so a worker flushing an older save late never overwrites a newer one. Until
+it is flushed, a save is only visible to the worker that buffered it: GET /drafts shows
+the database plus that worker's buffer, so drafts buffered by another worker can lag by up
+to DRAFT_FLUSH_INTERVAL_SECONDS. Final answers come in the exam submission's body, so this
+lag never affects grading.
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects import mysql, sqlite
+
+from config import settings
+from database import SessionLocal
+from metrics import Counter, register
+from models import DraftAnswer
+
+logger = logging.getLogger("draft_buffer")
+
+DRAFT_ANSWERS_DROPPED = register(Counter(
+    "draft_answers_dropped_total", "Buffered draft answers dropped after repeated failed flushes"
+))
+
+
+def upsert_draft_answers(db, rows: List[Dict], chunk_size: Optional[int] = None):
+    """
+    Insert or update draft answers with the dialect's upsert syntax, one statement per
+    chunk_size rows (DRAFT_UPSERT_CHUNK_SIZE by default) in the caller's transaction.
+    A stored draft is only replaced by a row saved at the same time or later.
+    """
+    chunk_size = chunk_size or settings.DRAFT_UPSERT_CHUNK_SIZE
+    for start in range(0, len(rows), chunk_size):
+        _upsert_chunk(db, rows[start:start + chunk_size])
+
+
+def _upsert_chunk(db, rows: List[Dict]):
+    """Upsert draft answers in one statement (one merge per row on other dialects)"""
+    if not rows:
+        return
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        statement = sqlite.insert(DraftAnswer).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=["student_id", "question_id"],
+            set_={"answer": statement.excluded.answer, "saved_at": statement.excluded.saved_at},
+            where=statement.excluded.saved_at >= DraftAnswer.saved_at
+        )
+    elif dialect == "mysql":
+        statement = mysql.insert(DraftAnswer).values(rows)
+        # MySQL applies the assignments in order, so answer is compared before saved_at changes
+        is_newer = statement.inserted.saved_at >= DraftAnswer.saved_at
+        statement = statement.on_duplicate_key_update([
+            ("answer", func.if_(is_newer, statement.inserted.answer, DraftAnswer.answer)),
+            ("saved_at", func.greatest(DraftAnswer.saved_at, statement.inserted.saved_at)),
+        ])
+    else:
+        # Generic fallback: one merge per row, still in a single transaction
+        for row in rows:
+            draft = db.query(DraftAnswer).filter(
+                DraftAnswer.student_id == row["student_id"],
+                DraftAnswer.question_id == row["question_id"]
+            ).first()
+            if draft:
+                if draft.saved_at is None or row["saved_at"] >= draft.saved_at:
+                    draft.answer = row["answer"]
+                    draft.saved_at = row["saved_at"]
+            else:
+                db.add(DraftAnswer(**row))
+        return
+
+    db.execute(statement)
+
+
+class DraftAnswerBuffer:
+    """Coalesces draft saves in memory and flushes them to the database in bulk"""
+
+    def __init__(self, flush_interval: float, max_entries: int, session_factory=SessionLocal,
+                 max_attempts: Optional[int] = None):
+        self.flush_interval = flush_interval
+        self.max_entries = max_entries
+        self.session_factory = session_factory
+        self.max_attempts = max_attempts or settings.DRAFT_FLUSH_MAX_ATTEMPTS
+        # (student_id, question_id) -> row to upsert
+        self._pending: Dict[Tuple[int, int], Dict] = {}
+        # (student_id, question_id) -> failed flushes of its pending row
+        self._failed_attempts: Dict[Tuple[int, int], int] = {}
+        self._lock = threading.Lock()
+        # Serializes flushes so rows are never written out of order
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.saves = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+
+    def save(self, student_id: int, exam_id: int, question_id: int, answer: str) -> datetime:
+        """Buffer a draft answer, replacing any pending draft for the same question"""
+        saved_at = datetime.now()
+        with self._lock:
+            # A new save starts over with its own flush attempts
+            self._failed_attempts.pop((student_id, question_id), None)
+            self._pending[(student_id, question_id)] = {
+                "student_id": student_id,
+                "exam_id": exam_id,
+                "question_id": question_id,
+                "answer": answer,
+                "saved_at": saved_at,
+            }
+            self.saves += 1
+            if len(self._pending) >= self.max_entries:
+                self._wakeup.set()
+        return saved_at
+
+    def pending_for(self, student_id: int, exam_id: int) -> List[Dict]:
+        """Buffered drafts of a student for an exam in this process (not yet in the database)"""
+        with self._lock:
+            return [
+                dict(row) for row in self._pending.values()
+                if row["student_id"] == student_id and row["exam_id"] == exam_id
+            ]
+
+    def flush(self, student_id: Optional[int] = None) -> int:
+        """Write pending drafts (only one student's when student_id is given) in one transaction"""
+        with self._flush_lock:
+            with self._lock:
+                if student_id is None:
+                    keys = list(self._pending)
+                else:
+                    keys = [key for key in self._pending if key[0] == student_id]
+                rows = [self._pending.pop(key) for key in keys]
+
+            if not rows:
+                return 0
+
+            db = self.session_factory()
+            try:
+                upsert_draft_answers(db, rows)
+                db.commit()
+                with self._lock:
+                    for key in keys:
+                        self._failed_attempts.pop(key, None)
+                self.rows_written += len(rows)
+                return len(rows)
+            except Exception as e:
+                db.rollback()
+                self._requeue(rows, e)
+                return 0
+            finally:
+                db.close()
+
+    def _requeue(self, rows: List[Dict], error: Exception):
+        """Buffer the rows of a failed flush again, dropping those that failed too often"""
+        dropped = []
+        with self._lock:
+            for row in rows:
+                key = (row["student_id"], row["question_id"])
+                if key in self._pending:
+                    # A newer save arrived while the flush was failing; it replaces this row
+                    continue
+                attempts = self._failed_attempts.get(key, 0) + 1
+                if attempts >= self.max_attempts:
+                    self._failed_attempts.pop(key, None)
+                    dropped.append(key)
+                    continue
+                self._failed_attempts[key] = attempts
+                self._pending[key] = row
+
+        logger.error(f"Failed to flush {len(rows)} draft answers, keeping {len(rows) - len(dropped)} "
+                     f"buffered: {str(error)}")
+        if dropped:
+            self.rows_dropped += len(dropped)
+            DRAFT_ANSWERS_DROPPED.inc(amount=len(dropped))
+            logger.error(f"Dropped {len(dropped)} draft answers after {self.max_attempts} failed flushes "
+                         f"(student_id, question_id): {dropped}")
+
+    def start(self):
+        """Start the background flush thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="draft-answer-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flush thread and write out everything still buffered"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                written = self.flush()
+                if written:
+                    logger.info(f"Flushed {written} draft answers ({self.saves} saves buffered so far)")
+            except Exception as e:
+                logger.error(f"Draft answer flush failed: {str(e)}")
+
+
+draft_buffer = DraftAnswerBuffer(
+    flush_interval=settings.DRAFT_FLUSH_INTERVAL_SECONDS,
+    max_entries=settings.DRAFT_BUFFER_MAX_ENTRIES
+)
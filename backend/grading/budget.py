@@ -0,0 +1,189 @@
+"""
+Time budgets and circuit breakers for descriptive grading.
+
+Every answer is graded against a GradingDeadline: GRADING_ANSWER_BUDGET_MS per answer and,
+for a whole exam submission, no later than the submission's GRADING_SUBMISSION_BUDGET_MS.
+The costly stages run only when the time left covers their recent average duration; the
+transformer is dropped first (tier "nlp"), then NLTK lemmatization (tier "basic"). Basic
+matching always runs, so every answer still gets a grade.
+
+Each costly stage also has a CircuitBreaker. A stage that overruns the deadline or fails
+GRADING_BREAKER_FAILURES times in a row is skipped for GRADING_BREAKER_COOLDOWN_SECONDS,
+after which one answer tries it again: success closes the breaker, failure reopens it.
+
+Background work that must grade consistently (regrades, offline batch grading) uses
+GradingDeadline.unlimited(): every stage runs whatever the time and the breakers' state,
+and its durations and failures are not reported to the breakers of live grading.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from config import settings
+from metrics import CallbackGauge, Counter, register
+
+logger = logging.getLogger("grading_budget")
+
+# Costly stages in the order they are dropped when time runs out
+STAGE_TRANSFORMER = "transformer"
+STAGE_NLP = "nlp"
+DEGRADABLE_STAGES = (STAGE_TRANSFORMER, STAGE_NLP)
+
+# Reasons a stage is skipped
+SKIPPED_BUDGET = "time budget"
+SKIPPED_BREAKER = "circuit open"
+
+GRADING_STAGES_SKIPPED = register(Counter(
+    "grading_stages_skipped_total", "Costly grading stages skipped, by stage and reason", ("stage", "reason")
+))
+GRADING_BREAKER_TRIPS = register(Counter(
+    "grading_breaker_trips_total", "Times a grading stage's circuit breaker opened", ("stage",)
+))
+
+
+class GradingDeadline:
+    """A point in time by which grading should be done (monotonic clock)"""
+
+    def __init__(self, budget_ms: float, parent: Optional["GradingDeadline"] = None):
+        self.expires_at = time.monotonic() + budget_ms / 1000.0
+        if parent is not None:
+            self.expires_at = min(self.expires_at, parent.expires_at)
+
+    @classmethod
+    def for_answer(cls, submission_deadline: Optional["GradingDeadline"] = None) -> "GradingDeadline":
+        """The deadline of one answer, within its exam submission's deadline if there is one"""
+        if submission_deadline is not None and submission_deadline.is_unlimited:
+            return submission_deadline
+        return cls(settings.GRADING_ANSWER_BUDGET_MS, submission_deadline)
+
+    @classmethod
+    def unlimited(cls) -> "GradingDeadline":
+        """No deadline: every stage runs, as for answers graded in the background"""
+        return cls(float("inf"))
+
+    @property
+    def is_unlimited(self) -> bool:
+        return self.expires_at == float("inf")
+
+    @classmethod
+    def for_submission(cls) -> "GradingDeadline":
+        return cls(settings.GRADING_SUBMISSION_BUDGET_MS)
+
+    def remaining(self) -> float:
+        """Seconds left (negative once expired)"""
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def affords(self, seconds: float) -> bool:
+        return self.remaining() > seconds
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker of one grading stage, with its average duration"""
+
+    def __init__(self, stage: str, max_failures: Optional[int] = None, cooldown_seconds: Optional[float] = None):
+        self.stage = stage
+        self.max_failures = max_failures or settings.GRADING_BREAKER_FAILURES
+        self.cooldown_seconds = (settings.GRADING_BREAKER_COOLDOWN_SECONDS if cooldown_seconds is None
+                                 else cooldown_seconds)
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # Exponentially weighted average duration of the stage, in seconds
+        self.average_seconds = 0.0
+        # Start of the running half-open trial (a trial that never reports back expires)
+        self._trial_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether the stage may run (one trial at a time once the cooldown is over)"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            now = time.monotonic()
+            if state == "half_open" and (self._trial_started is None
+                                         or now - self._trial_started >= self.cooldown_seconds):
+                self._trial_started = now
+                return True
+            return False
+
+    def record(self, seconds: float, ok: bool):
+        """Record a run of the stage; ok is False if it failed or overran its deadline"""
+        with self._lock:
+            self._trial_started = None
+            self.average_seconds = seconds if not self.average_seconds else 0.8 * self.average_seconds + 0.2 * seconds
+            if ok:
+                if self.opened_at is not None:
+                    logger.info(f"Grading stage {self.stage} recovered, closing its circuit breaker")
+                self.failures = 0
+                self.opened_at = None
+                return
+
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.max_failures:
+                if self.opened_at is None:
+                    GRADING_BREAKER_TRIPS.inc(self.stage)
+                    logger.warning(f"Grading stage {self.stage} failed or overran {self.failures} times, "
+                                   f"skipping it for {self.cooldown_seconds:.0f}s")
+                self.opened_at = time.monotonic()
+
+    def reset(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_started = None
+
+
+breakers: Dict[str, CircuitBreaker] = {stage: CircuitBreaker(stage) for stage in DEGRADABLE_STAGES}
+
+
+def stage_skip_reason(stage: str, deadline: GradingDeadline, reserve_seconds: float = 0.0) -> Optional[str]:
+    """
+    Why a costly stage should be skipped for this answer (None if it may run).
+    reserve_seconds is time the answer still needs for other stages that run before this one.
+    """
+    if deadline.is_unlimited:
+        return None
+    breaker = breakers[stage]
+    if not deadline.affords(breaker.average_seconds + reserve_seconds):
+        reason = SKIPPED_BUDGET
+    elif not breaker.allow():
+        reason = SKIPPED_BREAKER
+    else:
+        return None
+    GRADING_STAGES_SKIPPED.inc(stage, reason)
+    return reason
+
+
+@contextmanager
+def guarded_stage(stage: str, deadline: GradingDeadline):
+    """Time a costly stage and report it to its breaker (an exception or an overrun counts against it)"""
+    if deadline.is_unlimited:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        breakers[stage].record(time.perf_counter() - start, ok=False)
+        raise
+    breakers[stage].record(time.perf_counter() - start, ok=not deadline.expired)
+
+
+register(CallbackGauge(
+    "grading_breaker_open", "1 while a grading stage's circuit breaker is open or half-open", ("stage",),
+    lambda: {(stage,): float(breaker.state != "closed") for stage, breaker in breakers.items()}
+))
@@ -0,0 +1,109 @@
+"""
+Clustering of the answers to one question, so a teacher can grade a group of near-identical
+answers once instead of one by one.
+
+Answers are vectorized with the sentence embeddings from the embedding store when the
+transformer model is available (cached, so re-clustering costs no inference), and with TF-IDF
+vectors otherwise. All pairwise cosine similarities come from one matrix product, and clusters
+are formed greedily: the answer with the most neighbours above the threshold becomes a centre
+and takes all its unassigned neighbours, and so on. Every member is therefore similar to its
+cluster's representative, not just to some other member. An answer always belongs to its own
+cluster, even one with nothing left to compare after normalization (blank or only stop words).
+"""
+import logging
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from grading import descriptive
+from grading.descriptive import basic_clean_text
+from grading.embedding_store import get_embedding_store
+
+logger = logging.getLogger("answer_clustering")
+
+
+def tfidf_vectors(texts: Sequence[str]) -> np.ndarray:
+    """L2-normalized TF-IDF vectors of texts over their own vocabulary"""
+    tokenized = [basic_clean_text(text).split() for text in texts]
+    vocabulary: Dict[str, int] = {}
+    for tokens in tokenized:
+        for token in tokens:
+            vocabulary.setdefault(token, len(vocabulary))
+
+    counts = np.zeros((len(texts), max(1, len(vocabulary))), dtype=np.float32)
+    for row, tokens in enumerate(tokenized):
+        for token, count in Counter(tokens).items():
+            counts[row, vocabulary[token]] = count
+
+    document_frequency = (counts > 0).sum(axis=0)
+    idf = np.log((1 + len(texts)) / (1 + document_frequency)) + 1.0
+    vectors = counts * idf
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def answer_vectors(texts: Sequence[str]) -> Tuple[np.ndarray, str]:
+    """Normalized vectors for texts and the name of the representation used"""
+    store = get_embedding_store(descriptive.MODEL_NAME)
+    if descriptive.TRANSFORMERS_AVAILABLE and store is not None:
+        vectors = store.encode(descriptive.model.encode, list(texts))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12), "embeddings"
+    return tfidf_vectors(texts), "tfidf"
+
+
+def cluster_answers(answers: Sequence[Tuple[int, str]], threshold: float = 0.8) -> Tuple[List[Dict], str]:
+    """
+    Group answers whose cosine similarity to the group's representative is >= threshold.
+
+    Args:
+        answers: (submission_id, answer text) tuples
+        threshold: minimum cosine similarity of a member to its representative
+
+    Returns:
+        (clusters, representation) where clusters are {"representative_id", "members"} dicts,
+        largest first, and members are (submission_id, similarity to the representative) tuples
+    """
+    # Identical answers (after normalization) are vectorized and compared once
+    groups: Dict[str, List[int]] = {}
+    texts: Dict[str, str] = {}
+    for submission_id, text in answers:
+        normalized = basic_clean_text(text or "")
+        groups.setdefault(normalized, []).append(submission_id)
+        texts.setdefault(normalized, text or "")
+    keys = list(groups)
+    if not keys:
+        return [], "none"
+
+    vectors, representation = answer_vectors([texts[key] for key in keys])
+    similarity = vectors @ vectors.T
+    # Identical answers share a key, so each key is fully similar to itself (an empty vector too)
+    np.fill_diagonal(similarity, 1.0)
+    sizes = np.array([len(groups[key]) for key in keys])
+    neighbours = similarity >= threshold
+
+    # Density of each unique answer: how many submissions it would pull into its cluster
+    density = neighbours.astype(np.int64) @ sizes
+    unassigned = np.ones(len(keys), dtype=bool)
+    clusters = []
+    for centre in np.argsort(-density, kind="stable"):
+        if not unassigned[centre]:
+            continue
+        members = np.flatnonzero(neighbours[centre] & unassigned)
+        unassigned[members] = False
+        # The centre first, then its neighbours from most to least similar
+        members = sorted(members, key=lambda index: (index != centre, -similarity[centre, index]))
+        clusters.append({
+            "representative_id": groups[keys[centre]][0],
+            "members": [
+                (submission_id, round(float(min(1.0, similarity[centre, index])), 4))
+                for index in members
+                for submission_id in groups[keys[index]]
+            ],
+        })
+
+    clusters.sort(key=lambda cluster: -len(cluster["members"]))
+    logger.info(f"Clustered {len(answers)} answers ({len(keys)} distinct) into {len(clusters)} clusters "
+                f"using {representation}")
+    return clusters, representation
@@ -18,7 +18,14 @@ logging.basicConfig(level=logging.INFO,
 logger = logging.getLogger("descriptive_grading")
 
 # Import models module without creating a circular import
+from config import settings
 from models import Question, QuestionType
+from metrics import stage_timer, record_grading_tier
+from grading.budget import (
+    STAGE_NLP, STAGE_TRANSFORMER, GradingDeadline, breakers, guarded_stage, stage_skip_reason
+)
+from grading.embedding_store import get_embedding_store
+from grading.policy import DEFAULT_POLICY, NO_CREDIT, GradingPolicy
 
 # Flag to track if NLP features are available
 NLP_AVAILABLE = False
@@ -27,6 +34,19 @@ STOPWORDS_AVAILABLE = False
 WORDNET_AVAILABLE = False
 TRANSFORMERS_AVAILABLE = False
 
+# Sentence embedding model (a small one for faster loading and inference)
+MODEL_NAME = 'paraphrase-MiniLM-L3-v2'
+
+# Names of the weighted grading tiers, as shown in feedback and grading reports
+TIER_METHODS = {
+    "full_nlp": "Full NLP with Transformers",
+    "nlp": "NLP Without Transformers",
+    "basic": "Basic Text Matching",
+}
+
+# Sentence boundaries for sentence-level alignment of long answers
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?;])\s+|\n+')
+
 # Configure NLTK to use local data directory or try to download resources
 nltk_data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'nltk_data')
 os.makedirs(nltk_data_dir, exist_ok=True)
@@ -123,8 +143,7 @@ try:
 
         # Test if we can actually load a model
         try:
-            # Use a smaller model for faster loading and inference
-            model = SentenceTransformer('paraphrase-MiniLM-L3-v2')
+            model = SentenceTransformer(MODEL_NAME)
             TRANSFORMERS_AVAILABLE = True
             logger.info("Sentence Transformer model loaded. Semantic similarity features enabled.")
         except Exception as e:
@@ -153,172 +172,207 @@ def normalize_text_for_comparison(text):
     return text
 
 
-def grade_descriptive_submission(question: Question, submitted_answer: str) -> Tuple[bool, float, Optional[str]]:
+def score_descriptive_submission(question: Question, submitted_answer: str,
+                                 policy: GradingPolicy = DEFAULT_POLICY,
+                                 deadline: Optional[GradingDeadline] = None) -> Tuple[bool, float, Optional[str], Dict[str, Any]]:
     """
     Grade a short answer or descriptive question using available techniques.
     Will use advanced NLP if available, otherwise fall back to basic text processing.
     The grading is now case-insensitive for more reliable results.
+    Questions with several acceptable answers are scored against the closest one.
+    Costly stages that do not fit the time budget (or whose circuit breaker is open) are
+    skipped, and the answer is graded with the next cheaper tier (see grading/budget.py).
 
     Args:
-        question: The Question object containing the correct answer and points
+        question: The Question object containing the reference answer(s) and points
         submitted_answer: The student's answer text
+        policy: The exam's compiled grading policy (weights, thresholds and partial credit)
+        deadline: When grading must be done (GRADING_ANSWER_BUDGET_MS from now by default)
 
     Returns:
-        Tuple of (is_correct, points_earned, feedback)
+        Tuple of (is_correct, points_earned, feedback, scores) where scores holds the grading
+        tier and the keyword, semantic and string scores the points were derived from
     """
+    deadline = deadline or GradingDeadline.for_answer()
+
     # Log grading attempt
     logger.info(f"Grading question {question.id} with type {question.question_type}")
 
     # Only grade short answer and descriptive questions
     if question.question_type not in [QuestionType.SHORT_ANSWER, QuestionType.DESCRIPTIVE]:
         logger.warning(f"Question type {question.question_type} cannot be automatically graded")
-        return False, 0.0, "This question type cannot be automatically graded."
+        record_grading_tier("ungradable")
+        return False, 0.0, "This question type cannot be automatically graded.", {"tier": "ungradable"}
 
-    # Get the correct answer
-    correct_answer = question.correct_answer
-    if not correct_answer:
+    # Get the acceptable answers
+    references = question_references(question)
+    if not references:
         logger.warning(f"Question {question.id} has no correct answer provided")
-        return False, 0.0, "This question cannot be automatically graded (no correct answer provided)."
+        record_grading_tier("ungradable")
+        feedback = "This question cannot be automatically graded (no correct answer provided)."
+        return False, 0.0, feedback, {"tier": "ungradable"}
 
-    # DIRECT EXACT MATCH - First check if answers are literally identical
-    if submitted_answer.strip() == correct_answer.strip():
+    # DIRECT EXACT MATCH - First check if the answer is literally identical to a reference
+    if any(submitted_answer.strip() == reference.strip() for reference in references):
         is_correct = True
         points_earned = question.points
         feedback = "Excellent answer! Perfect match."
         logger.info(f"Exact match - full points: {points_earned}")
-        return is_correct, points_earned, feedback
+        record_grading_tier("exact_match")
+        return is_correct, points_earned, feedback, {"tier": "exact_match"}
 
     # NORMALIZED TEXT COMPARISON - handles both case and punctuation
-    normalized_submitted = normalize_text_for_comparison(submitted_answer)
-    normalized_correct = normalize_text_for_comparison(correct_answer)
+    with stage_timer("normalize"):
+        normalized_submitted = normalize_text_for_comparison(submitted_answer)
+        normalized_references = [normalize_text_for_comparison(reference) for reference in references]
 
     # If normalized texts match exactly, it's correct
-    if normalized_submitted == normalized_correct:
+    if normalized_submitted in normalized_references:
         is_correct = True
         points_earned = question.points
         feedback = "Excellent answer! Perfect match."
         logger.info(f"Normalized match - full points: {points_earned}")
-        return is_correct, points_earned, feedback
+        record_grading_tier("normalized_match")
+        return is_correct, points_earned, feedback, {"tier": "normalized_match"}
 
     # DIRECT CASE-INSENSITIVE CHECK
-    if submitted_answer.lower().strip() == correct_answer.lower().strip():
+    if any(submitted_answer.lower().strip() == reference.lower().strip() for reference in references):
         is_correct = True
         points_earned = question.points
         feedback = "Excellent answer! Perfect match."
         logger.info(f"Case-insensitive match - full points: {points_earned}")
-        return is_correct, points_earned, feedback
+        record_grading_tier("case_insensitive_match")
+        return is_correct, points_earned, feedback, {"tier": "case_insensitive_match"}
 
-    # Log the answer being graded
-    logger.info(f"Grading answer: '{submitted_answer[:50]}...' against correct answer: '{correct_answer[:50]}...'")
-
-    # Clean and normalize answers using basic methods (always available)
-    submitted_clean = basic_clean_text(submitted_answer)
-    correct_clean = basic_clean_text(correct_answer)
+    # Clean and normalize the answer using basic methods (always available)
+    with stage_timer("normalize"):
+        submitted_clean = basic_clean_text(submitted_answer)
 
     # Check if the answer is empty
     if not submitted_clean:
         logger.warning("Empty answer submitted")
-        return False, 0.0, "No answer provided."
+        record_grading_tier("empty_answer")
+        return False, 0.0, "No answer provided.", {"tier": "empty_answer"}
+
+    # Costly stages that fit the time budget; the transformer is dropped first, since it runs
+    # after NLTK and its budget has to cover both
+    skipped = {}
+    use_nlp = NLP_AVAILABLE
+    if use_nlp:
+        skipped_reason = stage_skip_reason(STAGE_NLP, deadline)
+        if skipped_reason:
+            skipped[STAGE_NLP] = skipped_reason
+            use_nlp = False
+    use_transformer = TRANSFORMERS_AVAILABLE
+    if use_transformer and STAGE_NLP in skipped:
+        # The basic tier gives the semantic score no weight, so it is not worth computing
+        skipped[STAGE_TRANSFORMER] = skipped[STAGE_NLP]
+        use_transformer = False
+    elif use_transformer:
+        nlp_seconds = breakers[STAGE_NLP].average_seconds if use_nlp else 0.0
+        skipped_reason = stage_skip_reason(STAGE_TRANSFORMER, deadline, nlp_seconds)
+        if skipped_reason:
+            skipped[STAGE_TRANSFORMER] = skipped_reason
+            use_transformer = False
+
+    # Keyword and string scores are computed against the closest reference answer only
+    reference_semantic_score = None
+    if use_transformer and len(references) > 1:
+        try:
+            with guarded_stage(STAGE_TRANSFORMER, deadline):
+                correct_answer, reference_semantic_score = select_reference(
+                    references, submitted_answer, use_semantic=True, strict=True
+                )
+        except Exception as e:
+            logger.warning(f"Semantic similarity failed, grading without the transformer: {str(e)}")
+            skipped[STAGE_TRANSFORMER] = "error"
+            use_transformer = False
+    if reference_semantic_score is None:
+        correct_answer, _ = select_reference(references, submitted_answer, use_semantic=False)
+    with stage_timer("normalize"):
+        correct_clean = basic_clean_text(correct_answer)
+
+    # Log the answer being graded
+    logger.info(f"Grading answer: '{submitted_answer[:50]}...' against correct answer: '{correct_answer[:50]}...'")
 
     # HIGH SIMILARITY CHECK - If very similar but not exact, still give full credit
     # This helps with minor whitespace/formatting differences
-    string_similarity = SequenceMatcher(None, correct_clean, submitted_clean).ratio()
+    with stage_timer("string_similarity"):
+        string_similarity = SequenceMatcher(None, correct_clean, submitted_clean).ratio()
     if string_similarity >= 0.95:  # 95% similar text should be considered correct
         is_correct = True
         points_earned = question.points
         feedback = "Excellent answer! Very close match."
         logger.info(f"High similarity match ({string_similarity:.2f}) - full points: {points_earned}")
-        return is_correct, points_earned, feedback
+        record_grading_tier("high_similarity")
+        return is_correct, points_earned, feedback, {"tier": "high_similarity"}
 
     # Calculate basic scores (always available)
-    keyword_score = basic_keyword_match(correct_clean, submitted_clean)
+    with stage_timer("keyword"):
+        keyword_score = basic_keyword_match(correct_clean, submitted_clean)
 
     # Log basic scores
     logger.info(f"Basic keyword match score: {keyword_score:.4f}")
     logger.info(f"String similarity score: {string_similarity:.4f}")
 
-    # Calculate NLP scores if available
-    semantic_score = 0.0
+    # Calculate NLP scores if available (the semantic score may be known from selecting the reference)
+    semantic_score = reference_semantic_score or 0.0
     nlp_keyword_score = 0.0
 
-    try:
-        if NLP_AVAILABLE:
-            # Ensure NLTK paths are good before using NLP
-            ensure_nltk_data_paths()
-
-            # Clean text with NLP methods
-            submitted_nlp = nlp_clean_text(submitted_answer)
-            correct_nlp = nlp_clean_text(correct_answer)
-
-            # Get better keyword matching with NLP
-            nlp_keyword_score = nlp_keyword_match(correct_nlp, submitted_nlp)
+    if use_nlp:
+        try:
+            with guarded_stage(STAGE_NLP, deadline):
+                # Ensure NLTK paths are good before using NLP
+                ensure_nltk_data_paths()
+
+                # Clean text with NLP methods
+                with stage_timer("nlp_clean"):
+                    submitted_nlp = nlp_clean_text(submitted_answer)
+                    correct_nlp = nlp_clean_text(correct_answer)
+
+                # Get better keyword matching with NLP
+                with stage_timer("keyword"):
+                    nlp_keyword_score = nlp_keyword_match(correct_nlp, submitted_nlp)
             logger.info(f"NLP keyword match score: {nlp_keyword_score:.4f}")
             # Use NLP keyword score instead of basic keyword score
             keyword_score = nlp_keyword_score
+        except Exception as e:
+            logger.warning(f"Error in NLP processing, falling back to case-insensitive basic matching: {str(e)}")
+            skipped[STAGE_NLP] = "error"
+            use_nlp = False
 
-        # Get semantic similarity if transformers are available
-        if TRANSFORMERS_AVAILABLE:
-            semantic_score = get_semantic_similarity(correct_answer, submitted_answer)
-            logger.info(f"Semantic similarity score: {semantic_score:.4f}")
-    except Exception as e:
-        logger.warning(f"Error in NLP processing, falling back to case-insensitive basic matching: {str(e)}")
-
-    # Calculate weighted combined score
-    # Adjust weights based on what's available
-    method = "Basic Text Matching"
-    if TRANSFORMERS_AVAILABLE and NLP_AVAILABLE:
-        # Use all methods with appropriate weights
-        combined_score = (
-                keyword_score * 0.4 +
-                semantic_score * 0.5 +
-                string_similarity * 0.1
-        )
-        method = "Full NLP with Transformers"
-        logger.info(f"Using full NLP with transformers scoring (combined: {combined_score:.4f})")
-    elif NLP_AVAILABLE:
-        # Use NLP keyword matching with string similarity
-        combined_score = keyword_score * 0.7 + string_similarity * 0.3
-        method = "NLP Without Transformers"
-        logger.info(f"Using NLP without transformers scoring (combined: {combined_score:.4f})")
-    else:
-        # Use only basic methods - give more weight to string similarity
-        combined_score = keyword_score * 0.5 + string_similarity * 0.5
-        logger.info(f"Using basic scoring methods (combined: {combined_score:.4f})")
-
-    # Set thresholds for partial credit
-    if combined_score >= 0.85:
-        # Excellent answer - full credit
-        is_correct = True
-        points_earned = question.points
-        feedback = "Excellent answer! All key points covered."
-        logger.info(f"Excellent answer - full points: {points_earned}")
-    elif combined_score >= 0.7:
-        # Good answer - partial credit
-        is_correct = True
-        points_earned = question.points * 0.9
-        feedback = "Good answer. Most key points covered."
-        logger.info(f"Good answer - 90% points: {points_earned}")
-    elif combined_score >= 0.55:
-        # Adequate answer - partial credit
-        is_correct = False  # Technically not fully correct
-        points_earned = question.points * 0.7
-        feedback = "Adequate answer. Some key points missing or incorrect."
-        logger.info(f"Adequate answer - 70% points: {points_earned}")
-    elif combined_score >= 0.35:
-        # Poor answer - minimal credit
-        is_correct = False
-        points_earned = question.points * 0.4
-        feedback = "Answer is on topic but missing important key points."
-        logger.info(f"Poor answer - 40% points: {points_earned}")
-    else:
-        # Incorrect answer
-        is_correct = False
-        points_earned = 0.0
-        feedback = "Answer is incorrect or missing essential information."
-        logger.info("Incorrect answer - 0 points")
+    # Get semantic similarity if transformers are available
+    if use_transformer and reference_semantic_score is None:
+        try:
+            with guarded_stage(STAGE_TRANSFORMER, deadline):
+                semantic_score = get_semantic_similarity(correct_answer, submitted_answer, strict=True)
+        except Exception as e:
+            logger.warning(f"Semantic similarity failed, grading without the transformer: {str(e)}")
+            skipped[STAGE_TRANSFORMER] = "error"
+            use_transformer = False
+    if use_transformer:
+        logger.info(f"Semantic similarity score: {semantic_score:.4f}")
+
+    # Calculate weighted combined score with the policy's weights for the stages that ran
+    tier = "basic"
+    if use_transformer and use_nlp:
+        tier = "full_nlp"
+    elif use_nlp:
+        tier = "nlp"
+    method = TIER_METHODS[tier]
+    combined_score = policy.combined_score(tier, keyword_score, semantic_score, string_similarity)
+    logger.info(f"Using {method} scoring (combined: {combined_score:.4f})")
+
+    # Partial credit from the policy's ladder
+    rung = policy.rung_for(combined_score)
+    is_correct = rung.is_correct
+    points_earned = question.points * rung.share
+    feedback = rung.feedback
+    logger.info(f"{rung.label} answer - {rung.share:.0%} points: {points_earned}")
 
     # Round points to 2 decimal places
     points_earned = round(points_earned, 2)
+    record_grading_tier(tier)
 
     # Add score details to feedback for transparency
     detailed_feedback = (
@@ -330,22 +384,85 @@ def grade_descriptive_submission(question: Question, submitted_answer: str) -> T
         f"String Similarity: {string_similarity:.2f}\n"
     )
 
-    if TRANSFORMERS_AVAILABLE:
+    if use_transformer:
         detailed_feedback += f"Semantic Similarity: {semantic_score:.2f}\n"
+        if is_long_answer(submitted_answer) or is_long_answer(correct_answer):
+            detailed_feedback += "Semantic Scoring: sentence-level alignment\n"
+
+    if len(references) > 1:
+        detailed_feedback += f"Closest Reference Answer: {references.index(correct_answer) + 1} of {len(references)}\n"
+
+    # Stages left out of this grade, and why
+    for stage, reason in skipped.items():
+        detailed_feedback += f"Skipped Stage: {stage} ({reason})\n"
 
     # Add threshold information
-    if combined_score >= 0.85:
-        detailed_feedback += "Threshold: 0.85 (Excellent - 100%)\n"
-    elif combined_score >= 0.7:
-        detailed_feedback += "Threshold: 0.70 (Good - 90%)\n"
-    elif combined_score >= 0.55:
-        detailed_feedback += "Threshold: 0.55 (Adequate - 70%)\n"
-    elif combined_score >= 0.35:
-        detailed_feedback += "Threshold: 0.35 (Poor - 40%)\n"
+    if rung is NO_CREDIT:
+        detailed_feedback += f"Threshold: <{policy.rungs[-1].threshold:.2f} (Incorrect - 0%)\n"
     else:
-        detailed_feedback += "Threshold: <0.35 (Incorrect - 0%)\n"
+        detailed_feedback += f"Threshold: {rung.threshold:.2f} ({rung.label} - {rung.share:.0%})\n"
+
+    # Component scores are stored with the submission (what-if simulations reuse them)
+    scores = {
+        "tier": tier,
+        "keyword": keyword_score,
+        "semantic": semantic_score if use_transformer else None,
+        "string": string_similarity,
+    }
+    if skipped:
+        scores["skipped"] = skipped
+    if len(references) > 1:
+        scores["reference"] = references.index(correct_answer)
 
-    return is_correct, points_earned, detailed_feedback
+    return is_correct, points_earned, detailed_feedback, scores
+
+
+def grade_descriptive_submission(question: Question, submitted_answer: str,
+                                 policy: GradingPolicy = DEFAULT_POLICY,
+                                 deadline: Optional[GradingDeadline] = None) -> Tuple[bool, float, Optional[str]]:
+    """
+    Grade a short answer or descriptive question (see score_descriptive_submission).
+
+    Returns:
+        Tuple of (is_correct, points_earned, feedback)
+    """
+    return score_descriptive_submission(question, submitted_answer, policy, deadline)[:3]
+
+
+def preencode_answers(groups: List[Tuple[Question, List[str]]]):
+    """
+    Encode everything grading these answers will look up in the embedding store (references,
+    answers, and the sentences of long ones) in one batch, so grading each answer afterwards
+    only reads embeddings. Does nothing without the transformer model and the store, or while
+    the transformer's circuit breaker is open.
+
+    Args:
+        groups: (question, answer texts) pairs
+    """
+    store = get_embedding_store(MODEL_NAME) if TRANSFORMERS_AVAILABLE else None
+    if store is None or breakers[STAGE_TRANSFORMER].state == "open":
+        return
+
+    texts = []
+    for question, answers in groups:
+        if question.question_type not in [QuestionType.SHORT_ANSWER, QuestionType.DESCRIPTIVE]:
+            continue
+        # Both forms of the (few) references; answers are aligned by sentence
+        # when they or a reference are long
+        references = question_references(question)
+        align_all = any(is_long_answer(reference) for reference in references)
+        texts.extend(references)
+        texts.extend(sentence for reference in references for sentence in split_sentences(reference))
+        for answer in answers:
+            texts.extend(split_sentences(answer) if align_all or is_long_answer(answer) else [answer])
+
+    if not texts:
+        return
+    try:
+        with stage_timer("encode"):
+            store.encode_records(model.encode, list(dict.fromkeys(texts)))
+    except Exception as e:
+        logger.warning(f"Could not pre-encode {len(texts)} texts: {str(e)}")
 
 
 def basic_clean_text(text: str) -> str:
@@ -513,13 +630,14 @@ def nlp_keyword_match(correct_answer: str, submitted_answer: str) -> float:
         return basic_keyword_match(correct_answer, submitted_answer)
 
 
-def get_semantic_similarity(correct_answer: str, submitted_answer: str) -> float:
+def get_semantic_similarity(correct_answer: str, submitted_answer: str, strict: bool = False) -> float:
     """
     Calculate semantic similarity using sentence transformers if available.
 
     Args:
         correct_answer: The correct answer
         submitted_answer: The submitted answer
+        strict: Raise errors instead of returning 0.0
 
     Returns:
         Similarity score between 0.0 and 1.0
@@ -528,6 +646,10 @@ def get_semantic_similarity(correct_answer: str, submitted_answer: str) -> float
         logger.warning("Transformers not available, returning 0.0 for semantic similarity")
         return 0.0
 
+    # Long texts would be truncated by the model: align them sentence by sentence instead
+    if is_long_answer(correct_answer) or is_long_answer(submitted_answer):
+        return get_alignment_similarities([correct_answer], submitted_answer, strict)[0]
+
     try:
         # Import locally to avoid errors
         from sentence_transformers import SentenceTransformer, util
@@ -535,20 +657,264 @@ def get_semantic_similarity(correct_answer: str, submitted_answer: str) -> float
         # Get or load model (try to use cached instance)
         global model
         if 'model' not in globals() or model is None:
-            model = SentenceTransformer('paraphrase-MiniLM-L3-v2')
-
-        # Encode sentences to get embeddings
-        embeddings = model.encode([correct_answer, submitted_answer])
-
-        # Calculate cosine similarity using util function from sentence_transformers
-        similarity = util.cos_sim(embeddings[0], embeddings[1]).item()
+            model = SentenceTransformer(MODEL_NAME)
+
+        # Reuse stored embeddings for texts seen before; the similarity is computed on the
+        # stored (possibly quantized) vectors so it is the same on every regrade
+        store = get_embedding_store(MODEL_NAME)
+        if store is not None:
+            with stage_timer("encode"):
+                similarity = store.similarity(model.encode, correct_answer, submitted_answer)
+        else:
+            # Encode sentences to get embeddings
+            with stage_timer("encode"):
+                embeddings = model.encode([correct_answer, submitted_answer])
+
+            # Calculate cosine similarity using util function from sentence_transformers
+            similarity = util.cos_sim(embeddings[0], embeddings[1]).item()
 
         return max(0.0, min(1.0, float(similarity)))  # Ensure value is between 0 and 1
     except Exception as e:
+        if strict:
+            raise
         logger.error(f"Error calculating semantic similarity: {str(e)}")
         return 0.0
 
 
+def get_semantic_similarities(references: List[str], submitted_answer: str, strict: bool = False) -> List[float]:
+    """
+    Calculate the semantic similarity of an answer to each reference answer, with one
+    batched encode and one matrix product however many references there are.
+
+    Args:
+        references: The reference answers
+        submitted_answer: The submitted answer
+        strict: Raise errors instead of returning 0.0 scores
+
+    Returns:
+        Similarity scores between 0.0 and 1.0, one per reference
+    """
+    if not TRANSFORMERS_AVAILABLE:
+        logger.warning("Transformers not available, returning 0.0 for semantic similarity")
+        return [0.0] * len(references)
+
+    if is_long_answer(submitted_answer) or any(is_long_answer(reference) for reference in references):
+        return get_alignment_similarities(references, submitted_answer, strict)
+
+    try:
+        from sentence_transformers import SentenceTransformer, util
+
+        global model
+        if 'model' not in globals() or model is None:
+            model = SentenceTransformer(MODEL_NAME)
+
+        store = get_embedding_store(MODEL_NAME)
+        with stage_timer("encode"):
+            if store is not None:
+                similarities = store.similarities(model.encode, submitted_answer, references)
+            else:
+                embeddings = model.encode([submitted_answer, *references])
+                similarities = util.cos_sim(embeddings[:1], embeddings[1:])[0].tolist()
+
+        return [max(0.0, min(1.0, float(similarity))) for similarity in similarities]
+    except Exception as e:
+        if strict:
+            raise
+        logger.error(f"Error calculating semantic similarities: {str(e)}")
+        return [0.0] * len(references)
+
+
+def is_long_answer(text: str) -> bool:
+    """Whether a text is long enough to be scored by sentence-level alignment"""
+    return 0 < settings.LONG_ANSWER_MIN_WORDS < len((text or "").split())
+
+
+def split_sentences(text: str, max_sentences: Optional[int] = None) -> List[str]:
+    """
+    Split a text into sentences for sentence-level alignment.
+
+    Sentences longer than LONG_ANSWER_MIN_WORDS words (e.g. a paste without punctuation) are
+    cut into windows of that many words. When there are more than max_sentences pieces,
+    adjacent ones are joined into max_sentences contiguous segments, so the whole text is
+    still covered but the number of embeddings is bounded.
+
+    Args:
+        text: Text to split
+        max_sentences: Maximum number of segments (LONG_ANSWER_MAX_SENTENCES by default)
+
+    Returns:
+        Non-empty sentences (or segments), in order
+    """
+    max_sentences = max(1, max_sentences or settings.LONG_ANSWER_MAX_SENTENCES)
+    window = settings.LONG_ANSWER_MIN_WORDS
+
+    sentences = []
+    for sentence in SENTENCE_BOUNDARY.split(text or ""):
+        words = sentence.split()
+        if window > 0 and len(words) > window:
+            sentences.extend(" ".join(words[start:start + window]) for start in range(0, len(words), window))
+        elif words:
+            sentences.append(" ".join(words))
+
+    if len(sentences) <= max_sentences:
+        return sentences
+    # Contiguous segments of (nearly) equal numbers of sentences
+    bounds = [round(i * len(sentences) / max_sentences) for i in range(max_sentences + 1)]
+    return [" ".join(sentences[start:end]) for start, end in zip(bounds, bounds[1:])]
+
+
+def get_alignment_similarities(references: List[str], submitted_answer: str, strict: bool = False) -> List[float]:
+    """
+    Sentence-level semantic similarity of an answer to each reference answer.
+
+    The references and the answer are split into sentences, all sentences are encoded in one
+    batch and compared in one similarity matrix. A reference's score is its coverage: the
+    mean, over its sentences, of the best similarity of any sentence of the answer.
+
+    Args:
+        references: The reference answers
+        submitted_answer: The submitted answer
+        strict: Raise errors instead of returning 0.0 scores
+
+    Returns:
+        Coverage scores between 0.0 and 1.0, one per reference
+    """
+    if not TRANSFORMERS_AVAILABLE:
+        logger.warning("Transformers not available, returning 0.0 for semantic similarity")
+        return [0.0] * len(references)
+
+    try:
+        from sentence_transformers import SentenceTransformer, util
+
+        global model
+        if 'model' not in globals() or model is None:
+            model = SentenceTransformer(MODEL_NAME)
+
+        answer_sentences = split_sentences(submitted_answer)
+        reference_sentences = [split_sentences(reference) for reference in references]
+        all_reference_sentences = [sentence for sentences in reference_sentences for sentence in sentences]
+        if not answer_sentences or not all_reference_sentences:
+            return [0.0] * len(references)
+
+        # One (reference sentences x answer sentences) matrix for all references
+        store = get_embedding_store(MODEL_NAME)
+        with stage_timer("encode"):
+            if store is not None:
+                matrix = store.similarity_matrix(model.encode, all_reference_sentences, answer_sentences)
+            else:
+                embeddings = model.encode([*all_reference_sentences, *answer_sentences])
+                split = len(all_reference_sentences)
+                matrix = util.cos_sim(embeddings[:split], embeddings[split:]).cpu().numpy()
+
+        # Best match of each reference sentence, averaged per reference
+        best_matches = matrix.max(axis=1).clip(0.0, 1.0)
+        similarities = []
+        start = 0
+        for sentences in reference_sentences:
+            end = start + len(sentences)
+            similarities.append(float(best_matches[start:end].mean()) if sentences else 0.0)
+            start = end
+        logger.info(f"Aligned {len(answer_sentences)} answer sentences with "
+                    f"{len(all_reference_sentences)} reference sentences")
+        return similarities
+    except Exception as e:
+        if strict:
+            raise
+        logger.error(f"Error calculating sentence alignment similarity: {str(e)}")
+        return [0.0] * len(references)
+
+
+def question_references(question: Question) -> List[str]:
+    """The correct answer followed by the other acceptable answers of a question (distinct, non-empty)"""
+    references = [question.correct_answer, *(getattr(question, "reference_answers", None) or [])]
+    return list(dict.fromkeys(reference for reference in references if reference and reference.strip()))
+
+
+def select_reference(references: List[str], submitted_answer: str, use_semantic: Optional[bool] = None,
+                     strict: bool = False) -> Tuple[str, Optional[float]]:
+    """
+    Pick the reference answer a submission is closest to.
+
+    With the transformer model the closest reference is the one with the highest semantic
+    similarity (all references scored at once); otherwise it is the one with the highest basic
+    keyword plus string similarity.
+
+    Args:
+        references: The acceptable answers
+        submitted_answer: The student's answer text
+        use_semantic: Whether to use the transformer model (by default if it is available)
+        strict: Raise semantic similarity errors instead of scoring 0.0
+
+    Returns:
+        Tuple of (reference, semantic similarity to it or None if it was not computed)
+    """
+    if len(references) == 1:
+        return references[0], None
+
+    if use_semantic is None:
+        use_semantic = TRANSFORMERS_AVAILABLE
+    if use_semantic:
+        similarities = get_semantic_similarities(references, submitted_answer, strict)
+        best = max(range(len(references)), key=similarities.__getitem__)
+        return references[best], similarities[best]
+
+    submitted_clean = basic_clean_text(submitted_answer)
+
+    def basic_score(reference: str) -> float:
+        reference_clean = basic_clean_text(reference)
+        return (basic_keyword_match(reference_clean, submitted_clean)
+                + SequenceMatcher(None, reference_clean, submitted_clean).ratio())
+
+    return max(references, key=basic_score), None
+
+
+def preload_grading_resources():
+    """
+    Load everything grading uses lazily (NLTK corpora, tokenizer, transformer weights).
+
+    Called once in the gunicorn master before workers are forked (see gunicorn.conf.py),
+    so the data is shared copy-on-write instead of being loaded again by every worker.
+    Nothing is encoded here: inference starts the torch/OpenMP thread pools, which do not
+    survive a fork and can deadlock the workers (see warm_up_grading_model).
+    """
+    if NLP_AVAILABLE:
+        try:
+            # NLTK corpora are LazyCorpusLoaders that only read their files on first use
+            from nltk.tokenize import word_tokenize
+            from nltk.corpus import stopwords
+            from nltk.stem import WordNetLemmatizer
+
+            word_tokenize("Preloading the grading resources.")
+            stopwords.words('english')
+            WordNetLemmatizer().lemmatize("resources")
+            logger.info("NLTK resources preloaded")
+        except Exception as e:
+            logger.warning(f"Could not preload NLTK resources: {str(e)}")
+
+    if TRANSFORMERS_AVAILABLE:
+        try:
+            # The weights were loaded on import; inference never writes them, so their pages
+            # stay shared after fork
+            model.eval()
+            logger.info("Sentence Transformer model preloaded")
+        except Exception as e:
+            logger.warning(f"Could not preload Sentence Transformer model: {str(e)}")
+
+
+def warm_up_grading_model():
+    """
+    Run one encode so the first graded answer doesn't pay for the model's lazy setup.
+    Called in each worker after it is forked, never in the gunicorn master.
+    """
+    if not TRANSFORMERS_AVAILABLE:
+        return
+    try:
+        model.encode(["Warming up the grading model."])
+        logger.info("Sentence Transformer model warmed up")
+    except Exception as e:
+        logger.warning(f"Could not warm up Sentence Transformer model: {str(e)}")
+
+
 def check_nlp_availability() -> Dict[str, bool]:
     """
     Utility function to check and report the availability of NLP components.
@@ -0,0 +1,399 @@
+"""
+Append-only, memory-mapped store of sentence embeddings keyed by a hash of the text.
+
+get_semantic_similarity used to encode the reference and the student answer on every call,
+so regrading an exam or building a report paid for full inference again. Embeddings are now
+looked up here first and only texts never seen before are encoded.
+
+Layout (one directory per model, under EMBEDDING_STORE_DIR):
+
+    CURRENT              name of the active generation directory
+    .lock                serializes appends and compaction across processes
+    gen-000001/
+        meta.json        vector dimension and format (see grading/quantization.py)
+        vectors.bin      fixed-size records, appended
+        index.txt        "<sha1 of text> <row>" lines, appended after the row is written
+
+Vectors are read through a read-only memory map, so all worker processes share one copy in
+the page cache. Each process keeps the key -> row index in memory and only re-reads the
+tail of index.txt when a lookup misses. Compaction (deduplicating, optionally dropping
+texts no longer in the database, or converting to another format) writes a new generation
+and switches CURRENT, so readers never see a half-written store:
+
+    python -m grading.embedding_store stats
+    python -m grading.embedding_store compact [--prune] [--format int8]
+
+New stores use EMBEDDING_STORE_FORMAT; an existing store keeps its format until it is
+compacted with --format.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+try:
+    import numpy as np
+    from grading.quantization import cosine_similarity_matrix, dequantize, quantize, record_dtype
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process locking on Windows; run a single writer process there
+    fcntl = None
+
+from config import settings
+from metrics import record_cache_lookup
+
+logger = logging.getLogger("embedding_store")
+
+VECTORS_FILE = "vectors.bin"
+INDEX_FILE = "index.txt"
+META_FILE = "meta.json"
+
+
+def text_key(text: str) -> str:
+    """Key of a text in the store"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """Memory-mapped embedding store for one model"""
+
+    def __init__(self, directory: str, model_name: str, fmt: str = "float32"):
+        self.model_name = model_name
+        self.directory = os.path.join(directory, model_name.replace("/", "_"))
+        # Format of new stores; an existing generation keeps the format in its meta.json
+        self.format = fmt
+        self._lock = threading.Lock()
+        self._dim: Optional[int] = None
+        self._generation: Optional[str] = None
+        self._index: Dict[str, int] = {}
+        self._index_offset = 0
+        self._vectors = None
+        self.hits = 0
+        self.misses = 0
+
+    # Public API
+
+    def encode(self, encoder: Callable[[List[str]], "np.ndarray"], texts: Sequence[str]) -> "np.ndarray":
+        """Embeddings of texts as a (len(texts), dim) float32 array (as stored, i.e. after quantization)"""
+        records, fmt = self.encode_records(encoder, texts)
+        return dequantize(records, fmt)
+
+    def similarity(self, encoder: Callable[[List[str]], "np.ndarray"], text_a: str, text_b: str) -> float:
+        """Cosine similarity of two texts, computed on the stored (possibly quantized) vectors"""
+        records, fmt = self.encode_records(encoder, [text_a, text_b])
+        return float(cosine_similarity_matrix(records[:1], records[1:], fmt)[0, 0])
+
+    def similarities(self, encoder: Callable[[List[str]], "np.ndarray"], text: str,
+                     others: Sequence[str]) -> List[float]:
+        """Cosine similarity of text to each of others, from one lookup/encode and one matrix product"""
+        records, fmt = self.encode_records(encoder, [text, *others])
+        return cosine_similarity_matrix(records[:1], records[1:], fmt)[0].tolist()
+
+    def similarity_matrix(self, encoder: Callable[[List[str]], "np.ndarray"], texts_a: Sequence[str],
+                          texts_b: Sequence[str]) -> "np.ndarray":
+        """(len(texts_a), len(texts_b)) cosine similarities, from one lookup/encode and one matrix product"""
+        records, fmt = self.encode_records(encoder, [*texts_a, *texts_b])
+        return cosine_similarity_matrix(records[:len(texts_a)], records[len(texts_a):], fmt)
+
+    def encode_records(self, encoder: Callable[[List[str]], "np.ndarray"],
+                       texts: Sequence[str]) -> Tuple["np.ndarray", str]:
+        """
+        Stored records of texts and their format, encoding only texts not stored yet. Fresh
+        vectors are quantized before they are returned, so a text scores the same whether or
+        not it was stored.
+        """
+        keys = [text_key(text) for text in texts]
+        found, fmt = self._lookup(keys)
+        for record in found:
+            record_cache_lookup("embeddings", record is not None)
+
+        missing = [i for i, record in enumerate(found) if record is None]
+        if missing:
+            # Encode each distinct missing text once
+            unique_missing = list(dict.fromkeys(texts[i] for i in missing))
+            encoded = np.asarray(encoder(unique_missing), dtype=np.float32)
+            try:
+                self.put([text_key(text) for text in unique_missing], encoded)
+            except OSError as e:
+                logger.warning(f"Could not append {len(unique_missing)} embeddings to the store: {str(e)}")
+            by_text = dict(zip(unique_missing, quantize(encoded, fmt)))
+            for i in missing:
+                found[i] = by_text[texts[i]]
+
+        records = np.empty(len(texts), dtype=found[0].dtype if found else record_dtype(fmt, self._dim or 0))
+        for i, record in enumerate(found):
+            records[i] = record
+        return records, fmt
+
+    def get(self, keys: Sequence[str]) -> List[Optional["np.void"]]:
+        """Stored records for keys (None where a key is not stored)"""
+        return self._lookup(keys)[0]
+
+    def _lookup(self, keys: Sequence[str]) -> Tuple[List[Optional["np.void"]], str]:
+        """Stored records for keys and the format they are in (read together, under the lock)"""
+        with self._lock:
+            rows = [self._index.get(key) for key in keys]
+            if any(row is None for row in rows):
+                # Other processes may have appended since we last looked
+                self._refresh()
+                rows = [self._index.get(key) for key in keys]
+
+            # Copy the rows out while holding the lock; a refresh may switch the mapped generation
+            present = [row for row in rows if row is not None]
+            copied = iter(np.array(self._vectors[present]) if present else [])
+            found = [next(copied) if row is not None else None for row in rows]
+            self.hits += len(present)
+            self.misses += len(rows) - len(present)
+            return found, self.format
+
+    def put(self, keys: Sequence[str], vectors: "np.ndarray"):
+        """Quantize and append float vectors; keys that are already stored are skipped"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock, self._exclusive():
+            self._refresh()
+            new_rows = [i for i, key in enumerate(keys) if key not in self._index]
+            if not new_rows:
+                return
+
+            generation_dir = self._ensure_generation(vectors.shape[1])
+            vectors_path = os.path.join(generation_dir, VECTORS_FILE)
+            record_size = record_dtype(self.format, self._dim).itemsize
+
+            with open(vectors_path, "ab") as f:
+                # Drop a partial row left by a writer that crashed mid-append
+                size = f.seek(0, os.SEEK_END)
+                if size % record_size:
+                    f.truncate(size - size % record_size)
+                    size -= size % record_size
+                first_row = size // record_size
+                f.write(quantize(vectors[new_rows], self.format).tobytes())
+
+            # The index is written last, so it never points at rows that are not on disk
+            with open(os.path.join(generation_dir, INDEX_FILE), "a") as f:
+                f.write("".join(f"{keys[i]} {first_row + n}\n" for n, i in enumerate(new_rows)))
+
+            self._refresh()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            generation_dir = self._generation_dir()
+            vectors_path = os.path.join(generation_dir, VECTORS_FILE) if generation_dir else None
+            return {
+                "entries": len(self._index),
+                "dim": self._dim or 0,
+                "format": self.format,
+                "vectors_bytes": os.path.getsize(vectors_path) if vectors_path and os.path.exists(vectors_path) else 0,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def compact(self, keep_keys: Optional[Set[str]] = None, fmt: Optional[str] = None) -> Dict[str, int]:
+        """
+        Rewrite the store as a new generation with one row per key, keeping only keep_keys
+        when given and converting to fmt when given. Readers switch to the new generation
+        on their next miss.
+        """
+        with self._lock, self._exclusive():
+            self._refresh()
+            if self._dim is None or not self._index:
+                return {"before": 0, "after": 0}
+
+            keys = [key for key in self._index if keep_keys is None or key in keep_keys]
+            before_rows = len(self._vectors) if self._vectors is not None else 0
+
+            current = self._read_current()
+            number = int(current.split("-")[1]) + 1 if current else 1
+            new_generation = f"gen-{number:06d}"
+            new_dir = os.path.join(self.directory, new_generation)
+            os.makedirs(new_dir, exist_ok=True)
+            new_format = fmt or self.format
+            self._write_meta(new_dir, self._dim, new_format)
+
+            with open(os.path.join(new_dir, VECTORS_FILE), "wb") as f:
+                for start in range(0, len(keys), 10000):
+                    chunk = np.array(self._vectors[[self._index[key] for key in keys[start:start + 10000]]])
+                    if new_format != self.format:
+                        chunk = quantize(dequantize(chunk, self.format), new_format)
+                    f.write(chunk.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(os.path.join(new_dir, INDEX_FILE), "w") as f:
+                f.write("".join(f"{key} {row}\n" for row, key in enumerate(keys)))
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._write_current(new_generation)
+            self._remove_old_generations(keep=new_generation)
+            self._refresh()
+            logger.info(f"Compacted embedding store: {before_rows} rows -> {len(keys)} {self.format} rows")
+            return {"before": before_rows, "after": len(keys)}
+
+    # Internals
+
+    @contextmanager
+    def _exclusive(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_current(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.directory, "CURRENT")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _write_current(self, generation: str):
+        tmp_path = os.path.join(self.directory, "CURRENT.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(generation)
+        os.replace(tmp_path, os.path.join(self.directory, "CURRENT"))
+
+    def _generation_dir(self) -> Optional[str]:
+        return os.path.join(self.directory, self._generation) if self._generation else None
+
+    def _ensure_generation(self, dim: int) -> str:
+        if self._generation is None:
+            self._generation = "gen-000001"
+            generation_dir = os.path.join(self.directory, self._generation)
+            os.makedirs(generation_dir, exist_ok=True)
+            self._write_meta(generation_dir, dim, self.format)
+            self._dim = dim
+            self._write_current(self._generation)
+        return self._generation_dir()
+
+    def _write_meta(self, generation_dir: str, dim: int, fmt: str):
+        with open(os.path.join(generation_dir, META_FILE), "w") as f:
+            json.dump({"model": self.model_name, "dim": dim, "format": fmt}, f)
+
+    def _remove_old_generations(self, keep: str):
+        # Processes that still map an old generation keep reading it until they refresh
+        for name in os.listdir(self.directory):
+            if name.startswith("gen-") and name != keep:
+                for filename in (VECTORS_FILE, INDEX_FILE, META_FILE):
+                    try:
+                        os.remove(os.path.join(self.directory, name, filename))
+                    except OSError:
+                        pass
+                try:
+                    os.rmdir(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def _refresh(self):
+        """Pick up rows appended by other processes and generation switches (caller holds _lock)"""
+        generation = self._read_current()
+        if generation is None:
+            return
+        if generation != self._generation:
+            with open(os.path.join(self.directory, generation, META_FILE)) as f:
+                meta = json.load(f)
+            self._generation = generation
+            self._dim = meta["dim"]
+            self.format = meta["format"]
+            self._index = {}
+            self._index_offset = 0
+            self._vectors = None
+
+        generation_dir = self._generation_dir()
+        try:
+            with open(os.path.join(generation_dir, INDEX_FILE), "rb") as f:
+                f.seek(self._index_offset)
+                tail = f.read()
+        except FileNotFoundError:
+            return
+
+        # Only consume complete lines; a concurrent append may be half-written
+        complete = tail[:tail.rfind(b"\n") + 1]
+        max_row = -1
+        for line in complete.decode("ascii").splitlines():
+            key, row = line.split()
+            self._index[key] = int(row)
+            max_row = max(max_row, int(row))
+        self._index_offset += len(complete)
+
+        mapped_rows = len(self._vectors) if self._vectors is not None else 0
+        if max_row >= mapped_rows:
+            vectors_path = os.path.join(generation_dir, VECTORS_FILE)
+            dtype = record_dtype(self.format, self._dim)
+            rows = os.path.getsize(vectors_path) // dtype.itemsize
+            self._vectors = np.memmap(vectors_path, dtype=dtype, mode="r", shape=(rows,))
+
+
+_stores: Dict[str, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_embedding_store(model_name: str) -> Optional[EmbeddingStore]:
+    """The process-wide store for a model, or None when the store is disabled"""
+    if not settings.EMBEDDING_STORE_ENABLED or not NUMPY_AVAILABLE:
+        return None
+    with _stores_lock:
+        if model_name not in _stores:
+            _stores[model_name] = EmbeddingStore(
+                settings.EMBEDDING_STORE_DIR, model_name, settings.EMBEDDING_STORE_FORMAT
+            )
+        return _stores[model_name]
+
+
+def live_text_keys() -> Set[str]:
+    """Keys of all texts the grader can still be asked to embed (reference and student answers)"""
+    from database import SessionLocal
+    from models import Question, QuestionType, Submission
+
+    text_types = [QuestionType.SHORT_ANSWER, QuestionType.DESCRIPTIVE]
+    db = SessionLocal()
+    try:
+        references: Iterable = db.query(Question.correct_answer, Question.reference_answers).filter(
+            Question.question_type.in_(text_types)
+        )
+        keys = {
+            text_key(text)
+            for correct_answer, reference_answers in references
+            for text in [correct_answer, *(reference_answers or [])]
+            if text
+        }
+        answers = db.query(Submission.answer).join(Question, Question.id == Submission.question_id).filter(
+            Question.question_type.in_(text_types)
+        ).yield_per(10000)
+        keys.update(text_key(answer) for (answer,) in answers if answer)
+        return keys
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from grading.descriptive import MODEL_NAME
+    from grading.quantization import FORMATS
+
+    parser = argparse.ArgumentParser(description="Inspect or compact the embedding store")
+    parser.add_argument("command", choices=["stats", "compact"])
+    parser.add_argument("--prune", action="store_true",
+                        help="drop embeddings of texts that no longer appear in the database")
+    parser.add_argument("--format", choices=FORMATS, default=None,
+                        help="convert the stored vectors to this format while compacting")
+    args = parser.parse_args()
+
+    store = EmbeddingStore(settings.EMBEDDING_STORE_DIR, MODEL_NAME, settings.EMBEDDING_STORE_FORMAT)
+    if args.command == "stats":
+        print(json.dumps(store.stats(), indent=2))
+    else:
+        result = store.compact(keep_keys=live_text_keys() if args.prune else None, fmt=args.format)
+        print(f"Rows: {result['before']} -> {result['after']}")
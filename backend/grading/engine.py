@@ -0,0 +1,104 @@
+"""
+The grading engine: the one entry point through which answers are graded automatically.
+
+Submissions, exam submissions, regrades and grading reports all grade through
+grading_engine, so they apply the same dispatch by question type, exam policy, time
+budgets and caching, and produce the same scores for the same answer:
+
+- grade(question, answer) grades one answer.
+- grade_batch(pairs) grades many (question, answer) pairs. Identical answers to the same
+  question are graded once, and with the transformer model everything the batch will look up
+  is encoded in one batch up front (see preencode_answers).
+
+Multiple choice and true/false answers are graded by grading.mcq, short answer and
+descriptive answers by grading.descriptive.
+"""
+import logging
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from grading.budget import GradingDeadline
+from grading.descriptive import preencode_answers, score_descriptive_submission
+from grading.mcq import grade_mcq_submission
+from grading.policy import DEFAULT_POLICY, GradingPolicy
+from metrics import grading_timer, record_graded_answers
+from models import Question, QuestionType
+
+logger = logging.getLogger("grading_engine")
+
+CHOICE_TYPES = (QuestionType.MULTIPLE_CHOICE, QuestionType.TRUE_FALSE)
+TEXT_TYPES = (QuestionType.SHORT_ANSWER, QuestionType.DESCRIPTIVE)
+
+
+class Grade(NamedTuple):
+    """The grade of one answer (feedback and scores are None for choice questions)"""
+    is_correct: Optional[bool]
+    points_earned: float
+    feedback: Optional[str]
+    scores: Optional[Dict[str, Any]]
+
+
+UNGRADED = Grade(is_correct=None, points_earned=0.0, feedback=None, scores=None)
+
+
+class GradingEngine:
+    """Grades answers of every question type"""
+
+    def grade(self, question: Question, answer: Optional[str], policy: GradingPolicy = DEFAULT_POLICY,
+              deadline: Optional[GradingDeadline] = None) -> Grade:
+        """
+        Grade one answer.
+
+        Args:
+            question: The question answered
+            answer: The student's answer
+            policy: The exam's compiled grading policy
+            deadline: The deadline of the submission the answer belongs to, if any (the answer
+                also gets its own GRADING_ANSWER_BUDGET_MS)
+        """
+        with grading_timer("grade"):
+            return self._grade(question, answer or "", policy, deadline)
+
+    def grade_batch(self, pairs: Sequence[Tuple[Question, Optional[str]]], policy: GradingPolicy = DEFAULT_POLICY,
+                    deadline: Optional[GradingDeadline] = None) -> List[Grade]:
+        """
+        Grade many answers, e.g. all answers of an exam submission or a regrade batch.
+
+        Args:
+            pairs: (question, answer) pairs
+            policy: The exam's compiled grading policy
+            deadline: The deadline of the whole batch, if any (each answer also gets its own
+                GRADING_ANSWER_BUDGET_MS)
+
+        Returns:
+            The grades, in the order of pairs
+        """
+        with grading_timer("grade_batch"):
+            # Each distinct (question, answer) is graded once
+            distinct: Dict[Tuple[int, str], Tuple[Question, str]] = {}
+            for question, answer in pairs:
+                distinct.setdefault((question.id, answer or ""), (question, answer or ""))
+
+            answers_by_question: Dict[int, Tuple[Question, List[str]]] = {}
+            for question, answer in distinct.values():
+                answers_by_question.setdefault(question.id, (question, []))[1].append(answer)
+            preencode_answers(list(answers_by_question.values()))
+
+            grades = {key: self._grade(question, answer, policy, deadline) for key, (question, answer) in distinct.items()}
+            return [grades[(question.id, answer or "")] for question, answer in pairs]
+
+    def _grade(self, question: Question, answer: str, policy: GradingPolicy,
+               deadline: Optional[GradingDeadline]) -> Grade:
+        question_type = QuestionType(question.question_type)
+        record_graded_answers(question_type.value)
+        if question_type in CHOICE_TYPES:
+            is_correct, points = grade_mcq_submission(question, answer)
+            return Grade(is_correct, points, None, None)
+        if question_type in TEXT_TYPES:
+            return Grade(*score_descriptive_submission(
+                question, answer, policy, GradingDeadline.for_answer(deadline)
+            ))
+        logger.warning(f"Question {question.id} of type {question_type} cannot be graded automatically")
+        return UNGRADED
+
+
+grading_engine = GradingEngine()
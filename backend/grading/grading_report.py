@@ -4,31 +4,34 @@ This provides detailed reporting on how answers are graded.
 """
 import json
 import logging
+from difflib import SequenceMatcher
 from typing import Dict, List, Any, Optional
 from sqlalchemy.orm import Session
 
 from models import Submission, Question, Result, QuestionType, Exam
 from grading.descriptive import (
-    grade_descriptive_submission,
     basic_clean_text,
     basic_keyword_match,
-    nlp_clean_text,
-    get_semantic_similarity,
+    question_references,
     NLP_AVAILABLE,
+    TIER_METHODS,
     TRANSFORMERS_AVAILABLE
 )
-from grading.mcq import grade_mcq_submission
+from grading.engine import grading_engine
+from grading.policy import FULL_CREDIT_TIERS, NO_CREDIT, WEIGHTED_TIERS, GradingPolicy, policy_for_exam
 
 logger = logging.getLogger("grading_report")
 
 
-def generate_submission_report(submission_id: int, db: Session) -> Dict[str, Any]:
+def generate_submission_report(submission_id: int, db: Session,
+                               policy: Optional[GradingPolicy] = None) -> Dict[str, Any]:
     """
     Generate a detailed report for a specific submission showing how it was graded.
 
     Args:
         submission_id: ID of the submission
         db: Database session
+        policy: The exam's compiled grading policy (looked up from the exam if not given)
 
     Returns:
         Dictionary with detailed grading information
@@ -43,6 +46,9 @@ def generate_submission_report(submission_id: int, db: Session) -> Dict[str, Any
     if not question:
         return {"error": "Question not found"}
 
+    if policy is None:
+        policy = policy_for_exam(db.query(Exam).filter(Exam.id == submission.exam_id).first())
+
     # Initialize report
     report = {
         "submission_id": submission_id,
@@ -51,6 +57,7 @@ def generate_submission_report(submission_id: int, db: Session) -> Dict[str, Any
         "question_type": question.question_type,
         "student_answer": submission.answer,
         "correct_answer": question.correct_answer,
+        "reference_answers": question.reference_answers or [],
         "points_earned": submission.points_earned,
         "max_points": question.points,
         "percentage": round((submission.points_earned / question.points) * 100, 1) if question.points else 0,
@@ -82,55 +89,44 @@ def generate_submission_report(submission_id: int, db: Session) -> Dict[str, Any
             }
 
     elif question.question_type == QuestionType.SHORT_ANSWER or question.question_type == QuestionType.DESCRIPTIVE:
-        # For short answers and descriptive, calculate all the scores again to show details
+        # For short answers and descriptive, grade again with the engine to show the details
         try:
-            # Basic text cleaning
+            scores = grading_engine.grade(question, submission.answer, policy).scores
+            tier = scores["tier"]
+
+            # Scores are shown against the reference answer the submission is closest to
+            references = question_references(question) or [""]
+            correct_answer = references[scores.get("reference", 0)]
             submitted_clean = basic_clean_text(submission.answer)
-            correct_clean = basic_clean_text(question.correct_answer)
+            correct_clean = basic_clean_text(correct_answer)
 
-            # Basic scores
+            # The basic keyword score is shown next to the NLP one for comparison
             keyword_score = basic_keyword_match(correct_clean, submitted_clean)
-            from difflib import SequenceMatcher
-            string_similarity = SequenceMatcher(None, correct_clean, submitted_clean).ratio()
-
-            # NLP scores if available
-            nlp_keyword_score = None
-            semantic_score = None
-
-            if NLP_AVAILABLE:
-                submitted_nlp = nlp_clean_text(submission.answer)
-                correct_nlp = nlp_clean_text(question.correct_answer)
-
-                from grading.descriptive import nlp_keyword_match
-                nlp_keyword_score = nlp_keyword_match(correct_nlp, submitted_nlp)
-
-            if TRANSFORMERS_AVAILABLE:
-                semantic_score = get_semantic_similarity(question.correct_answer, submission.answer)
-
-            # Calculate combined score based on available components
-            if TRANSFORMERS_AVAILABLE and NLP_AVAILABLE:
-                combined_score = (
-                        nlp_keyword_score * 0.4 +
-                        semantic_score * 0.5 +
-                        string_similarity * 0.1
-                )
-                method = "Full NLP with transformers"
-            elif NLP_AVAILABLE:
-                combined_score = nlp_keyword_score * 0.7 + string_similarity * 0.3
-                method = "NLP without transformers"
+            nlp_keyword_score = scores["keyword"] if tier in ("nlp", "full_nlp") else None
+            string_similarity = scores.get("string")
+            if string_similarity is None:
+                string_similarity = SequenceMatcher(None, correct_clean, submitted_clean).ratio()
+            semantic_score = scores.get("semantic")
+
+            # Combined score with the exam policy's weights for the tier the answer was graded in
+            if tier in WEIGHTED_TIERS:
+                combined_score = policy.combined_score(tier, scores["keyword"], semantic_score or 0.0, string_similarity)
             else:
-                combined_score = keyword_score * 0.6 + string_similarity * 0.4
-                method = "Basic text matching"
+                # Exact and near-exact matches earn full credit, empty and ungradable answers none
+                combined_score = 1.0 if tier in FULL_CREDIT_TIERS else 0.0
 
             # Store all scores in the report
             report["grading_details"] = {
-                "method": method,
+                "method": TIER_METHODS.get(tier, tier),
+                "tier": tier,
+                "matched_reference": correct_answer,
                 "combined_score": round(combined_score, 4),
                 "basic_keyword_score": round(keyword_score, 4),
                 "string_similarity": round(string_similarity, 4),
                 "nlp_keyword_score": round(nlp_keyword_score, 4) if nlp_keyword_score is not None else None,
                 "semantic_score": round(semantic_score, 4) if semantic_score is not None else None,
-                "threshold_applied": get_threshold_info(combined_score),
+                "skipped_stages": scores.get("skipped", {}),
+                "threshold_applied": get_threshold_info(combined_score, policy),
                 "features_available": {
                     "nlp_processing": NLP_AVAILABLE,
                     "semantic_similarity": TRANSFORMERS_AVAILABLE
@@ -145,38 +141,21 @@ def generate_submission_report(submission_id: int, db: Session) -> Dict[str, Any
     return report
 
 
-def get_threshold_info(score: float) -> Dict[str, Any]:
-    """Get information about which threshold was applied for the score"""
-    if score >= 0.85:
-        return {
-            "threshold": 0.85,
-            "percentage": 100,
-            "description": "Excellent answer - full credit"
-        }
-    elif score >= 0.7:
-        return {
-            "threshold": 0.7,
-            "percentage": 90,
-            "description": "Good answer - 90% credit"
-        }
-    elif score >= 0.55:
-        return {
-            "threshold": 0.55,
-            "percentage": 70,
-            "description": "Adequate answer - 70% credit"
-        }
-    elif score >= 0.35:
-        return {
-            "threshold": 0.35,
-            "percentage": 40,
-            "description": "Poor answer - 40% credit"
-        }
-    else:
+def get_threshold_info(score: float, policy: GradingPolicy) -> Dict[str, Any]:
+    """Get information about which threshold of the policy's ladder was applied for the score"""
+    rung = policy.rung_for(score)
+    if rung is NO_CREDIT:
         return {
             "threshold": 0,
             "percentage": 0,
             "description": "Incorrect answer - no credit"
         }
+    credit = "full credit" if rung.share == 1.0 else f"{rung.share:.0%} credit"
+    return {
+        "threshold": rung.threshold,
+        "percentage": round(rung.share * 100),
+        "description": f"{rung.label} answer - {credit}"
+    }
 
 
 def generate_exam_grading_report(result_id: int, db: Session) -> Dict[str, Any]:
@@ -201,10 +180,14 @@ def generate_exam_grading_report(result_id: int, db: Session) -> Dict[str, Any]:
         Submission.exam_id == result.exam_id
     ).all()
 
+    # Get exam for the grading policy and passing score
+    exam = db.query(Exam).filter(Exam.id == result.exam_id).first()
+    policy = policy_for_exam(exam)
+
     # Generate report for each submission
     submission_reports = []
     for submission in submissions:
-        report = generate_submission_report(submission.id, db)
+        report = generate_submission_report(submission.id, db, policy)
         submission_reports.append(report)
 
     # Recalculate total points based on current submission reports
@@ -212,8 +195,6 @@ def generate_exam_grading_report(result_id: int, db: Session) -> Dict[str, Any]:
     total_possible = sum(report.get("max_points", 0) for report in submission_reports)
     percentage_score = (total_points / total_possible * 100) if total_possible > 0 else 0
 
-    # Get exam for passing score
-    exam = db.query(Exam).filter(Exam.id == result.exam_id).first()
     passing_score = exam.passing_score if exam else 50.0
     passed = percentage_score >= passing_score
 
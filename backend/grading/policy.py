@@ -0,0 +1,205 @@
+"""
+Grading policies: the score weights, thresholds and partial-credit ladder of text grading.
+
+An exam's policy is stored as JSON in Exam.grading_policy; null (or any key left out) means
+the default values, which are the ones the grader has always used:
+
+    {
+      "weights": {
+        "full_nlp": {"keyword": 0.4, "semantic": 0.5, "string": 0.1},
+        "nlp": {"keyword": 0.7, "semantic": 0.0, "string": 0.3},
+        "basic": {"keyword": 0.5, "semantic": 0.0, "string": 0.5}
+      },
+      "thresholds": [0.85, 0.7, 0.55, 0.35],
+      "credit": [1.0, 0.9, 0.7, 0.4]
+    }
+
+The tier ("full_nlp", "nlp" or "basic") depends on which NLP components are installed.
+A policy is compiled once into an immutable GradingPolicy (validated, with every lookup
+precomputed) and cached per exam, so the grader, the batch grader, regrades, grading reports
+and the what-if simulator all use the same values and grading never parses configuration.
+"""
+import copy
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+COMPONENTS = ("keyword", "semantic", "string")
+
+DEFAULT_WEIGHTS: Mapping[str, Mapping[str, float]] = MappingProxyType({
+    "full_nlp": MappingProxyType({"keyword": 0.4, "semantic": 0.5, "string": 0.1}),
+    "nlp": MappingProxyType({"keyword": 0.7, "semantic": 0.0, "string": 0.3}),
+    "basic": MappingProxyType({"keyword": 0.5, "semantic": 0.0, "string": 0.5}),
+})
+DEFAULT_THRESHOLDS = (0.85, 0.7, 0.55, 0.35)
+DEFAULT_CREDIT = (1.0, 0.9, 0.7, 0.4)
+
+WEIGHTED_TIERS = tuple(DEFAULT_WEIGHTS)
+# Tiers that give full credit before any score is weighted (see score_descriptive_submission)
+FULL_CREDIT_TIERS = ("exact_match", "normalized_match", "case_insensitive_match", "high_similarity")
+
+# Labels and feedback of the default ladder's rungs; other ladders get generic ones
+DEFAULT_LABELS = ("Excellent", "Good", "Adequate", "Poor")
+DEFAULT_FEEDBACK = (
+    "Excellent answer! All key points covered.",
+    "Good answer. Most key points covered.",
+    "Adequate answer. Some key points missing or incorrect.",
+    "Answer is on topic but missing important key points.",
+)
+NO_CREDIT_FEEDBACK = "Answer is incorrect or missing essential information."
+
+POLICY_CACHE_MAX_EXAMS = 1024
+
+
+@dataclass(frozen=True)
+class CreditRung:
+    threshold: float
+    share: float
+    is_correct: bool
+    label: str
+    feedback: str
+
+
+NO_CREDIT = CreditRung(threshold=0.0, share=0.0, is_correct=False, label="Incorrect", feedback=NO_CREDIT_FEEDBACK)
+
+
+@dataclass(frozen=True)
+class GradingPolicy:
+    """A compiled grading policy (build it with compile_policy)"""
+    weights: Mapping[str, Tuple[float, float, float]]
+    rungs: Tuple[CreditRung, ...]
+    # Thresholds in ascending order, for bisection
+    ascending_thresholds: Tuple[float, ...]
+
+    def combined_score(self, tier: str, keyword: float, semantic: float, string: float) -> float:
+        keyword_weight, semantic_weight, string_weight = self.weights[tier]
+        return keyword * keyword_weight + semantic * semantic_weight + string * string_weight
+
+    def rung_for(self, combined_score: float) -> CreditRung:
+        """The highest rung whose threshold the score reaches (NO_CREDIT below the lowest)"""
+        reached = bisect_right(self.ascending_thresholds, combined_score)
+        return self.rungs[len(self.rungs) - reached] if reached else NO_CREDIT
+
+    @property
+    def thresholds(self) -> Tuple[float, ...]:
+        return tuple(rung.threshold for rung in self.rungs)
+
+    @property
+    def credit(self) -> Tuple[float, ...]:
+        return tuple(rung.share for rung in self.rungs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "weights": {tier: dict(zip(COMPONENTS, weights)) for tier, weights in self.weights.items()},
+            "thresholds": list(self.thresholds),
+            "credit": list(self.credit),
+        }
+
+
+def compile_policy(config: Optional[Mapping[str, Any]] = None) -> GradingPolicy:
+    """
+    Validate a policy configuration and compile it, filling in defaults for missing keys.
+
+    Raises:
+        ValueError: if the configuration is invalid
+    """
+    config = config or {}
+
+    weights = {}
+    configured_weights = config.get("weights") or {}
+    unknown_tiers = set(configured_weights) - set(WEIGHTED_TIERS)
+    if unknown_tiers:
+        raise ValueError(f"Unknown grading tiers {sorted(unknown_tiers)}, expected {', '.join(WEIGHTED_TIERS)}")
+    for tier in WEIGHTED_TIERS:
+        tier_weights = configured_weights.get(tier) or DEFAULT_WEIGHTS[tier]
+        unknown_components = set(tier_weights) - set(COMPONENTS)
+        if unknown_components:
+            raise ValueError(f"Unknown score components {sorted(unknown_components)} in the {tier} weights")
+        values = tuple(float(tier_weights.get(component, 0.0)) for component in COMPONENTS)
+        if any(value < 0 for value in values):
+            raise ValueError(f"Weights of the {tier} tier must not be negative")
+        weights[tier] = values
+
+    thresholds = tuple(float(threshold) for threshold in (config.get("thresholds") or DEFAULT_THRESHOLDS))
+    credit = tuple(float(share) for share in (config.get("credit") or DEFAULT_CREDIT))
+    if any(higher <= lower for higher, lower in zip(thresholds, thresholds[1:])):
+        raise ValueError("Thresholds must be strictly decreasing")
+    if len(credit) != len(thresholds):
+        raise ValueError("There must be one credit share per threshold")
+    if any(share < 0 or share > 1 for share in credit):
+        raise ValueError("Credit shares must be between 0 and 1")
+
+    default_ladder = len(thresholds) == len(DEFAULT_THRESHOLDS)
+    rungs = tuple(
+        CreditRung(
+            threshold=threshold,
+            share=share,
+            # The two best rungs of the ladder count as correct answers
+            is_correct=index < 2,
+            label=DEFAULT_LABELS[index] if default_ladder else f"Level {index + 1}",
+            feedback=DEFAULT_FEEDBACK[index] if default_ladder else f"Answer earns {share:.0%} of the points.",
+        )
+        for index, (threshold, share) in enumerate(zip(thresholds, credit))
+    )
+    return GradingPolicy(
+        weights=MappingProxyType(weights),
+        rungs=rungs,
+        ascending_thresholds=tuple(reversed(thresholds))
+    )
+
+
+def merge_policy_config(base: Optional[Mapping[str, Any]], override: Optional[Mapping[str, Any]]) -> Dict[str, Any]:
+    """Configuration with override's non-null keys on top of base (weights are merged per tier)"""
+    merged = {key: value for key, value in (base or {}).items() if value is not None}
+    for key, value in (override or {}).items():
+        if value is None:
+            continue
+        if key == "weights":
+            merged["weights"] = {**(merged.get("weights") or {}), **value}
+        else:
+            merged[key] = value
+    return merged
+
+
+DEFAULT_POLICY = compile_policy()
+
+
+class PolicyCache:
+    """Compiled policies by exam id, recompiled only when the exam's stored configuration changes"""
+
+    def __init__(self, max_exams: int = POLICY_CACHE_MAX_EXAMS):
+        self.max_exams = max_exams
+        self._policies: "OrderedDict[int, Tuple[Any, GradingPolicy]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, exam_id: int, config: Optional[Mapping[str, Any]]) -> GradingPolicy:
+        with self._lock:
+            entry = self._policies.get(exam_id)
+            if entry is not None and entry[0] == config:
+                self._policies.move_to_end(exam_id)
+                return entry[1]
+
+        policy = compile_policy(config) if config else DEFAULT_POLICY
+        with self._lock:
+            self._policies[exam_id] = (copy.deepcopy(config), policy)
+            self._policies.move_to_end(exam_id)
+            while len(self._policies) > self.max_exams:
+                self._policies.popitem(last=False)
+        return policy
+
+    def clear(self):
+        with self._lock:
+            self._policies.clear()
+
+
+policy_cache = PolicyCache()
+
+
+def policy_for_exam(exam: Any) -> GradingPolicy:
+    """The compiled policy of an exam (anything with id and grading_policy attributes)"""
+    if exam is None:
+        return DEFAULT_POLICY
+    return policy_cache.get(exam.id, exam.grading_policy)
@@ -0,0 +1,86 @@
+"""
+Compact representations of sentence embeddings.
+
+    float32  4 bytes per dimension (MiniLM: 1536 bytes per vector)
+    float16  2 bytes per dimension (768 bytes)
+    int8     1 byte per dimension plus a float32 scale per vector (388 bytes): each vector
+             is scaled so its largest component maps to +-127
+
+Vectors are kept as numpy structured records, so a memory-mapped file of them can be
+indexed like any array. Cosine similarities are computed directly on the stored form:
+float16 is widened to float32 for the dot product, and int8 codes are multiplied as
+integers (per-vector scales cancel out of the cosine).
+
+benchmarks/quantization.py checks the similarity error and whether any grade changes.
+"""
+from typing import Tuple
+
+import numpy as np
+
+FORMATS: Tuple[str, ...] = ("float32", "float16", "int8")
+
+
+def record_dtype(fmt: str, dim: int) -> np.dtype:
+    """Structured dtype of one stored vector"""
+    if fmt == "float32":
+        return np.dtype([("values", "<f4", (dim,))])
+    if fmt == "float16":
+        return np.dtype([("values", "<f2", (dim,))])
+    if fmt == "int8":
+        return np.dtype([("scale", "<f4"), ("codes", "i1", (dim,))])
+    raise ValueError(f"Unknown embedding format '{fmt}', expected one of {', '.join(FORMATS)}")
+
+
+def quantize(vectors: np.ndarray, fmt: str) -> np.ndarray:
+    """Convert a (n, dim) float array to records of the given format"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[np.newaxis, :]
+    records = np.empty(len(vectors), dtype=record_dtype(fmt, vectors.shape[1]))
+
+    if fmt == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        records["scale"] = scales
+        records["codes"] = np.clip(np.rint(vectors / scales[:, np.newaxis]), -127, 127)
+    else:
+        records["values"] = vectors
+    return records
+
+
+def dequantize(records: np.ndarray, fmt: str) -> np.ndarray:
+    """Convert records back to a (n, dim) float32 array"""
+    if fmt == "int8":
+        return records["codes"].astype(np.float32) * records["scale"][:, np.newaxis]
+    return records["values"].astype(np.float32)
+
+
+def _dot_operands(records: np.ndarray, fmt: str) -> np.ndarray:
+    if fmt == "int8":
+        # int32 products of int8 codes cannot overflow for any realistic dimension
+        return records["codes"].astype(np.int32)
+    return records["values"].astype(np.float32)
+
+
+def cosine_similarity_matrix(a: np.ndarray, b: np.ndarray, fmt: str) -> np.ndarray:
+    """(len(a), len(b)) cosine similarities of two record arrays of the same format"""
+    a_operands = _dot_operands(a, fmt)
+    b_operands = _dot_operands(b, fmt)
+    dots = (a_operands @ b_operands.T).astype(np.float64)
+    a_norms = np.sqrt((a_operands.astype(np.float64) ** 2).sum(axis=1))
+    b_norms = np.sqrt((b_operands.astype(np.float64) ** 2).sum(axis=1))
+    return (dots / np.maximum(np.outer(a_norms, b_norms), 1e-12)).astype(np.float32)
+
+
+def paired_cosine_similarity(a: np.ndarray, b: np.ndarray, fmt: str) -> np.ndarray:
+    """Cosine similarity of a[i] and b[i] for every i"""
+    a_operands = _dot_operands(a, fmt).astype(np.float64)
+    b_operands = _dot_operands(b, fmt).astype(np.float64)
+    dots = (a_operands * b_operands).sum(axis=1)
+    norms = np.sqrt((a_operands ** 2).sum(axis=1) * (b_operands ** 2).sum(axis=1))
+    return (dots / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+def cosine_similarity(a: np.ndarray, b: np.ndarray, fmt: str) -> float:
+    """Cosine similarity of two single records"""
+    return float(cosine_similarity_matrix(a.reshape(1), b.reshape(1), fmt)[0, 0])
@@ -0,0 +1,72 @@
+"""
+What-if simulation of descriptive grading under other weights and thresholds.
+
+Automatically graded text answers store their grading tier and component scores
+(Submission.grading_scores), so points under a proposed policy can be recomputed without
+running the grader again: the scores of a whole exam are loaded into arrays, combined with
+the proposed weights of each tier in one vectorized pass and mapped onto the proposed
+partial-credit ladder with a searchsorted over the thresholds.
+
+Answers graded by an exact or near-exact match keep full credit, empty and ungradable
+answers keep zero; only the weighted tiers depend on the proposal. Submissions without
+stored scores (graded by a teacher, or before scores were stored) are left out.
+"""
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from grading.policy import COMPONENTS, FULL_CREDIT_TIERS, WEIGHTED_TIERS, GradingPolicy
+
+
+def score_arrays(rows: Sequence) -> Dict[str, np.ndarray]:
+    """
+    Column arrays of (points_possible, points_earned, grading_scores) rows.
+
+    Returns:
+        Dict with "points" and "current" (float64), "tier" (index into WEIGHTED_TIERS, -1 for
+        full credit, -2 for no credit) and "components" ((n, 3) keyword/semantic/string scores)
+    """
+    count = len(rows)
+    points = np.fromiter((row[0] or 0.0 for row in rows), dtype=np.float64, count=count)
+    current = np.fromiter((row[1] or 0.0 for row in rows), dtype=np.float64, count=count)
+    tiers = np.empty(count, dtype=np.int64)
+    components = np.zeros((count, len(COMPONENTS)), dtype=np.float64)
+
+    tier_index = {tier: index for index, tier in enumerate(WEIGHTED_TIERS)}
+    for row_index, row in enumerate(rows):
+        scores = row[2]
+        tier = scores.get("tier")
+        if tier in tier_index:
+            tiers[row_index] = tier_index[tier]
+            components[row_index] = [scores.get(component) or 0.0 for component in COMPONENTS]
+        else:
+            tiers[row_index] = -1 if tier in FULL_CREDIT_TIERS else -2
+    return {"points": points, "current": current, "tier": tiers, "components": components}
+
+
+def simulate_points(arrays: Dict[str, np.ndarray], policy: GradingPolicy) -> np.ndarray:
+    """Points each submission would earn under a grading policy"""
+    weight_matrix = np.array([policy.weights[tier] for tier in WEIGHTED_TIERS], dtype=np.float64)
+    thresholds = policy.thresholds
+    tiers = arrays["tier"]
+    weighted = tiers >= 0
+    combined = np.where(tiers == -1, np.inf, -np.inf)
+    combined[weighted] = (weight_matrix[tiers[weighted]] * arrays["components"][weighted]).sum(axis=1)
+
+    # Number of thresholds reached: the ladder is descending, so the credit index is the count missed
+    ascending = np.asarray(thresholds, dtype=np.float64)[::-1]
+    reached = np.searchsorted(ascending, combined, side="right")
+    shares = np.append(np.asarray(policy.credit, dtype=np.float64), 0.0)[len(thresholds) - reached]
+    shares[tiers == -1] = 1.0
+    return np.round(arrays["points"] * shares, 2)
+
+
+def credit_distribution(points_earned: np.ndarray, points: np.ndarray) -> Dict[str, int]:
+    """Number of submissions per share of the points earned (e.g. {"1.0": 12, "0.7": 3})"""
+    shares = np.round(np.divide(points_earned, points, out=np.zeros_like(points_earned), where=points > 0), 2)
+    values, counts = np.unique(shares, return_counts=True)
+    return {str(float(value)): int(count) for value, count in zip(values[::-1], counts[::-1])}
+
+
+def changed_indices(current: np.ndarray, proposed: np.ndarray) -> List[int]:
+    return np.flatnonzero(np.abs(proposed - current) >= 0.005).tolist()
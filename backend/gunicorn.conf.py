@@ -0,0 +1,74 @@
+"""
+Production gunicorn configuration.
+
+    gunicorn main:app -c gunicorn.conf.py
+
+The app (and with it the grading module: torch, the SentenceTransformer weights and the
+NLTK corpora) is loaded once in the master process and shared copy-on-write with the
+forked workers, instead of every worker loading its own copy. The master never runs
+inference, since thread pools started before fork can deadlock the children; each worker
+runs its own warm-up encode after it is forked. Thread pools of the numeric libraries are
+pinned so that workers x threads does not oversubscribe the CPU cores.
+
+Settings (environment variables):
+    WEB_CONCURRENCY             number of workers (default: number of CPU cores)
+    GRADING_THREADS_PER_WORKER  torch/BLAS threads per worker (default: cores / workers)
+    GUNICORN_PRELOAD            set to 0 to load the app in every worker instead
+    BIND                        address to listen on (default: 0.0.0.0:8000)
+"""
+import gc
+import logging
+import os
+
+logger = logging.getLogger("gunicorn.error")
+
+_cores = os.cpu_count() or 1
+
+workers = int(os.getenv("WEB_CONCURRENCY", str(_cores)))
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = os.getenv("BIND", "0.0.0.0:8000")
+preload_app = os.getenv("GUNICORN_PRELOAD", "1").lower() in ("1", "true", "yes")
+
+# Grading calls are short; many intra-op threads per worker only compete with the other workers
+grading_threads = int(os.getenv("GRADING_THREADS_PER_WORKER", str(max(1, _cores // max(1, workers)))))
+
+# Must be set before torch/numpy are imported, which happens when the app is preloaded
+for _variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+    os.environ.setdefault(_variable, str(grading_threads))
+# The tokenizers library warns and may deadlock when its thread pool is used before fork
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+
+def when_ready(server):
+    """Runs in the master after the app is loaded, before the workers are forked"""
+    if not preload_app:
+        return
+
+    from grading.descriptive import preload_grading_resources
+    preload_grading_resources()
+
+    # Move everything loaded so far out of the garbage collector's generations, so that
+    # collections in the workers don't write to (and thereby copy) the shared pages
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Grading resources preloaded; forking {workers} workers with {grading_threads} threads each")
+
+
+def post_fork(server, worker):
+    """Runs in each worker right after it is forked"""
+    try:
+        import torch
+        torch.set_num_threads(grading_threads)
+    except ImportError:
+        pass
+
+    if preload_app:
+        # Connections must never be shared between processes; drop any inherited from the master
+        from database import engine, read_engine
+        engine.dispose(close=False)
+        if read_engine is not engine:
+            read_engine.dispose(close=False)
+
+        # Thread pools start here, in the worker, with the thread count set above
+        from grading.descriptive import warm_up_grading_model
+        warm_up_grading_model()
@@ -0,0 +1,43 @@
+"""
+Helpers for HTTP conditional requests (ETag / If-None-Match).
+
+ETags are derived from cheap version information (version counters, graded values)
+so an endpoint can answer 304 Not Modified before loading and serializing full rows.
+"""
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Response, status
+
+# Clients may keep a copy but must revalidate it with the ETag before every use
+PRIVATE_REVALIDATE = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    """Build a strong ETag from version components"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against an ETag"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def not_modified(etag: str, cache_control: str = PRIVATE_REVALIDATE) -> Response:
+    """Empty 304 response carrying the current validators"""
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": cache_control}
+    )
+
+
+def set_cache_headers(response: Response, etag: str, cache_control: str = PRIVATE_REVALIDATE) -> Response:
+    """Attach ETag and Cache-Control headers to a full response"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    return response
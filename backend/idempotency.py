@@ -0,0 +1,292 @@
+"""
+Idempotency keys for submission endpoints.
+
+Clients that time out and retry a submission send the same Idempotency-Key header with
+every attempt. The first request reserves the key in the idempotency_keys table, runs
+normally and stores its serialized response in the same transaction as the endpoint's own
+writes, so either both are committed or neither is; retries get that stored response back
+(with an Idempotent-Replayed header) without running the endpoint or grading again.
+A retry that arrives while the first request is still running gets 409 Conflict, and one
+that arrives after IDEMPOTENCY_LOCK_TIMEOUT_SECONDS takes over the key. If the first request
+then finishes after all, its transaction is rolled back and it gets 409 Conflict too.
+
+Completed responses are also kept in a bounded in-memory cache in front of the table, so
+most replays do not touch the database. Rows are purged after IDEMPOTENCY_KEY_TTL_HOURS.
+Failed requests (errors and exceptions) release their key, so they can be retried.
+"""
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional, Tuple
+
+from fastapi import HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from metrics import record_cache_lookup
+from models import IdempotencyKey
+from serialization import dumps
+
+logger = logging.getLogger("idempotency")
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+# Expired rows are deleted at most this often (per process)
+PURGE_INTERVAL_SECONDS = 60
+
+# Reservations of the same key in one process are serialized on one of these locks
+LOCK_STRIPES = 64
+
+
+def hash_request(endpoint: str, payload: Any) -> str:
+    """Fingerprint of a request body, to detect a key being reused for a different request"""
+    return hashlib.sha256(endpoint.encode("utf-8") + b"|" + dumps(jsonable_encoder(payload))).hexdigest()
+
+
+class StoredResponse:
+    """A completed response kept for replay"""
+
+    def __init__(self, endpoint: str, request_hash: str, status_code: int, body: bytes, created_at: datetime):
+        self.endpoint = endpoint
+        self.request_hash = request_hash
+        self.status_code = status_code
+        self.body = body
+        self.created_at = created_at
+
+    def to_response(self) -> Response:
+        return Response(
+            content=self.body,
+            status_code=self.status_code,
+            media_type="application/json",
+            headers={REPLAYED_HEADER: "true"}
+        )
+
+
+class IdempotencyStore:
+    """Idempotency-key table with an in-memory cache of completed responses"""
+
+    def __init__(self, ttl_seconds: float, lock_timeout: float, max_entries: int, session_factory=SessionLocal):
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.lock_timeout = timedelta(seconds=lock_timeout)
+        self.max_entries = max_entries
+        self.session_factory = session_factory
+        self._cache: "OrderedDict[Tuple[int, str], StoredResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._last_purge = 0.0
+
+    def run(self, user_id: int, key: str, endpoint: str, payload: BaseModel, status_code: int,
+            response_model, db: Session, handler: Callable[[], Any]) -> Response:
+        """
+        Run handler once per (user, key) and replay its response to retries.
+        handler writes through db without committing; its writes are committed here together
+        with the stored response.
+        """
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters"
+            )
+
+        request_hash = hash_request(endpoint, payload)
+
+        stored = self._cached(user_id, key)
+        record_cache_lookup("idempotency", stored is not None)
+        if stored is not None:
+            return self._replay(stored, endpoint, request_hash)
+
+        # Only the reservation is serialized; the handler runs outside the lock. The token
+        # identifies this request's reservation, even after a retry takes the key over.
+        reservation = uuid.uuid4().hex
+        with self._key_locks[hash((user_id, key)) % LOCK_STRIPES]:
+            # A concurrent request with the same key may have finished while we waited
+            stored = self._cached(user_id, key)
+            if stored is None:
+                stored = self._reserve(user_id, key, endpoint, request_hash, reservation)
+            if stored is not None:
+                return self._replay(stored, endpoint, request_hash)
+
+        try:
+            result = handler()
+            body = dumps(jsonable_encoder(response_model.model_validate(result, from_attributes=True)))
+            stored = StoredResponse(endpoint, request_hash, status_code, body, datetime.now())
+            self._complete(db, user_id, key, reservation, stored)
+            db.commit()
+        except BaseException:
+            db.rollback()
+            self._release(user_id, key, reservation)
+            raise
+
+        self._remember(user_id, key, stored)
+        return Response(content=body, status_code=status_code, media_type="application/json")
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _cached(self, user_id: int, key: str) -> Optional[StoredResponse]:
+        with self._lock:
+            stored = self._cache.get((user_id, key))
+            if stored is None:
+                return None
+            if stored.created_at < datetime.now() - self.ttl:
+                del self._cache[(user_id, key)]
+                return None
+            self._cache.move_to_end((user_id, key))
+            return stored
+
+    def _remember(self, user_id: int, key: str, stored: StoredResponse):
+        with self._lock:
+            self._cache[(user_id, key)] = stored
+            self._cache.move_to_end((user_id, key))
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    @staticmethod
+    def _replay(stored: StoredResponse, endpoint: str, request_hash: str) -> Response:
+        if stored.endpoint != endpoint or stored.request_hash != request_hash:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key has already been used for a different request"
+            )
+        return stored.to_response()
+
+    def _reserve(self, user_id: int, key: str, endpoint: str, request_hash: str,
+                 reservation: str) -> Optional[StoredResponse]:
+        """Claim the key for this request; return the stored response if it has already completed"""
+        db = self.session_factory()
+        try:
+            self._purge_expired(db)
+
+            now = datetime.now()
+            db.add(IdempotencyKey(
+                user_id=user_id, key=key, endpoint=endpoint, request_hash=request_hash,
+                reservation=reservation, created_at=now
+            ))
+            try:
+                db.commit()
+                return None
+            except IntegrityError:
+                db.rollback()
+
+            # The key exists: completed, still running, or abandoned by a dead worker
+            record = db.query(IdempotencyKey).filter(
+                IdempotencyKey.user_id == user_id,
+                IdempotencyKey.key == key
+            ).first()
+            if record is None:
+                raise self._in_progress()
+
+            if record.status_code is not None and record.created_at >= now - self.ttl:
+                stored = StoredResponse(
+                    record.endpoint, record.request_hash, record.status_code,
+                    record.response_body.encode("utf-8"), record.created_at
+                )
+                self._remember(user_id, key, stored)
+                return stored
+
+            # Take over an expired or abandoned key, unless another request just did
+            expired = record.status_code is not None or record.created_at < now - self.lock_timeout
+            if expired:
+                claimed = db.query(IdempotencyKey).filter(
+                    IdempotencyKey.id == record.id,
+                    IdempotencyKey.reservation == record.reservation
+                ).update(
+                    {
+                        "endpoint": endpoint,
+                        "request_hash": request_hash,
+                        "reservation": reservation,
+                        "status_code": None,
+                        "response_body": None,
+                        "created_at": now
+                    },
+                    synchronize_session=False
+                )
+                db.commit()
+                if claimed:
+                    return None
+                raise self._in_progress()
+
+            if record.endpoint != endpoint or record.request_hash != request_hash:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Idempotency-Key has already been used for a different request"
+                )
+            raise self._in_progress()
+        finally:
+            db.close()
+
+    def _complete(self, db: Session, user_id: int, key: str, reservation: str, stored: StoredResponse):
+        """Store the response of a finished request in its own transaction (not committed here)"""
+        # Matches nothing if a retry took over the key after the lock timeout
+        completed = db.query(IdempotencyKey).filter(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.key == key,
+            IdempotencyKey.reservation == reservation,
+            IdempotencyKey.status_code.is_(None)
+        ).update(
+            {
+                "status_code": stored.status_code,
+                "response_body": stored.body.decode("utf-8"),
+                "created_at": stored.created_at
+            },
+            synchronize_session=False
+        )
+        if not completed:
+            logger.warning(f"Idempotency key of user {user_id} was taken over by a retry, discarding this request")
+            raise self._in_progress()
+
+    def _release(self, user_id: int, key: str, reservation: str):
+        """Drop the reservation of a request that failed, so it can be retried"""
+        db = self.session_factory()
+        try:
+            db.query(IdempotencyKey).filter(
+                IdempotencyKey.user_id == user_id,
+                IdempotencyKey.key == key,
+                IdempotencyKey.reservation == reservation,
+                IdempotencyKey.status_code.is_(None)
+            ).delete(synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Could not release idempotency key of user {user_id}: {str(e)}")
+        finally:
+            db.close()
+
+    def _purge_expired(self, db):
+        """Delete rows older than the retention period (rate limited)"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_purge < PURGE_INTERVAL_SECONDS:
+                return
+            self._last_purge = now
+
+        deleted = db.query(IdempotencyKey).filter(
+            IdempotencyKey.created_at < datetime.now() - self.ttl
+        ).delete(synchronize_session=False)
+        db.commit()
+        if deleted:
+            logger.info(f"Purged {deleted} expired idempotency keys")
+
+    @staticmethod
+    def _in_progress() -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still being processed"
+        )
+
+
+idempotency_store = IdempotencyStore(
+    ttl_seconds=settings.IDEMPOTENCY_KEY_TTL_HOURS * 3600,
+    lock_timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT_SECONDS,
+    max_entries=settings.IDEMPOTENCY_CACHE_MAX_ENTRIES
+)
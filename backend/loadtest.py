@@ -0,0 +1,305 @@
+"""
+Exam-day load test harness.
+
+Simulates a cohort of students sitting an exam against the real FastAPI app, either
+in-process (through an ASGI transport, using the DATABASE_URL of this environment)
+or over HTTP against a running server. Every student registers, logs in, fetches the
+exam questions, saves each answer through /submissions/single with a think time in
+between and finally submits the whole exam through /submissions/exam.
+
+Examples:
+    # In-process against a throwaway SQLite database
+    DATABASE_URL=sqlite:///./loadtest.db python loadtest.py --students 200 --concurrency 50
+
+    # Against a running server
+    python loadtest.py --base-url http://localhost:8000 --students 500 --think-time 2
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+API_PREFIX = "/api/v1"
+PASSWORD = "LoadTest123"
+
+SAMPLE_QUESTIONS = [
+    {
+        "text": "What is the output of print(2 + 2)?",
+        "question_type": "multiple_choice",
+        "points": 2.0,
+        "options": [
+            {"id": "A", "text": "4", "is_correct": True},
+            {"id": "B", "text": "2", "is_correct": False},
+            {"id": "C", "text": "22", "is_correct": False},
+            {"id": "D", "text": "Error", "is_correct": False}
+        ],
+        "answers": ["A", "A", "B", "C"]
+    },
+    {
+        "text": "Python is a compiled language.",
+        "question_type": "true_false",
+        "points": 1.0,
+        "correct_answer": "false",
+        "answers": ["false", "true", "f"]
+    },
+    {
+        "text": "What is the capital of France?",
+        "question_type": "short_answer",
+        "points": 2.0,
+        "correct_answer": "Paris is the capital of France.",
+        "answers": ["Paris", "The capital of France is Paris", "I think it's Madrid or maybe Paris"]
+    },
+    {
+        "text": "Explain what photosynthesis is.",
+        "question_type": "descriptive",
+        "points": 5.0,
+        "correct_answer": "Photosynthesis is the process by which plants convert light energy "
+                          "into chemical energy to fuel their activities.",
+        "answers": [
+            "Photosynthesis is how plants make energy from sunlight",
+            "Plants use sunlight, water, and carbon dioxide to make glucose and oxygen through photosynthesis.",
+            "It is when animals breathe."
+        ]
+    }
+]
+
+
+class LoadStats:
+    """Collects latencies and status codes per route"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.status_codes: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def record(self, route: str, latency: float, status_code: Optional[int]):
+        self.latencies[route].append(latency)
+        self.status_codes[route][status_code or 0] += 1
+        if status_code is None or status_code >= 400:
+            self.errors[route] += 1
+
+    @staticmethod
+    def percentile(values: List[float], pct: float) -> float:
+        """Nearest-rank percentile of a list of values"""
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+        return ordered[index]
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = (self.finished_at or time.perf_counter()) - (self.started_at or time.perf_counter())
+        total_requests = sum(len(v) for v in self.latencies.values())
+        total_errors = sum(self.errors.values())
+
+        routes = {}
+        for route, values in sorted(self.latencies.items()):
+            routes[route] = {
+                "requests": len(values),
+                "errors": self.errors[route],
+                "error_rate": self.errors[route] / len(values) if values else 0.0,
+                "throughput_rps": len(values) / elapsed if elapsed > 0 else 0.0,
+                "p50_ms": self.percentile(values, 50) * 1000,
+                "p90_ms": self.percentile(values, 90) * 1000,
+                "p95_ms": self.percentile(values, 95) * 1000,
+                "p99_ms": self.percentile(values, 99) * 1000,
+                "max_ms": max(values) * 1000 if values else 0.0,
+                "status_codes": dict(self.status_codes[route])
+            }
+
+        return {
+            "elapsed_seconds": elapsed,
+            "total_requests": total_requests,
+            "total_errors": total_errors,
+            "error_rate": total_errors / total_requests if total_requests else 0.0,
+            "throughput_rps": total_requests / elapsed if elapsed > 0 else 0.0,
+            "routes": routes
+        }
+
+
+class ExamDaySimulation:
+    """Drives one exam sitting for a cohort of simulated students"""
+
+    def __init__(self, client: httpx.AsyncClient, args: argparse.Namespace):
+        self.client = client
+        self.args = args
+        self.stats = LoadStats()
+        self.rng = random.Random(args.seed)
+        self.run_id = uuid.uuid4().hex[:8]
+        self.exam_id: Optional[int] = None
+        self.questions: List[Dict[str, Any]] = []
+
+    async def request(self, route: str, method: str, url: str, record: bool = True, **kwargs) -> Optional[httpx.Response]:
+        """Send a request and record its latency under the route template"""
+        start = time.perf_counter()
+        response = None
+        try:
+            response = await self.client.request(method, API_PREFIX + url, **kwargs)
+        except httpx.HTTPError as e:
+            print(f"{route} failed: {e}")
+        if record:
+            self.stats.record(route, time.perf_counter() - start, response.status_code if response is not None else None)
+        return response
+
+    async def think(self):
+        """Pause like a student reading or typing"""
+        if self.args.think_time > 0:
+            await asyncio.sleep(self.rng.uniform(0.5, 1.5) * self.args.think_time)
+
+    async def register_and_login(self, username: str, role: str, record: bool = True) -> Optional[Dict[str, str]]:
+        await self.request(
+            "POST /auth/register", "POST", "/auth/register", record=record,
+            json={
+                "email": f"{username}@loadtest.example.com",
+                "username": username,
+                "full_name": f"Load Test {role.title()}",
+                "password": PASSWORD,
+                "role": role
+            }
+        )
+        response = await self.request(
+            "POST /auth/login", "POST", "/auth/login", record=record,
+            json={"username": username, "password": PASSWORD}
+        )
+        if response is None or response.status_code != 200:
+            return None
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def setup_exam(self):
+        """Create an active exam with the sample questions (not measured)"""
+        headers = await self.register_and_login(f"lt_teacher_{self.run_id}", "teacher", record=False)
+        if headers is None:
+            raise RuntimeError("Could not register the load test teacher")
+
+        response = await self.client.post(
+            f"{API_PREFIX}/exams/", headers=headers,
+            json={"title": f"Load test exam {self.run_id}", "status": "active", "duration_minutes": 60}
+        )
+        response.raise_for_status()
+        self.exam_id = response.json()["id"]
+
+        for order in range(self.args.questions):
+            sample = SAMPLE_QUESTIONS[order % len(SAMPLE_QUESTIONS)]
+            payload = {k: v for k, v in sample.items() if k != "answers"}
+            response = await self.client.post(
+                f"{API_PREFIX}/exams/questions/", headers=headers,
+                json={**payload, "exam_id": self.exam_id, "order": order + 1}
+            )
+            response.raise_for_status()
+            self.questions.append({**response.json(), "answers": sample["answers"]})
+
+    async def run_student(self, index: int, semaphore: asyncio.Semaphore):
+        # Spread student arrival over the ramp-up period
+        if self.args.ramp_up > 0:
+            await asyncio.sleep(self.args.ramp_up * index / max(1, self.args.students))
+
+        async with semaphore:
+            headers = await self.register_and_login(f"lt_{self.run_id}_{index}", "student")
+            if headers is None:
+                return
+
+            response = await self.request(
+                "GET /exams/{exam_id}/questions", "GET", f"/exams/{self.exam_id}/questions", headers=headers
+            )
+            if response is None or response.status_code != 200:
+                return
+
+            answers = []
+            for question in self.questions:
+                await self.think()
+                answer = self.rng.choice(question["answers"])
+                answers.append({"question_id": question["id"], "answer": answer})
+                await self.request(
+                    "POST /submissions/single", "POST", "/submissions/single", headers=headers,
+                    json={"exam_id": self.exam_id, "question_id": question["id"], "answer": answer}
+                )
+
+            await self.think()
+            await self.request(
+                "POST /submissions/exam", "POST", "/submissions/exam", headers=headers,
+                json={"exam_id": self.exam_id, "submissions": answers}
+            )
+
+    async def run(self) -> Dict[str, Any]:
+        await self.setup_exam()
+
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        self.stats.started_at = time.perf_counter()
+        await asyncio.gather(*(self.run_student(i, semaphore) for i in range(self.args.students)))
+        self.stats.finished_at = time.perf_counter()
+
+        return self.stats.summary()
+
+
+def print_summary(summary: Dict[str, Any]):
+    """Print the load test results as a table"""
+    print()
+    print(f"Elapsed: {summary['elapsed_seconds']:.2f}s  "
+          f"Requests: {summary['total_requests']}  "
+          f"Throughput: {summary['throughput_rps']:.1f} req/s  "
+          f"Errors: {summary['total_errors']} ({summary['error_rate'] * 100:.2f}%)")
+    print()
+    header = f"{'Route':<34}{'Reqs':>7}{'Err%':>7}{'RPS':>8}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    print(header)
+    print("-" * len(header))
+    for route, data in summary["routes"].items():
+        print(f"{route:<34}{data['requests']:>7}{data['error_rate'] * 100:>6.1f}%{data['throughput_rps']:>8.1f}"
+              f"{data['p50_ms']:>9.1f}{data['p90_ms']:>9.1f}{data['p95_ms']:>9.1f}"
+              f"{data['p99_ms']:>9.1f}{data['max_ms']:>9.1f}")
+    print("(latencies in milliseconds)")
+
+
+async def run_load_test(args: argparse.Namespace) -> Dict[str, Any]:
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=timeout, limits=limits)
+    else:
+        # Import the app lazily so HTTP mode doesn't load the grading models
+        from database import create_tables
+        from main import app
+
+        # The ASGI transport doesn't run startup events, so create the schema here
+        create_tables()
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=timeout, limits=limits
+        )
+
+    async with client:
+        return await ExamDaySimulation(client, args).run()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Exam-day load test for the Online Exam System API")
+    parser.add_argument("--base-url", default=None,
+                        help="URL of a running server; omit to drive the app in-process")
+    parser.add_argument("--students", type=int, default=50, help="Number of simulated students")
+    parser.add_argument("--concurrency", type=int, default=50, help="Maximum students active at once")
+    parser.add_argument("--questions", type=int, default=len(SAMPLE_QUESTIONS), help="Questions in the exam")
+    parser.add_argument("--think-time", type=float, default=0.5,
+                        help="Mean pause between a student's actions, in seconds")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Seconds over which students arrive")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for answers and think times")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the summary to this JSON file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    results = asyncio.run(run_load_test(arguments))
+    print_summary(results)
+
+    if arguments.json_path:
+        with open(arguments.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Summary written to {arguments.json_path}")
@@ -1,13 +1,22 @@
 """
 Main application file for Online Exam System with Automatic Grading.
 """
+import hmac
+from typing import Optional
+
 import uvicorn
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Header, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from config import settings
-from database import create_tables
+from database import create_tables, engine, read_engine
+from drafts import draft_buffer
+from metrics import MetricsMiddleware, register_pool_gauges, render_metrics
+from query_tracker import QueryTrackingMiddleware, instrument_engines
+from profiling import ProfilingMiddleware
+from serialization import FastJSONResponse
 from routes import api_router
 
 # Initialize FastAPI app
@@ -18,6 +27,7 @@ app = FastAPI(
     docs_url="/api/docs",
     redoc_url="/api/redoc",
     openapi_url="/api/openapi.json",
+    default_response_class=FastJSONResponse,
 )
 
 # Set up CORS middleware
@@ -29,6 +39,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large responses (result lists, grading reports)
+app.add_middleware(GZipMiddleware, minimum_size=settings.GZIP_MINIMUM_SIZE)
+
+# Record per-route request latency for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Count SQL statements per request and log slow or N+1-looking requests
+if settings.SQL_QUERY_TRACKING:
+    instrument_engines({engine, read_engine})
+    app.add_middleware(QueryTrackingMiddleware)
+
+# Let admins profile individual requests with the X-Profile header
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# Expose connection pool usage of the primary and (if configured) replica engines
+register_pool_gauges({"primary": engine} if read_engine is engine else {"primary": engine, "replica": read_engine})
+
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
@@ -46,6 +74,27 @@ async def root():
         }
     )
 
+def require_metrics_token(authorization: Optional[str] = Header(None)):
+    """Only a scraper presenting METRICS_TOKEN as its bearer token may read the metrics"""
+    expected = f"Bearer {settings.METRICS_TOKEN}".encode("utf-8")
+    if not hmac.compare_digest((authorization or "").encode("utf-8"), expected):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+# Metrics endpoint, only served when a token is configured
+if settings.METRICS_TOKEN:
+    @app.get("/metrics", tags=["Root"], include_in_schema=False, dependencies=[Depends(require_metrics_token)])
+    async def metrics():
+        """
+        Prometheus metrics: request latency, grading stage timings, grading tiers,
+        cache hit ratios and database pool usage.
+        """
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Startup event - create database tables if they don't exist
 @app.on_event("startup")
 async def startup_event():
@@ -58,6 +107,17 @@ async def startup_event():
     except Exception as e:
         print(f"Error during database setup: {e}")
 
+    # Start flushing autosaved draft answers in the background
+    draft_buffer.start()
+
+# Shutdown event - write out buffered draft answers
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Flush buffered draft answers before the process exits.
+    """
+    draft_buffer.stop()
+
 if __name__ == "__main__":
     # Run the application with uvicorn when this file is executed directly
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
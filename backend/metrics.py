@@ -0,0 +1,302 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Provides counters, histograms and callback gauges that are cheap enough to record on
+every request and every grading stage, an ASGI middleware that times requests per
+route template and status code, and render_metrics() for the /metrics endpoint.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Latency buckets in seconds, from sub-millisecond grading stages up to slow exam submissions
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(label_names, label_values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing counter with optional labels"""
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def samples(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.samples().items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets and optional labels"""
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(label_values)
+            if counts is None:
+                counts = self._counts[label_values] = [0] * (len(self.buckets) + 1)
+                self._sums[label_values] = 0.0
+            counts[index] += 1
+            self._sums[label_values] += value
+
+    @contextmanager
+    def time(self, *label_values: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: (list(counts), self._sums[labels]) for labels, counts in self._counts.items()}
+
+        for label_values, (counts, total) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, label_values, le)} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Gauge without labels that can go up and down"""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_format_value(self._value)}"
+        ]
+
+
+class CallbackGauge:
+    """Gauge whose samples are collected from a callback at scrape time"""
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str],
+                 callback: Callable[[], Dict[Tuple[str, ...], float]]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            samples = self.callback()
+        except Exception:
+            samples = {}
+        for label_values, value in sorted(samples.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+
+# Metrics registry, rendered in this order
+REGISTRY: List = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+REQUEST_LATENCY = register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route and status",
+    ("method", "route", "status")
+))
+REQUESTS_IN_PROGRESS = register(Gauge("http_requests_in_progress", "HTTP requests currently being served"))
+
+GRADING_STAGE_LATENCY = register(Histogram(
+    "grading_stage_duration_seconds", "Time spent in each descriptive grading stage", ("stage",)
+))
+GRADING_TIER = register(Counter(
+    "grading_tier_total", "Descriptive answers graded, by the tier that decided the grade", ("tier",)
+))
+GRADING_LATENCY = register(Histogram(
+    "grading_duration_seconds", "Time to grade one answer (grade) or a batch of answers (grade_batch)",
+    ("entry_point",)
+))
+GRADED_ANSWERS = register(Counter(
+    "graded_answers_total", "Answers graded by the grading engine, by question type", ("question_type",)
+))
+CACHE_REQUESTS = register(Counter(
+    "cache_requests_total", "Cache lookups by cache and result", ("cache", "result")
+))
+
+
+def _cache_hit_ratios() -> Dict[Tuple[str, ...], float]:
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), value in CACHE_REQUESTS.samples().items():
+        hits_and_total = totals.setdefault(cache, [0.0, 0.0])
+        hits_and_total[1] += value
+        if result == "hit":
+            hits_and_total[0] += value
+    return {(cache,): hits / total for cache, (hits, total) in totals.items() if total}
+
+
+register(CallbackGauge("cache_hit_ratio", "Fraction of cache lookups that were hits", ("cache",), _cache_hit_ratios))
+
+
+def stage_timer(stage: str):
+    """Context manager timing one grading stage"""
+    return GRADING_STAGE_LATENCY.time(stage)
+
+
+def grading_timer(entry_point: str):
+    """Context manager timing one call of a grading engine entry point"""
+    return GRADING_LATENCY.time(entry_point)
+
+
+def record_grading_tier(tier: str):
+    GRADING_TIER.inc(tier)
+
+
+def record_graded_answers(question_type: str, count: int = 1):
+    GRADED_ANSWERS.inc(question_type, amount=count)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+def register_pool_gauges(engines: Dict[str, object]):
+    """
+    Expose connection pool gauges for the given SQLAlchemy engines.
+    Pools without size accounting (e.g. StaticPool) are skipped.
+    """
+    def collect(attribute: str) -> Callable[[], Dict[Tuple[str, ...], float]]:
+        def callback():
+            samples = {}
+            for name, db_engine in engines.items():
+                pool_method = getattr(db_engine.pool, attribute, None)
+                if callable(pool_method):
+                    samples[(name,)] = pool_method()
+            return samples
+        return callback
+
+    register(CallbackGauge("db_pool_size", "Configured connection pool size", ("engine",), collect("size")))
+    register(CallbackGauge("db_pool_checked_out", "Connections currently in use", ("engine",), collect("checkedout")))
+    register(CallbackGauge("db_pool_checked_in", "Idle connections in the pool", ("engine",), collect("checkedin")))
+    register(CallbackGauge("db_pool_overflow", "Connections above the pool size", ("engine",), collect("overflow")))
+
+
+def render_metrics() -> str:
+    """Render all registered metrics in the Prometheus text format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request latency per route template and status.
+    Routes are labelled by their path template so label cardinality stays bounded.
+    """
+
+    def __init__(self, app, excluded_paths: Iterable[str] = ("/metrics",)):
+        self.app = app
+        self.excluded_paths = set(excluded_paths)
+
+    @staticmethod
+    def _route_template(scope) -> str:
+        """
+        Path template of the request, e.g. /api/v1/exams/{exam_id}/questions.
+        Built from the matched path parameters so it works regardless of router nesting.
+        """
+        if scope.get("endpoint") is None:
+            return "unmatched"
+
+        param_names = {str(value): name for name, value in scope.get("path_params", {}).items()}
+        segments = []
+        for segment in scope["path"].split("/"):
+            if segment in param_names:
+                segment = "{" + param_names.pop(segment) + "}"
+            segments.append(segment)
+        return "/".join(segments)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status_holder = {"status": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - start, scope["method"], self._route_template(scope), str(status_holder["status"])
+            )
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, Float, DateTime, Enum, JSON
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, Float, DateTime, Enum, JSON, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -25,6 +25,13 @@ class ExamStatus(str, enum.Enum):
     COMPLETED = "completed"
     ARCHIVED = "archived"
 
+class RegradeStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    SUPERSEDED = "superseded"
+    FAILED = "failed"
+
 # User model
 class User(Base):
     __tablename__ = "users"
@@ -58,14 +65,19 @@ class Exam(Base):
     is_randomized = Column(Boolean, default=False)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    # Incremented on every change to the exam or its questions (ETags and the question cache)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     start_time = Column(DateTime, nullable=True)
     end_time = Column(DateTime, nullable=True)
+    # Weights, thresholds and partial credit of text grading (null: defaults, see grading/policy.py)
+    grading_policy = Column(JSON(none_as_null=True), nullable=True)
 
     # Relationships
     creator = relationship("User", back_populates="exams_created")
     questions = relationship("Question", back_populates="exam", cascade="all, delete-orphan")
     submissions = relationship("Submission", back_populates="exam", cascade="all, delete-orphan")
     results = relationship("Result", back_populates="exam", cascade="all, delete-orphan")
+    draft_answers = relationship("DraftAnswer", cascade="all, delete-orphan")
 
 # Question model
 class Question(Base):
@@ -79,6 +91,7 @@ class Question(Base):
     order = Column(Integer)
     options = Column(JSON, nullable=True)  # For multiple choice: [{"id": "A", "text": "Option A", "is_correct": true}, ...]
     correct_answer = Column(Text, nullable=True)  # For non-multiple choice questions
+    reference_answers = Column(JSON, nullable=True)  # Other acceptable answers: ["...", ...]
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
@@ -100,6 +113,10 @@ class Submission(Base):
     submitted_at = Column(DateTime, default=func.now())
     graded_at = Column(DateTime, nullable=True)
     grading_feedback = Column(Text, nullable=True)
+    # Tier and component scores of automatic text grading: {"tier", "keyword", "semantic", "string"}
+    grading_scores = Column(JSON(none_as_null=True), nullable=True)
+    # Set when a teacher grades the submission by hand; regrades leave such grades alone
+    graded_manually = Column(Boolean, nullable=False, default=False, server_default="0")
 
     # Relationships
     student = relationship("User", back_populates="submissions")
@@ -122,4 +139,55 @@ class Result(Base):
 
     # Relationships
     student = relationship("User", back_populates="results")
-    exam = relationship("Exam", back_populates="results")
\ No newline at end of file
+    exam = relationship("Exam", back_populates="results")
+
+# Draft answer model (autosaved answers, written in bulk by the draft buffer)
+class DraftAnswer(Base):
+    __tablename__ = "draft_answers"
+    __table_args__ = (
+        UniqueConstraint("student_id", "question_id", name="uq_draft_answers_student_question"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    exam_id = Column(Integer, ForeignKey("exams.id"), nullable=False, index=True)
+    question_id = Column(Integer, ForeignKey("questions.id"), nullable=False)
+    answer = Column(Text)
+    saved_at = Column(DateTime, default=func.now())
+
+# Idempotency key model (responses of retried submissions, kept for IDEMPOTENCY_KEY_TTL_HOURS)
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    key = Column(String(255), nullable=False)
+    endpoint = Column(String(100), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    # Random token of the request holding the key (a retry taking the key over replaces it)
+    reservation = Column(String(32), nullable=True)
+    # Null until the first request has finished (the key is reserved while it runs)
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now(), index=True)
+
+# Regrade job model (progress of regrading a question's submissions after its answer key changed)
+class RegradeJob(Base):
+    __tablename__ = "regrade_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), nullable=False, index=True)
+    exam_id = Column(Integer, ForeignKey("exams.id"), nullable=False)
+    requested_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    status = Column(Enum(RegradeStatus), default=RegradeStatus.PENDING, nullable=False)
+    total_submissions = Column(Integer, default=0)
+    processed_submissions = Column(Integer, default=0)
+    changed_submissions = Column(Integer, default=0)
+    results_updated = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,186 @@
+"""
+Opt-in per-request profiling for administrators.
+
+An admin sends the X-Profile header with a request; the endpoint then runs under cProfile
+in the thread that actually executes it (sync endpoints run in a threadpool, so the
+profiler is started inside the endpoint call rather than in the middleware). The profile
+is written to a rotating directory and its name returned in the X-Profile-Id response
+header, to be downloaded through /profiles/{profile_id}.
+
+Profiling is off unless PROFILING_ENABLED is set; the middleware, the endpoint wrappers
+(route_class is then a plain APIRoute) and /profiles are only installed when it is. With
+profiling on, requests without the header only pay for one header lookup and one context
+variable read.
+"""
+import asyncio
+import contextvars
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import time
+import uuid
+from typing import Any, Callable, List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+from config import settings
+from database import SessionLocal
+from utils import get_current_user, check_admin_privileges
+
+logger = logging.getLogger("profiling")
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+# Profile requested for the request currently being served
+_requested_profile: contextvars.ContextVar = contextvars.ContextVar("requested_profile", default=None)
+
+
+class RequestProfile:
+    """Holds the profile of one request until it is written to disk"""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.profile_id: Optional[str] = None
+
+    def save(self, profiler: cProfile.Profile):
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        route_name = self.path.strip("/").replace("/", "_") or "root"
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}_{self.method}_{route_name}_{uuid.uuid4().hex[:6]}.prof"
+        profiler.dump_stats(os.path.join(settings.PROFILE_DIR, profile_id))
+        self.profile_id = profile_id
+        rotate_profiles()
+
+
+def rotate_profiles():
+    """Keep only the newest PROFILE_MAX_FILES profiles"""
+    profiles = list_profiles()
+    for profile_id in profiles[settings.PROFILE_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(settings.PROFILE_DIR, profile_id))
+        except OSError as e:
+            logger.warning(f"Could not remove old profile {profile_id}: {str(e)}")
+
+
+def list_profiles() -> List[str]:
+    """Stored profile ids, newest first"""
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    names = [name for name in os.listdir(settings.PROFILE_DIR) if name.endswith(".prof")]
+    return sorted(names, key=lambda name: os.path.getmtime(os.path.join(settings.PROFILE_DIR, name)), reverse=True)
+
+
+def get_profile_path(profile_id: str) -> Optional[str]:
+    """Path of a stored profile, or None for unknown ids (ids never contain path separators)"""
+    if os.path.basename(profile_id) != profile_id or not profile_id.endswith(".prof"):
+        return None
+    path = os.path.join(settings.PROFILE_DIR, profile_id)
+    return path if os.path.isfile(path) else None
+
+
+def format_profile(path: str, limit: int = 60, sort_by: str = "cumulative") -> str:
+    """Render a stored profile as a pstats text report"""
+    stream = io.StringIO()
+    stats = pstats.Stats(path, stream=stream)
+    stats.strip_dirs().sort_stats(sort_by).print_stats(limit)
+    return stream.getvalue()
+
+
+def profiled_endpoint(endpoint: Callable) -> Callable:
+    """Wrap an endpoint so it runs under cProfile when the current request asked for it"""
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            request_profile = _requested_profile.get()
+            if request_profile is None:
+                return await endpoint(*args, **kwargs)
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profiler.disable()
+                request_profile.save(profiler)
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        request_profile = _requested_profile.get()
+        if request_profile is None:
+            return endpoint(*args, **kwargs)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profiler.disable()
+            request_profile.save(profiler)
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """API route whose endpoint can be profiled per request"""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs):
+        super().__init__(path, profiled_endpoint(endpoint), **kwargs)
+
+
+# Route class of the API routers: endpoints are only wrapped when profiling is enabled
+route_class = ProfiledRoute if settings.PROFILING_ENABLED else APIRoute
+
+
+async def _authorize_admin(scope) -> Optional[JSONResponse]:
+    """Return an error response unless the request carries an admin's bearer token"""
+    headers = dict(scope.get("headers", []))
+    authorization = headers.get(b"authorization", b"").decode()
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return JSONResponse({"detail": "Profiling requires an administrator token"}, status_code=401)
+
+    db = SessionLocal()
+    try:
+        user = await get_current_user(token=token, db=db)
+        check_admin_privileges(user)
+    except HTTPException as e:
+        return JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+    finally:
+        db.close()
+    return None
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware enabling the profiler for admin requests sent with X-Profile"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not any(name == PROFILE_HEADER for name, _ in scope.get("headers", [])):
+            await self.app(scope, receive, send)
+            return
+
+        error_response = await _authorize_admin(scope)
+        if error_response is not None:
+            await error_response(scope, receive, send)
+            return
+
+        request_profile = RequestProfile(scope["method"], scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and request_profile.profile_id:
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_ID_HEADER, request_profile.profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _requested_profile.set(request_profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _requested_profile.reset(token)
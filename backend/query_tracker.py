@@ -0,0 +1,167 @@
+"""
+Per-request SQL statement tracking.
+
+When enabled, SQLAlchemy cursor events count every statement executed on behalf of a
+request. Slow requests and requests that run the same statement many times (the usual
+N+1 pattern of lazy relationship loads or per-row queries in a loop) are logged together
+with their statement list. count_queries() offers the same counting for a block of code
+and backs the query_budget pytest fixture.
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterable, List, Optional
+
+from sqlalchemy import event
+
+from config import settings
+
+logger = logging.getLogger("query_tracker")
+
+# Statement collector of the request currently being served (copied into threadpool workers)
+_current_collector: contextvars.ContextVar = contextvars.ContextVar("sql_query_collector", default=None)
+
+# Collectors opened with count_queries(), which see statements from every thread
+_global_collectors: List["QueryCollector"] = []
+_global_lock = threading.Lock()
+
+_instrumented_engines = set()
+
+
+class QueryCollector:
+    """Statements executed within one request or block"""
+
+    def __init__(self):
+        self.statements: List[str] = []
+        self.durations: List[float] = []
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def total_time(self) -> float:
+        return sum(self.durations)
+
+    def add(self, statement: str, duration: float):
+        with self._lock:
+            self.statements.append(statement)
+            self.durations.append(duration)
+
+    def repeated_statements(self, threshold: int) -> List[tuple]:
+        """Statements (with literals stripped) executed at least `threshold` times"""
+        shapes = Counter(normalize_statement(statement) for statement in self.statements)
+        return [(statement, count) for statement, count in shapes.most_common() if count >= threshold]
+
+    def format_statements(self) -> str:
+        return "\n".join(
+            f"  [{i + 1}] {duration * 1000:.2f}ms {' '.join(statement.split())}"
+            for i, (statement, duration) in enumerate(zip(self.statements, self.durations))
+        )
+
+
+def normalize_statement(statement: str) -> str:
+    """Collapse whitespace and literal values so repeated statements compare equal"""
+    statement = re.sub(r"\s+", " ", statement).strip()
+    statement = re.sub(r"'[^']*'", "?", statement)
+    statement = re.sub(r"\b\d+\b", "?", statement)
+    return statement
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_time")
+    duration = time.perf_counter() - start_times.pop() if start_times else 0.0
+
+    collector = _current_collector.get()
+    if collector is not None:
+        collector.add(statement, duration)
+
+    if _global_collectors:
+        with _global_lock:
+            for global_collector in _global_collectors:
+                global_collector.add(statement, duration)
+
+
+def instrument_engines(engines: Iterable):
+    """Attach the statement counting hooks to the given engines (idempotent)"""
+    for db_engine in engines:
+        if id(db_engine) in _instrumented_engines:
+            continue
+        event.listen(db_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(db_engine, "after_cursor_execute", _after_cursor_execute)
+        _instrumented_engines.add(id(db_engine))
+
+
+@contextmanager
+def count_queries():
+    """
+    Count the statements executed on instrumented engines inside the block,
+    from any thread (e.g. a TestClient running the app in its own thread).
+    """
+    collector = QueryCollector()
+    with _global_lock:
+        _global_collectors.append(collector)
+    try:
+        yield collector
+    finally:
+        with _global_lock:
+            _global_collectors.remove(collector)
+
+
+class QueryTrackingMiddleware:
+    """
+    Pure ASGI middleware that tracks the SQL statements of each request.
+    Adds an X-SQL-Query-Count header and logs slow or N+1-looking requests with their statements.
+    """
+
+    def __init__(self, app, slow_request_ms: Optional[float] = None, max_queries: Optional[int] = None,
+                 repeat_threshold: Optional[int] = None):
+        self.app = app
+        self.slow_request_ms = slow_request_ms if slow_request_ms is not None else settings.SLOW_REQUEST_MS
+        self.max_queries = max_queries if max_queries is not None else settings.SQL_QUERY_WARN_COUNT
+        self.repeat_threshold = repeat_threshold if repeat_threshold is not None else settings.SQL_REPEAT_WARN_COUNT
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        collector = QueryCollector()
+        token = _current_collector.set(collector)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-sql-query-count", str(collector.count).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_collector.reset(token)
+            self.report(scope, collector, time.perf_counter() - start)
+
+    def report(self, scope, collector: QueryCollector, elapsed: float):
+        request_line = f"{scope['method']} {scope['path']}"
+        repeated = collector.repeated_statements(self.repeat_threshold)
+
+        if repeated:
+            for statement, count in repeated:
+                logger.warning(f"Possible N+1 in {request_line}: statement ran {count} times: {statement}")
+
+        if elapsed * 1000 >= self.slow_request_ms or collector.count > self.max_queries or repeated:
+            logger.warning(
+                f"{request_line} took {elapsed * 1000:.1f}ms with {collector.count} SQL statements "
+                f"({collector.total_time * 1000:.1f}ms in the database):\n{collector.format_statements()}"
+            )
@@ -0,0 +1,140 @@
+"""
+Pre-rendered question payloads for exams.
+
+When an exam starts, every enrolled student requests its questions within seconds. The
+serialized question list is therefore cached per exam and keyed by the exam's version
+counter (incremented with every change to the exam or its questions), so a change made
+through any worker is picked up on the next request. Concurrent misses for the same exam are coalesced: one request
+loads and renders the rows while the others wait for its result (single flight).
+
+Each question is rendered to its own JSON fragment, so per-student shuffles of
+randomized exams are just a reordering of fragments, with no extra queries.
+"""
+import logging
+import random
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from config import settings
+from http_cache import make_etag
+from metrics import record_cache_lookup
+from models import Question
+from serialization import QUESTION_RESPONSE_COLUMNS, dumps, rows_to_dicts
+
+logger = logging.getLogger("question_cache")
+
+
+def student_order(exam_id: int, student_id: int, count: int) -> List[int]:
+    """
+    Positions of an exam's questions (sorted by id) in a student's order of a randomized exam,
+    stable across requests and workers
+    """
+    order = list(range(count))
+    random.Random(f"{exam_id}:{student_id}").shuffle(order)
+    return order
+
+
+class QuestionPayload:
+    """Rendered question list of one exam at one version"""
+
+    def __init__(self, exam_id: int, version: int, fragments: List[bytes]):
+        self.exam_id = exam_id
+        self.version = version
+        self.fragments = fragments
+        self.body = b"[" + b",".join(fragments) + b"]"
+        self.etag = make_etag("questions", exam_id, version)
+
+    def shuffled_body(self, student_id: int) -> bytes:
+        """Question list in a student-specific order that is stable across requests and workers"""
+        order = student_order(self.exam_id, student_id, len(self.fragments))
+        return b"[" + b",".join(self.fragments[i] for i in order) + b"]"
+
+    def shuffled_etag(self, student_id: int) -> str:
+        return make_etag("questions", self.exam_id, self.version, "student", student_id)
+
+
+class _Flight:
+    """A load in progress that other requests can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.payload: Optional[QuestionPayload] = None
+
+
+class QuestionPayloadCache:
+    """Bounded LRU cache of rendered question payloads with single-flight loading"""
+
+    def __init__(self, max_exams: int = 256, wait_timeout: float = 10.0):
+        self.max_exams = max_exams
+        self.wait_timeout = wait_timeout
+        self._payloads: "OrderedDict[int, QuestionPayload]" = OrderedDict()
+        self._in_flight: Dict[int, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, exam_id: int, version: int) -> QuestionPayload:
+        """Return the payload for the given exam version, loading it at most once concurrently"""
+        with self._lock:
+            payload = self._payloads.get(exam_id)
+            if payload is not None and payload.version == version:
+                self._payloads.move_to_end(exam_id)
+                record_cache_lookup("exam_questions", True)
+                return payload
+
+            record_cache_lookup("exam_questions", False)
+            flight = self._in_flight.get(exam_id)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._in_flight[exam_id] = _Flight()
+
+        if not is_leader:
+            # Another request is already loading this exam, share its result
+            if flight.done.wait(self.wait_timeout) and flight.payload is not None \
+                    and flight.payload.version == version:
+                return flight.payload
+            return self._load(db, exam_id, version)
+
+        try:
+            flight.payload = self._load(db, exam_id, version)
+            self._store(flight.payload)
+            return flight.payload
+        finally:
+            with self._lock:
+                self._in_flight.pop(exam_id, None)
+            flight.done.set()
+
+    def warm(self, db: Session, exam_id: int, version: int):
+        """Render and cache an exam's questions ahead of the first request (e.g. when it becomes active)"""
+        self._store(self._load(db, exam_id, version))
+        logger.info(f"Pre-rendered questions for exam {exam_id}")
+
+    def invalidate(self, exam_id: int):
+        with self._lock:
+            self._payloads.pop(exam_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._payloads.clear()
+
+    def _store(self, payload: QuestionPayload):
+        with self._lock:
+            self._payloads[payload.exam_id] = payload
+            self._payloads.move_to_end(payload.exam_id)
+            while len(self._payloads) > self.max_exams:
+                self._payloads.popitem(last=False)
+
+    @staticmethod
+    def _load(db: Session, exam_id: int, version: int) -> QuestionPayload:
+        rows = db.query(*QUESTION_RESPONSE_COLUMNS).filter(
+            Question.exam_id == exam_id
+        ).order_by(Question.id).all()
+        fragments = [dumps(question) for question in rows_to_dicts(rows)]
+        return QuestionPayload(exam_id, version, fragments)
+
+
+question_payload_cache = QuestionPayloadCache(
+    max_exams=settings.QUESTION_CACHE_MAX_EXAMS,
+    wait_timeout=settings.QUESTION_CACHE_WAIT_SECONDS
+)
@@ -0,0 +1,255 @@
+"""
+Regrading of a question's submissions after its answer key changes.
+
+update_question creates a RegradeJob when the type, points, options, correct answer or
+reference answers of a question that already has submissions change, and runs it as a
+background task once the response is sent. The job streams the question's submissions in
+id order, REGRADE_BATCH_SIZE at a time (keyset pagination, so memory does not grow with the
+cohort), grades each batch with grading_engine.grade_batch and writes the rows whose grade
+changed with one executemany UPDATE. Submissions a teacher graded by hand (graded_manually)
+keep their grade. Each batch is committed together with the job's
+progress counters, so GET /exams/regrade-jobs/{job_id} shows how far it got. After the last
+batch, the result of every student whose grade changed is re-totalled once. When the
+question's points or type changed, the exam's total changed too, so every result of the
+exam is re-totalled (streamed by student id in batches), including those of students who
+skipped the question. Creating or deleting a question re-totals the exam's results in the
+same way (run_exam_retotal).
+
+A job stops as superseded as soon as a newer job for the same question exists: the newer
+job regrades everything against the latest key.
+"""
+import logging
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from grading.budget import GradingDeadline
+from grading.engine import grading_engine
+from grading.policy import policy_for_exam
+from models import Exam, Question, RegradeJob, RegradeStatus, Result, Submission
+
+logger = logging.getLogger("regrade")
+
+# Question fields that change the grade of existing submissions
+ANSWER_KEY_FIELDS = ("question_type", "points", "options", "correct_answer", "reference_answers")
+# Answer key fields that can change the exam's total points, and so every student's percentage
+TOTAL_FIELDS = ("question_type", "points")
+
+
+def retotal_results(db: Session, exam_id: int, student_ids: Iterable[int]) -> int:
+    """
+    Recompute total points, percentage and pass/fail of the given students' results for an
+    exam with grouped queries and one executemany UPDATE. Does not commit.
+
+    Returns:
+        Number of results updated
+    """
+    student_ids = set(student_ids)
+    if not student_ids:
+        return 0
+
+    results = db.query(Result.id, Result.student_id).filter(
+        Result.exam_id == exam_id,
+        Result.student_id.in_(student_ids)
+    ).all()
+    if not results:
+        return 0
+
+    # Answers to deleted questions no longer count
+    totals = dict(db.query(Submission.student_id, func.sum(Submission.points_earned)).join(
+        Question, Question.id == Submission.question_id
+    ).filter(
+        Submission.exam_id == exam_id,
+        Question.exam_id == exam_id,
+        Submission.student_id.in_(student_ids)
+    ).group_by(Submission.student_id).all())
+    total_possible = db.query(func.sum(Question.points)).filter(Question.exam_id == exam_id).scalar() or 0
+    passing_score = db.query(Exam.passing_score).filter(Exam.id == exam_id).scalar()
+
+    rows = []
+    for result in results:
+        total_points = totals.get(result.student_id) or 0
+        percentage_score = (total_points / total_possible * 100) if total_possible > 0 else 0
+        rows.append({
+            "id": result.id,
+            "total_points": total_points,
+            "percentage_score": percentage_score,
+            "passed": percentage_score >= passing_score,
+        })
+    db.execute(update(Result), rows)
+    return len(rows)
+
+
+def create_regrade_job(db: Session, question: Question, requested_by: int) -> Optional[RegradeJob]:
+    """Record a pending regrade of a question's automatic grades (None if there are none). Commits."""
+    total = db.query(func.count(Submission.id)).filter(
+        Submission.question_id == question.id,
+        Submission.graded_manually.is_(False)
+    ).scalar()
+    if not total:
+        return None
+
+    job = RegradeJob(
+        question_id=question.id,
+        exam_id=question.exam_id,
+        requested_by=requested_by,
+        status=RegradeStatus.PENDING,
+        total_submissions=total
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def retotal_exam_results(db: Session, exam_id: int, batch_size: int) -> int:
+    """
+    Re-total every result of an exam, batch_size students at a time (keyset pagination by
+    student id), e.g. after its total points changed. Does not commit.
+
+    Returns:
+        Number of results updated
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        student_ids = [row[0] for row in db.query(Result.student_id).filter(
+            Result.exam_id == exam_id,
+            Result.student_id > last_id
+        ).order_by(Result.student_id).limit(batch_size).all()]
+        if not student_ids:
+            return updated
+        updated += retotal_results(db, exam_id, student_ids)
+        last_id = student_ids[-1]
+
+
+def run_exam_retotal(exam_id: int, batch_size: Optional[int] = None):
+    """Re-total every result of an exam after a question was added or deleted (run as a background task)"""
+    db = SessionLocal()
+    try:
+        updated = retotal_exam_results(db, exam_id, batch_size or settings.REGRADE_BATCH_SIZE)
+        db.commit()
+        if updated:
+            logger.info(f"Re-totalled {updated} results of exam {exam_id}")
+    except Exception:
+        db.rollback()
+        logger.exception(f"Re-totalling the results of exam {exam_id} failed")
+    finally:
+        db.close()
+
+
+def _is_superseded(db: Session, job: RegradeJob) -> bool:
+    return db.query(RegradeJob.id).filter(
+        RegradeJob.question_id == job.question_id,
+        RegradeJob.id > job.id
+    ).first() is not None
+
+
+def run_regrade_job(job_id: int, batch_size: Optional[int] = None, retotal_all: bool = False):
+    """
+    Regrade the submissions of a job's question in batches (run as a background task).
+    With retotal_all, every result of the exam is re-totalled, not only those of students
+    whose grade changed (needed when the exam's total points changed).
+    """
+    batch_size = batch_size or settings.REGRADE_BATCH_SIZE
+    db = SessionLocal()
+    try:
+        job = db.query(RegradeJob).filter(RegradeJob.id == job_id).first()
+        if not job or job.status != RegradeStatus.PENDING:
+            return
+
+        job.status = RegradeStatus.RUNNING
+        job.started_at = datetime.now()
+        db.commit()
+
+        try:
+            _regrade(db, job, batch_size, retotal_all)
+        except Exception as e:
+            db.rollback()
+            logger.exception(f"Regrade job {job.id} failed")
+            job.status = RegradeStatus.FAILED
+            job.error = str(e)
+            job.finished_at = datetime.now()
+            db.commit()
+    finally:
+        db.close()
+
+
+def _regrade(db: Session, job: RegradeJob, batch_size: int, retotal_all: bool):
+    question = db.query(Question).filter(Question.id == job.question_id).first()
+    if not question:
+        raise ValueError(f"Question {job.question_id} no longer exists")
+    policy = policy_for_exam(db.query(Exam).filter(Exam.id == job.exam_id).first())
+
+    # Only the ids of students whose grade changed are kept across batches
+    changed_students = set()
+    last_id = 0
+    status = RegradeStatus.COMPLETED
+    while True:
+        if _is_superseded(db, job):
+            # Results already changed by this job are still re-totalled below
+            status = RegradeStatus.SUPERSEDED
+            logger.info(f"Regrade job {job.id} superseded after {job.processed_submissions} submissions")
+            break
+
+        batch = db.query(
+            Submission.id, Submission.student_id, Submission.answer,
+            Submission.is_correct, Submission.points_earned, Submission.grading_feedback,
+            Submission.grading_scores
+        ).filter(
+            Submission.question_id == job.question_id,
+            Submission.graded_manually.is_(False),
+            Submission.id > last_id
+        ).order_by(Submission.id).limit(batch_size).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        # Only rows whose grade actually changed are written. Without a time budget every
+        # answer is graded at the full tier, so a busy server never shows up as a grade change.
+        grades = grading_engine.grade_batch(
+            [(question, submission.answer) for submission in batch], policy, GradingDeadline.unlimited()
+        )
+        graded_at = datetime.now()
+        rows = []
+        for submission, grade in zip(batch, grades):
+            current = (submission.is_correct, submission.points_earned, submission.grading_feedback,
+                       submission.grading_scores)
+            if current == grade:
+                continue
+            is_correct, points, feedback, scores = grade
+            rows.append({
+                "id": submission.id,
+                "is_correct": is_correct,
+                "points_earned": points,
+                "grading_feedback": feedback,
+                "grading_scores": scores,
+                "graded_at": graded_at,
+            })
+            changed_students.add(submission.student_id)
+
+        # The batch's updates and the job's progress are committed together
+        if rows:
+            db.execute(update(Submission), rows)
+        job.processed_submissions += len(batch)
+        job.changed_submissions += len(rows)
+        db.commit()
+        logger.info(f"Regrade job {job.id}: {job.processed_submissions}/{job.total_submissions} submissions, "
+                    f"{job.changed_submissions} changed")
+
+    # Each affected result is re-totalled once, in chunks of batch_size students
+    if retotal_all:
+        job.results_updated += retotal_exam_results(db, job.exam_id, batch_size)
+    else:
+        student_ids = sorted(changed_students)
+        for start in range(0, len(student_ids), batch_size):
+            job.results_updated += retotal_results(db, job.exam_id, student_ids[start:start + batch_size])
+    job.status = status
+    job.finished_at = datetime.now()
+    db.commit()
+    logger.info(f"Regrade job {job.id} {status.value}: {job.changed_submissions} submissions changed, "
+                f"{job.results_updated} results updated")
@@ -1,5 +1,6 @@
 from fastapi import APIRouter
-from routes import auth, users, exams, submissions
+from config import settings
+from routes import auth, users, exams, submissions, profiles
 
 # Create main API router
 api_router = APIRouter()
@@ -8,4 +9,6 @@ api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["authentication"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(exams.router, prefix="/exams", tags=["exams"])
-api_router.include_router(submissions.router, prefix="/submissions", tags=["submissions"])
\ No newline at end of file
+api_router.include_router(submissions.router, prefix="/submissions", tags=["submissions"])
+if settings.PROFILING_ENABLED:
+    api_router.include_router(profiles.router, prefix="/profiles", tags=["profiling"])
\ No newline at end of file
@@ -14,8 +14,9 @@ from utils import (
     create_access_token,
     get_current_user
 )
+from profiling import route_class
 
-router = APIRouter()
+router = APIRouter(route_class=route_class)
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
@@ -1,20 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
-from sqlalchemy.orm import Session
-from typing import Any, List
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, status, Response
+from sqlalchemy.orm import Session, selectinload
+from typing import Any, List, Optional
 
 from database import get_db
-from models import User, Exam, Question, UserRole, ExamStatus
+from models import User, Exam, Question, RegradeJob, UserRole, ExamStatus
 from schemas import (
     ExamCreate,
     ExamUpdate,
     ExamResponse,
     QuestionCreate,
     QuestionUpdate,
-    QuestionResponse
+    QuestionResponse,
+    RegradeJobResponse
 )
-from utils import get_current_user, check_teacher_privileges
+from utils import get_current_user, get_read_db, check_teacher_privileges
+from http_cache import make_etag, etag_matches, not_modified, set_cache_headers
+from question_cache import question_payload_cache, student_order
+from regrade import ANSWER_KEY_FIELDS, TOTAL_FIELDS, create_regrade_job, run_exam_retotal, run_regrade_job
+from profiling import route_class
 
-router = APIRouter()
+router = APIRouter(route_class=route_class)
+
+
+def bump_exam_version(db: Session, exam_id: int):
+    """
+    Increment an exam's version, in the caller's transaction. Called for every change to the
+    exam or its questions, so ETags and cached question payloads never outlive a change.
+    """
+    db.query(Exam).filter(Exam.id == exam_id).update(
+        {Exam.version: Exam.version + 1}, synchronize_session=False
+    )
 
 
 # Exam routes
@@ -44,17 +59,18 @@ def get_exams(
         skip: int = 0,
         limit: int = 100,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ) -> Any:
     """
     Retrieve exams. Teachers and admins can see all exams.
     Students can only see published and active exams.
     """
-    # Different queries based on user role
+    # Different queries based on user role; the embedded questions of all exams load in one query
+    query = db.query(Exam).options(selectinload(Exam.questions))
     if current_user.role in [UserRole.TEACHER, UserRole.ADMIN]:
-        exams = db.query(Exam).offset(skip).limit(limit).all()
+        exams = query.offset(skip).limit(limit).all()
     else:
-        exams = db.query(Exam).filter(
+        exams = query.filter(
             Exam.status.in_([ExamStatus.PUBLISHED, ExamStatus.ACTIVE])
         ).offset(skip).limit(limit).all()
 
@@ -64,15 +80,19 @@ def get_exams(
 @router.get("/{exam_id}", response_model=ExamResponse)
 def get_exam(
         exam_id: int,
+        response: Response,
+        if_none_match: Optional[str] = Header(None),
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ) -> Any:
     """
     Get a specific exam by id.
+    Supports If-None-Match: returns 304 when the exam and its questions are unchanged.
+    For randomized exams, students get the questions in their own order (as from /questions).
     """
-    # Get exam
-    exam = db.query(Exam).filter(Exam.id == exam_id).first()
-    if not exam:
+    # Get only the exam's version columns; the full exam is loaded when the client's copy is stale
+    exam_version = db.query(Exam.status, Exam.is_randomized, Exam.version).filter(Exam.id == exam_id).first()
+    if not exam_version:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Exam not found"
@@ -80,13 +100,29 @@ def get_exam(
 
     # Check permissions based on role and exam status
     if current_user.role not in [UserRole.TEACHER, UserRole.ADMIN]:
-        if exam.status not in [ExamStatus.PUBLISHED, ExamStatus.ACTIVE]:
+        if exam_version.status not in [ExamStatus.PUBLISHED, ExamStatus.ACTIVE]:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You don't have permission to access this exam"
             )
 
-    return exam
+    # The version also changes with the embedded questions; a shuffled order is per student
+    shuffle = exam_version.is_randomized and current_user.role == UserRole.STUDENT
+    etag = make_etag("exam", exam_id, exam_version.version)
+    if shuffle:
+        etag = make_etag("exam", exam_id, exam_version.version, "student", current_user.id)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    exam = db.query(Exam).filter(Exam.id == exam_id).first()
+    set_cache_headers(response, etag)
+
+    if not shuffle:
+        return exam
+    exam_response = ExamResponse.model_validate(exam, from_attributes=True)
+    questions = sorted(exam_response.questions, key=lambda question: question.id)
+    exam_response.questions = [questions[i] for i in student_order(exam_id, current_user.id, len(questions))]
+    return exam_response
 
 
 @router.put("/{exam_id}", response_model=ExamResponse)
@@ -116,12 +152,18 @@ def update_exam(
 
     # Update exam
     update_data = exam_in.dict(exclude_unset=True)
+    becomes_active = update_data.get("status") == ExamStatus.ACTIVE and exam.status != ExamStatus.ACTIVE
     for key, value in update_data.items():
         setattr(exam, key, value)
+    bump_exam_version(db, exam.id)
 
     db.commit()
     db.refresh(exam)
 
+    # Pre-render the questions before the students' first requests arrive
+    if becomes_active:
+        question_payload_cache.warm(db, exam.id, exam.version)
+
     return exam
 
 
@@ -160,11 +202,13 @@ def delete_exam(
 @router.post("/questions/", response_model=QuestionResponse, status_code=status.HTTP_201_CREATED)
 def create_question(
         question_in: QuestionCreate,
+        background_tasks: BackgroundTasks,
         current_user: User = Depends(get_current_user),
         db: Session = Depends(get_db)
 ) -> Any:
     """
     Create a new question for an exam.
+    Results already submitted for the exam are re-totalled in the background.
     """
     # Get exam
     exam = db.query(Exam).filter(Exam.id == question_in.exam_id).first()
@@ -184,8 +228,13 @@ def create_question(
     # Create question
     db_question = Question(**question_in.dict())
     db.add(db_question)
+    bump_exam_version(db, exam.id)
     db.commit()
     db.refresh(db_question)
+    question_payload_cache.invalidate(db_question.exam_id)
+
+    # The exam's total points changed, and with it every result's percentage
+    background_tasks.add_task(run_exam_retotal, exam.id)
 
     return db_question
 
@@ -194,11 +243,15 @@ def create_question(
 def update_question(
         question_id: int,
         question_in: QuestionUpdate,
+        response: Response,
+        background_tasks: BackgroundTasks,
         current_user: User = Depends(get_current_user),
         db: Session = Depends(get_db)
 ) -> Any:
     """
     Update a question.
+    If the answer key changes, existing submissions are regraded in the background; the
+    regrade job's id is returned in the X-Regrade-Job header.
     """
     # Get question
     question = db.query(Question).filter(Question.id == question_id).first()
@@ -220,23 +273,103 @@ def update_question(
 
     # Update question
     update_data = question_in.dict(exclude_unset=True)
+    changed_fields = {key for key, value in update_data.items() if getattr(question, key) != value}
+    answer_key_changed = bool(changed_fields.intersection(ANSWER_KEY_FIELDS))
+    # A new point value or type changes the exam's total, so every student's percentage
+    total_changed = bool(changed_fields.intersection(TOTAL_FIELDS))
     for key, value in update_data.items():
         setattr(question, key, value)
+    bump_exam_version(db, question.exam_id)
 
     db.commit()
     db.refresh(question)
+    question_payload_cache.invalidate(question.exam_id)
+
+    # Regrade existing submissions against the new key after the response is sent
+    job = create_regrade_job(db, question, current_user.id) if answer_key_changed else None
+    if job:
+        background_tasks.add_task(run_regrade_job, job.id, retotal_all=total_changed)
+        response.headers["X-Regrade-Job"] = str(job.id)
+    elif total_changed:
+        # Nothing to regrade, but the exam's total changed
+        background_tasks.add_task(run_exam_retotal, question.exam_id)
 
     return question
 
 
+@router.post("/questions/{question_id}/regrade", response_model=RegradeJobResponse,
+             status_code=status.HTTP_202_ACCEPTED)
+def regrade_question(
+        question_id: int,
+        background_tasks: BackgroundTasks,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+) -> Any:
+    """
+    Regrade all submissions to a question against its current answer key, in the background.
+    """
+    # Get question
+    question = db.query(Question).filter(Question.id == question_id).first()
+    if not question:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Question not found"
+        )
+
+    # Get exam to check permissions
+    exam = db.query(Exam).filter(Exam.id == question.exam_id).first()
+
+    # Check permissions
+    if current_user.role != UserRole.ADMIN and exam.creator_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have permission to regrade questions in this exam"
+        )
+
+    job = create_regrade_job(db, question, current_user.id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Question has no submissions to regrade"
+        )
+    # A manual regrade also repairs results re-totalled against an outdated exam total
+    background_tasks.add_task(run_regrade_job, job.id, retotal_all=True)
+
+    return job
+
+
+@router.get("/regrade-jobs/{job_id}", response_model=RegradeJobResponse)
+def get_regrade_job(
+        job_id: int,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_read_db)
+) -> Any:
+    """
+    Get the progress of a regrade job. Only teachers and admins can see regrade jobs.
+    """
+    check_teacher_privileges(current_user)
+
+    job = db.query(RegradeJob).filter(RegradeJob.id == job_id).first()
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Regrade job not found"
+        )
+
+    return job
+
+
 @router.delete("/questions/{question_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_question(
         question_id: int,
+        background_tasks: BackgroundTasks,
         current_user: User = Depends(get_current_user),
         db: Session = Depends(get_db)
 ):
     """
     Delete a question.
+    Results already submitted for the exam are re-totalled in the background, without the
+    question's points.
     """
     # Get question
     question = db.query(Question).filter(Question.id == question_id).first()
@@ -258,21 +391,28 @@ def delete_question(
 
     # Delete question
     db.delete(question)
+    bump_exam_version(db, exam.id)
     db.commit()
+    question_payload_cache.invalidate(exam.id)
+    background_tasks.add_task(run_exam_retotal, exam.id)
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 @router.get("/{exam_id}/questions", response_model=List[QuestionResponse])
 def get_exam_questions(
         exam_id: int,
+        if_none_match: Optional[str] = Header(None),
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ) -> Any:
     """
     Get all questions for a specific exam.
+    Supports If-None-Match: returns 304 when no question has changed.
+    Questions are served from a pre-rendered per-exam payload; for randomized exams
+    each student gets their own stable question order.
     """
-    # Get exam
-    exam = db.query(Exam).filter(Exam.id == exam_id).first()
+    # Get exam status, randomization and version only, the questions come from the payload cache
+    exam = db.query(Exam.status, Exam.is_randomized, Exam.version).filter(Exam.id == exam_id).first()
     if not exam:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -287,15 +427,25 @@ def get_exam_questions(
                 detail="You don't have permission to access this exam's questions"
             )
 
-    # Get questions
-    questions = db.query(Question).filter(Question.exam_id == exam_id).all()
-    return questions
+    shuffle = exam.is_randomized and current_user.role == UserRole.STUDENT
+
+    # Answer from the exam's version before touching any question rows
+    etag = make_etag("questions", exam_id, exam.version)
+    if shuffle:
+        etag = make_etag("questions", exam_id, exam.version, "student", current_user.id)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    # Concurrent misses for the same exam share a single load
+    payload = question_payload_cache.get(db, exam_id, exam.version)
+    body = payload.shuffled_body(current_user.id) if shuffle else payload.body
+    return set_cache_headers(Response(content=body, media_type="application/json"), etag)
 
 @router.get("/questions/{question_id}", response_model=QuestionResponse)
 def get_question(
     question_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> Any:
     """
     Get a specific question by id.
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse, PlainTextResponse
+from typing import Any, List
+
+from models import User
+from utils import get_current_user, check_admin_privileges
+from profiling import route_class, list_profiles, get_profile_path, format_profile
+
+router = APIRouter(route_class=route_class)
+
+
+@router.get("/", response_model=List[str])
+def get_profiles(current_user: User = Depends(get_current_user)) -> Any:
+    """
+    List stored request profiles, newest first. Only admins can access this endpoint.
+    """
+    check_admin_privileges(current_user)
+
+    return list_profiles()
+
+
+@router.get("/{profile_id}")
+def download_profile(
+        profile_id: str,
+        format: str = "prof",
+        sort_by: str = "cumulative",
+        current_user: User = Depends(get_current_user)
+) -> Any:
+    """
+    Download a stored request profile. Only admins can access this endpoint.
+    format=prof returns the raw cProfile dump (for snakeviz or pstats),
+    format=text returns a pstats report sorted by `sort_by`.
+    """
+    check_admin_privileges(current_user)
+
+    path = get_profile_path(profile_id)
+    if not path:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+
+    if format == "text":
+        try:
+            return PlainTextResponse(format_profile(path, sort_by=sort_by))
+        except KeyError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown sort key: {sort_by}"
+            )
+
+    return FileResponse(path, media_type="application/octet-stream", filename=profile_id)
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
-from typing import Any, List
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status, Response
+from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, update
+from typing import Any, List, Optional
 from datetime import datetime
+import time
 
+import numpy as np
 
 from database import get_db
 from models import (
@@ -12,6 +14,7 @@ from models import (
     Question,
     Submission,
     Result,
+    DraftAnswer,
     UserRole,
     ExamStatus,
     QuestionType
@@ -20,24 +23,59 @@ from schemas import (
     SubmissionCreate,
     SubmissionResponse,
     ExamSubmission,
-    ResultResponse
+    ResultResponse,
+    DraftAnswerResponse,
+    ClusterGrade,
+    ClusterGradeResponse,
+    GradingSimulation
 )
-from utils import get_current_user
-from grading.mcq import grade_mcq_submission
-from grading.descriptive import grade_descriptive_submission
+from utils import get_current_user, get_read_db, check_teacher_privileges
+from grading.budget import GradingDeadline
+from grading.engine import grading_engine
+from grading.plagiarism import find_near_duplicates, group_pairs
+from grading.clustering import cluster_answers
+from grading import simulation
+from grading.policy import compile_policy, merge_policy_config, policy_for_exam
+from profiling import route_class
+from serialization import (
+    FastJSONResponse,
+    RESULT_RESPONSE_COLUMNS,
+    SUBMISSION_RESPONSE_COLUMNS,
+    rows_to_dicts
+)
+from http_cache import make_etag, etag_matches, not_modified, set_cache_headers
+from drafts import draft_buffer
+from idempotency import idempotency_store
+from regrade import retotal_results
 
-router = APIRouter()
+router = APIRouter(route_class=route_class)
 
 
 @router.post("/single", response_model=SubmissionResponse, status_code=status.HTTP_201_CREATED)
 def submit_answer(
         submission_in: SubmissionCreate,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_db),
+        idempotency_key: Optional[str] = Header(None)
 ) -> Any:
     """
     Submit an answer for a single question in an exam.
+    Retries sent with the same Idempotency-Key header get the first response back.
     """
+    if idempotency_key:
+        return idempotency_store.run(
+            current_user.id, idempotency_key, "submit_answer", submission_in,
+            status.HTTP_201_CREATED, SubmissionResponse, db,
+            lambda: _submit_answer(submission_in, current_user, db)
+        )
+    new_submission = _submit_answer(submission_in, current_user, db)
+    db.commit()
+    db.refresh(new_submission)
+    return new_submission
+
+
+def _submit_answer(submission_in: SubmissionCreate, current_user: User, db: Session) -> Submission:
+    """Create and grade a single submission (the caller commits)"""
     # Get exam and check if it's active
     exam = db.query(Exam).filter(Exam.id == submission_in.exam_id).first()
     if not exam:
@@ -51,6 +89,7 @@ def submit_answer(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Exam is not active for submissions"
         )
+    policy = policy_for_exam(exam)
 
     # Get question
     question = db.query(Question).filter(
@@ -85,43 +124,105 @@ def submit_answer(
     )
 
     db.add(new_submission)
-    db.commit()
-    db.refresh(new_submission)
+    db.flush()
 
-    # Grade the submission based on question type
-    if question.question_type in [QuestionType.MULTIPLE_CHOICE, QuestionType.TRUE_FALSE]:
-        # Automatic grading for MCQ and True/False
-        is_correct, points = grade_mcq_submission(question, new_submission.answer)
-        new_submission.is_correct = is_correct
-        new_submission.points_earned = points
-        new_submission.graded_at = datetime.now()
-    elif question.question_type in [QuestionType.SHORT_ANSWER, QuestionType.DESCRIPTIVE]:
-        # Semi-automatic grading for short answers
-        is_correct, points, feedback = grade_descriptive_submission(
-            question,
-            new_submission.answer
-        )
-        new_submission.is_correct = is_correct
-        new_submission.points_earned = points
-        new_submission.grading_feedback = feedback
-        new_submission.graded_at = datetime.now()
-    # For descriptive answers, leave grading to teachers
+    # Grade the submission
+    grade = grading_engine.grade(question, new_submission.answer, policy)
+    new_submission.is_correct = grade.is_correct
+    new_submission.points_earned = grade.points_earned
+    new_submission.grading_feedback = grade.feedback
+    new_submission.grading_scores = grade.scores
+    new_submission.graded_at = datetime.now()
 
-    db.commit()
+    db.flush()
     db.refresh(new_submission)
 
     return new_submission
 
 
+@router.put("/drafts", response_model=DraftAnswerResponse, status_code=status.HTTP_202_ACCEPTED)
+def save_draft_answer(
+        draft_in: SubmissionCreate,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+) -> Any:
+    """
+    Autosave a draft answer. Drafts are buffered and written to the database in bulk,
+    so the response only acknowledges that the save was accepted.
+    """
+    # Check that the question belongs to an active exam
+    question = db.query(Question.id).join(Exam, Exam.id == Question.exam_id).filter(
+        Question.id == draft_in.question_id,
+        Question.exam_id == draft_in.exam_id,
+        Exam.status == ExamStatus.ACTIVE
+    ).first()
+    if not question:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Question not found in an active exam"
+        )
+
+    saved_at = draft_buffer.save(current_user.id, draft_in.exam_id, draft_in.question_id, draft_in.answer)
+
+    return {"question_id": draft_in.question_id, "answer": draft_in.answer, "saved_at": saved_at}
+
+
+@router.get("/drafts/{exam_id}", response_model=List[DraftAnswerResponse])
+def get_draft_answers(
+        exam_id: int,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+) -> Any:
+    """
+    Get the current user's draft answers for an exam, including saves not yet flushed by
+    this worker (saves buffered by other workers appear once they are flushed).
+    """
+    drafts = {
+        draft.question_id: {"question_id": draft.question_id, "answer": draft.answer, "saved_at": draft.saved_at}
+        for draft in db.query(DraftAnswer.question_id, DraftAnswer.answer, DraftAnswer.saved_at).filter(
+            DraftAnswer.student_id == current_user.id,
+            DraftAnswer.exam_id == exam_id
+        )
+    }
+
+    # A buffered save wins unless another worker already flushed a newer one
+    for pending in draft_buffer.pending_for(current_user.id, exam_id):
+        stored = drafts.get(pending["question_id"])
+        if stored and stored["saved_at"] and stored["saved_at"] > pending["saved_at"]:
+            continue
+        drafts[pending["question_id"]] = {
+            "question_id": pending["question_id"],
+            "answer": pending["answer"],
+            "saved_at": pending["saved_at"]
+        }
+
+    return list(drafts.values())
+
+
 @router.post("/exam", response_model=ResultResponse, status_code=status.HTTP_201_CREATED)
 def submit_exam(
         exam_submission: ExamSubmission,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_db),
+        idempotency_key: Optional[str] = Header(None)
 ) -> Any:
     """
     Submit answers for all questions in an exam and get the result.
+    Retries sent with the same Idempotency-Key header get the first result back without regrading.
     """
+    if idempotency_key:
+        return idempotency_store.run(
+            current_user.id, idempotency_key, "submit_exam", exam_submission,
+            status.HTTP_201_CREATED, ResultResponse, db,
+            lambda: _submit_exam(exam_submission, current_user, db)
+        )
+    result = _submit_exam(exam_submission, current_user, db)
+    db.commit()
+    return result
+
+
+def _submit_exam(exam_submission: ExamSubmission, current_user: User, db: Session) -> Any:
+    """Grade and store all answers of an exam and create its result (the caller commits)"""
     # Get exam and check if it's active
     exam = db.query(Exam).filter(Exam.id == exam_submission.exam_id).first()
     if not exam:
@@ -148,15 +249,17 @@ def submit_exam(
             detail="You have already completed this exam"
         )
 
+    # Persist the student's buffered drafts before the final submission
+    draft_buffer.flush(student_id=current_user.id)
+
     # Get all questions in the exam
     exam_questions = db.query(Question).filter(Question.exam_id == exam_submission.exam_id).all()
     question_dict = {q.id: q for q in exam_questions}
 
     total_points_possible = sum(q.points for q in exam_questions)
-
-    # Process each submission
-    submissions = []
-    points_earned = 0
+    policy = policy_for_exam(exam)
+    # Every answer is graded within its own budget and the whole submission's
+    deadline = GradingDeadline.for_submission()
 
     for sub in exam_submission.submissions:
         if sub.question_id not in question_dict:
@@ -165,56 +268,40 @@ def submit_exam(
                 detail=f"Question {sub.question_id} is not in this exam"
             )
 
-        question = question_dict[sub.question_id]
-
-        # Create submission
-        new_submission = Submission(
-            student_id=current_user.id,
-            exam_id=exam_submission.exam_id,
-            question_id=sub.question_id,
-            answer=sub.answer,
-        )
-
-        # Grade the submission based on question type
-        if question.question_type in [QuestionType.MULTIPLE_CHOICE, QuestionType.TRUE_FALSE]:
-            # Automatic grading for MCQ and True/False
-            is_correct, points = grade_mcq_submission(question, sub.answer)
-            new_submission.is_correct = is_correct
-            new_submission.points_earned = points
-            points_earned += points
-            new_submission.graded_at = datetime.now()
-
-        elif question.question_type == QuestionType.SHORT_ANSWER:
-            # Semi-automatic grading for short answers
-            is_correct, points, feedback = grade_descriptive_submission(
-                question,
-                sub.answer
-            )
-            new_submission.is_correct = is_correct
-            new_submission.points_earned = points
-            points_earned += points
-            new_submission.grading_feedback = feedback
-            new_submission.graded_at = datetime.now()
-
-        elif question.question_type == QuestionType.DESCRIPTIVE:
-            # Automatic grading for descriptive answers too
-            is_correct, points, feedback = grade_descriptive_submission(question, sub.answer)
-            new_submission.is_correct = is_correct
-            new_submission.points_earned = points
-            new_submission.grading_feedback = feedback
-            new_submission.graded_at = datetime.now()
-
-        submissions.append(new_submission)
-
-    # Add all submissions to database
-    db.add_all(submissions)
-    db.commit()
+    # Grade all answers in one batch; rows are collected as plain dicts and written in bulk below
+    grades = grading_engine.grade_batch(
+        [(question_dict[sub.question_id], sub.answer) for sub in exam_submission.submissions],
+        policy,
+        deadline
+    )
+    graded_at = datetime.now()
+
+    # Every row carries the same keys so they can be inserted with executemany
+    submission_rows = [
+        {
+            "student_id": current_user.id,
+            "exam_id": exam_submission.exam_id,
+            "question_id": sub.question_id,
+            "answer": sub.answer,
+            "is_correct": grade.is_correct,
+            "points_earned": grade.points_earned,
+            "graded_at": graded_at,
+            "grading_feedback": grade.feedback,
+            "grading_scores": grade.scores,
+        }
+        for sub, grade in zip(exam_submission.submissions, grades)
+    ]
+    points_earned = sum(grade.points_earned for grade in grades)
 
     # Calculate percentage score
     percentage_score = (points_earned / total_points_possible * 100) if total_points_possible > 0 else 0
 
-    # Create result
-    result = Result(
+    # Write all submissions (one executemany) and the result in a single transaction,
+    # bypassing the ORM unit of work
+    if submission_rows:
+        db.execute(insert(Submission.__table__), submission_rows)
+
+    inserted = db.execute(insert(Result.__table__).values(
         student_id=current_user.id,
         exam_id=exam_submission.exam_id,
         total_points=points_earned,
@@ -222,20 +309,19 @@ def submit_exam(
         passed=percentage_score >= exam.passing_score,
         started_at=datetime.now(),  # Ideally, this would be set when student starts the exam
         completed_at=datetime.now()
-    )
+    ))
 
-    db.add(result)
-    db.commit()
-    db.refresh(result)
+    # Read the stored row back (created_at is set by the database) before the caller commits
+    result = db.query(*RESULT_RESPONSE_COLUMNS).filter(Result.id == inserted.inserted_primary_key[0]).one()
 
-    return result
+    return result._asdict()
 
 
 @router.get("/results/exams/{exam_id}", response_model=List[ResultResponse])
 def get_exam_results(
         exam_id: int,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ) -> Any:
     """
     Get all results for a specific exam. Teachers and admins can see all results.
@@ -250,29 +336,24 @@ def get_exam_results(
         )
 
     # Check permissions
+    # Results are projected straight into response dicts, no ORM objects or relationships are loaded
     if current_user.role in [UserRole.TEACHER, UserRole.ADMIN]:
         # Teachers and admins can see all results
-        # Use join to include student data
-        results = db.query(Result).options(
-            joinedload(Result.student),
-            joinedload(Result.exam)
-        ).filter(Result.exam_id == exam_id).all()
+        results = db.query(*RESULT_RESPONSE_COLUMNS).filter(Result.exam_id == exam_id).all()
     else:
         # Students can only see their own results
-        results = db.query(Result).options(
-            joinedload(Result.exam)
-        ).filter(
+        results = db.query(*RESULT_RESPONSE_COLUMNS).filter(
             Result.exam_id == exam_id,
             Result.student_id == current_user.id
         ).all()
 
-    return results
+    return FastJSONResponse(rows_to_dicts(results))
 
 
 @router.get("/results/users", response_model=List[ResultResponse])
 def get_all_user_results(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> Any:
     """
     Get all results across all exams. Teachers and admins can see all results.
@@ -281,21 +362,21 @@ def get_all_user_results(
     # Check permissions
     if current_user.role in [UserRole.TEACHER, UserRole.ADMIN]:
         # Teachers and admins can see all results
-        results = db.query(Result).order_by(Result.created_at.desc()).all()
+        results = db.query(*RESULT_RESPONSE_COLUMNS).order_by(Result.created_at.desc()).all()
     else:
         # Students can only see their own results
-        results = db.query(Result).filter(
+        results = db.query(*RESULT_RESPONSE_COLUMNS).filter(
             Result.student_id == current_user.id
         ).order_by(Result.created_at.desc()).all()
 
-    return results
+    return FastJSONResponse(rows_to_dicts(results))
 
 
 @router.get("/student/{exam_id}", response_model=List[SubmissionResponse])
 def get_student_submissions(
         exam_id: int,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ) -> Any:
     """
     Get all submissions for a student in a specific exam.
@@ -309,12 +390,12 @@ def get_student_submissions(
         )
 
     # Get student's submissions
-    submissions = db.query(Submission).filter(
+    submissions = db.query(*SUBMISSION_RESPONSE_COLUMNS).filter(
         Submission.exam_id == exam_id,
         Submission.student_id == current_user.id
     ).all()
 
-    return submissions
+    return FastJSONResponse(rows_to_dicts(submissions))
 
 
 @router.post("/manual-grade/{submission_id}", response_model=SubmissionResponse)
@@ -348,6 +429,9 @@ def manual_grade_submission(
     submission.is_correct = is_correct
     submission.points_earned = points_earned
     submission.grading_feedback = feedback
+    # A teacher's grade is no longer derived from the automatic scores
+    submission.grading_scores = None
+    submission.graded_manually = True
     submission.graded_at = datetime.now()
 
     db.commit()
@@ -386,7 +470,7 @@ def manual_grade_submission(
 @router.get("/results/all", response_model=List[ResultResponse])
 def get_all_results(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> Any:
     """
     Get all results. Teachers and admins can see all results.
@@ -395,24 +479,18 @@ def get_all_results(
     # Check permissions
     if current_user.role in [UserRole.TEACHER, UserRole.ADMIN]:
         # Teachers and admins can see all results
-        # Use join to include student and exam data
-        results = db.query(Result).options(
-            joinedload(Result.student),
-            joinedload(Result.exam)
-        ).all()
+        results = db.query(*RESULT_RESPONSE_COLUMNS).all()
     else:
         # Students can only see their own results
-        results = db.query(Result).options(
-            joinedload(Result.exam)
-        ).filter(Result.student_id == current_user.id).all()
+        results = db.query(*RESULT_RESPONSE_COLUMNS).filter(Result.student_id == current_user.id).all()
 
-    return results
+    return FastJSONResponse(rows_to_dicts(results))
 
 @router.get("/results/users/{user_id}", response_model=List[ResultResponse])
 def get_user_results(
     user_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> Any:
     """
     Get all results for a specific user. Teachers and admins can see any user's results.
@@ -426,19 +504,22 @@ def get_user_results(
         )
 
     # Get user's results
-    results = db.query(Result).filter(Result.student_id == user_id).all()
+    results = db.query(*RESULT_RESPONSE_COLUMNS).filter(Result.student_id == user_id).all()
 
-    return results
+    return FastJSONResponse(rows_to_dicts(results))
 
 @router.get("/results/{result_id}", response_model=ResultResponse)
 def get_result(
     result_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> Any:
     """
     Get a specific result by id. Teachers and admins can see any result.
     Students can only see their own results.
+    Supports If-None-Match: returns 304 when the result is unchanged (e.g. not regraded).
     """
     # Get result
     result = db.query(Result).filter(Result.id == result_id).first()
@@ -455,9 +536,292 @@ def get_result(
             detail="You don't have permission to view this result"
         )
 
+    # Results have no updated_at, so their version is the graded values themselves
+    etag = make_etag(
+        "result", result.id, result.total_points, result.percentage_score, result.passed, result.completed_at
+    )
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_cache_headers(response, etag)
+
     return result
 
 
+@router.get("/plagiarism/questions/{question_id}")
+def screen_question_answers(
+        question_id: int,
+        threshold: float = Query(0.6, ge=0.3, le=1.0),
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_read_db)
+) -> Any:
+    """
+    Flag near-duplicate answers to a question (pairs whose word shingles overlap by at least
+    `threshold`, Jaccard similarity). Only teachers and admins can screen answers.
+    """
+    check_teacher_privileges(current_user)
+
+    question = db.query(Question.id).filter(Question.id == question_id).first()
+    if not question:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Question not found"
+        )
+
+    # One answer per student, the latest: a student who answered through /single and then
+    # submitted the exam has two rows, which must not be reported as copying each other
+    latest_ids = db.query(func.max(Submission.id)).filter(
+        Submission.question_id == question_id
+    ).group_by(Submission.student_id)
+    answers = db.query(Submission.id, Submission.student_id, Submission.answer).filter(
+        Submission.id.in_(latest_ids)
+    ).all()
+    pairs = find_near_duplicates(((answer.id, answer.answer) for answer in answers), threshold)
+
+    student_ids = {answer.id: answer.student_id for answer in answers}
+    for pair in pairs:
+        pair["student_ids"] = [student_ids[submission_id] for submission_id in pair["submission_ids"]]
+
+    return FastJSONResponse({
+        "question_id": question_id,
+        "threshold": threshold,
+        "answers_screened": len(answers),
+        "pairs": pairs,
+        "groups": group_pairs(pairs),
+    })
+
+
+@router.get("/clusters/questions/{question_id}")
+def get_answer_clusters(
+        question_id: int,
+        threshold: float = Query(0.8, ge=0.5, le=1.0),
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_read_db)
+) -> Any:
+    """
+    Group the answers to a question into clusters of similar answers (cosine similarity to the
+    cluster's representative of at least `threshold`), largest first, so each cluster can be
+    graded once with POST /clusters/grade. Only teachers and admins can cluster answers.
+    """
+    check_teacher_privileges(current_user)
+
+    question = db.query(Question.id, Question.points).filter(Question.id == question_id).first()
+    if not question:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Question not found"
+        )
+
+    answers = db.query(
+        Submission.id, Submission.student_id, Submission.answer, Submission.points_earned, Submission.graded_at
+    ).filter(Submission.question_id == question_id).all()
+    clusters, representation = cluster_answers([(answer.id, answer.answer) for answer in answers], threshold)
+
+    by_id = {answer.id: answer for answer in answers}
+    return FastJSONResponse({
+        "question_id": question_id,
+        "points": question.points,
+        "threshold": threshold,
+        "representation": representation,
+        "answers_clustered": len(answers),
+        "clusters": [
+            {
+                "representative_id": cluster["representative_id"],
+                "size": len(cluster["members"]),
+                "members": [
+                    {
+                        "submission_id": submission_id,
+                        "student_id": by_id[submission_id].student_id,
+                        "answer": by_id[submission_id].answer,
+                        "similarity": similarity,
+                        "points_earned": by_id[submission_id].points_earned,
+                        "graded_at": by_id[submission_id].graded_at,
+                    }
+                    for submission_id, similarity in cluster["members"]
+                ],
+            }
+            for cluster in clusters
+        ],
+    })
+
+
+@router.post("/clusters/grade", response_model=ClusterGradeResponse)
+def grade_answer_cluster(
+        cluster_grade: ClusterGrade,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+) -> Any:
+    """
+    Apply one grade to every submission of a cluster, with per-submission overrides, and
+    recompute the affected results. All updates are bulk statements in one transaction.
+    Only teachers and admins can grade submissions.
+    """
+    check_teacher_privileges(current_user)
+
+    override_ids = {override.submission_id for override in cluster_grade.overrides}
+    submission_ids = set(cluster_grade.submission_ids) | override_ids
+    if not submission_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No submissions to grade"
+        )
+
+    # Every submission must answer the question being graded
+    rows = db.query(Submission.id, Submission.student_id, Submission.exam_id).filter(
+        Submission.id.in_(submission_ids),
+        Submission.question_id == cluster_grade.question_id
+    ).all()
+    missing = submission_ids - {row.id for row in rows}
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Submissions {sorted(missing)} are not answers to question {cluster_grade.question_id}"
+        )
+
+    graded_at = datetime.now()
+
+    # One UPDATE for the whole cluster
+    cluster_ids = submission_ids - override_ids
+    if cluster_ids:
+        db.execute(
+            update(Submission).where(Submission.id.in_(cluster_ids)).values(
+                is_correct=cluster_grade.is_correct,
+                points_earned=cluster_grade.points_earned,
+                grading_feedback=cluster_grade.feedback,
+                grading_scores=None,
+                graded_manually=True,
+                graded_at=graded_at
+            ),
+            execution_options={"synchronize_session": False}
+        )
+
+    # Overrides fall back to the cluster grade for the fields they leave out (executemany by id)
+    if cluster_grade.overrides:
+        db.execute(update(Submission), [
+            {
+                "id": override.submission_id,
+                "is_correct": cluster_grade.is_correct if override.is_correct is None else override.is_correct,
+                "points_earned": (
+                    cluster_grade.points_earned if override.points_earned is None else override.points_earned
+                ),
+                "grading_feedback": cluster_grade.feedback if override.feedback is None else override.feedback,
+                "grading_scores": None,
+                "graded_manually": True,
+                "graded_at": graded_at,
+            }
+            for override in cluster_grade.overrides
+        ])
+
+    # Recompute the results of the affected students with grouped queries
+    results_updated = retotal_results(db, rows[0].exam_id, {row.student_id for row in rows})
+
+    db.commit()
+
+    return {
+        "question_id": cluster_grade.question_id,
+        "submissions_graded": len(submission_ids),
+        "overrides_applied": len(override_ids),
+        "results_updated": results_updated,
+    }
+
+
+@router.post("/simulate/exams/{exam_id}")
+def simulate_exam_grading(
+        exam_id: int,
+        proposal: GradingSimulation,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_read_db)
+) -> Any:
+    """
+    Recompute an exam's automatically graded text answers under proposed weights and
+    thresholds (on top of the exam's grading policy) from their stored component scores,
+    without changing any grade. Returns the
+    credit distribution, the submissions whose points would change and the effect on results.
+    Only teachers and admins can run simulations.
+    """
+    check_teacher_privileges(current_user)
+    started = time.perf_counter()
+
+    exam = db.query(Exam.id, Exam.passing_score, Exam.grading_policy).filter(Exam.id == exam_id).first()
+    if not exam:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Exam not found"
+        )
+
+    # The proposal's values on top of the exam's current policy
+    current_policy = policy_for_exam(exam)
+    try:
+        proposed_policy = compile_policy(merge_policy_config(exam.grading_policy, proposal.dict(exclude_none=True)))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+
+    rows = db.query(
+        Question.points, Submission.points_earned, Submission.grading_scores,
+        Submission.id, Submission.student_id, Submission.question_id
+    ).join(Question, Question.id == Submission.question_id).filter(
+        Submission.exam_id == exam_id,
+        Submission.grading_scores.isnot(None)
+    ).all()
+    skipped = db.query(func.count(Submission.id)).join(Question, Question.id == Submission.question_id).filter(
+        Submission.exam_id == exam_id,
+        Submission.grading_scores.is_(None),
+        Question.question_type.in_([QuestionType.SHORT_ANSWER, QuestionType.DESCRIPTIVE])
+    ).scalar()
+
+    arrays = simulation.score_arrays(rows)
+    proposed = simulation.simulate_points(arrays, proposed_policy)
+    current = arrays["current"]
+    changed = simulation.changed_indices(current, proposed)
+
+    # Effect on results: each student's total shifts by the sum of their submissions' changes
+    results = db.query(Result.student_id, Result.total_points).filter(Result.exam_id == exam_id).all()
+    total_possible = db.query(func.sum(Question.points)).filter(Question.exam_id == exam_id).scalar() or 0
+    deltas: dict = {}
+    for index in changed:
+        student_id = rows[index].student_id
+        deltas[student_id] = deltas.get(student_id, 0.0) + float(proposed[index] - current[index])
+    current_totals = np.array([result.total_points or 0.0 for result in results], dtype=np.float64)
+    proposed_totals = current_totals + np.array([deltas.get(result.student_id, 0.0) for result in results])
+    scale = 100 / total_possible if total_possible > 0 else 0.0
+    current_passed = current_totals * scale >= exam.passing_score
+    proposed_passed = proposed_totals * scale >= exam.passing_score
+
+    return FastJSONResponse({
+        "exam_id": exam_id,
+        "current_policy": current_policy.to_dict(),
+        "proposed_policy": proposed_policy.to_dict(),
+        "submissions_simulated": len(rows),
+        "submissions_skipped": skipped,
+        "distribution": {
+            "current": simulation.credit_distribution(current, arrays["points"]),
+            "proposed": simulation.credit_distribution(proposed, arrays["points"]),
+        },
+        "points_delta": round(float((proposed - current).sum()), 2),
+        "changes": [
+            {
+                "submission_id": rows[index].id,
+                "student_id": rows[index].student_id,
+                "question_id": rows[index].question_id,
+                "current_points": float(current[index]),
+                "proposed_points": float(proposed[index]),
+            }
+            for index in changed
+        ],
+        "results": {
+            "count": len(results),
+            "current_passed": int(current_passed.sum()),
+            "proposed_passed": int(proposed_passed.sum()),
+            "pass_status_changes": int((current_passed != proposed_passed).sum()),
+            "current_mean_percentage": round(float(current_totals.mean() * scale), 2) if results else None,
+            "proposed_mean_percentage": round(float(proposed_totals.mean() * scale), 2) if results else None,
+        },
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    })
+
+
 from grading.grading_report import generate_submission_report, generate_exam_grading_report
 
 
@@ -465,7 +829,7 @@ from grading.grading_report import generate_submission_report, generate_exam_gra
 def get_submission_report(
         submission_id: int,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ) -> Any:
     # Check permissions
     submission = db.query(Submission).filter(Submission.id == submission_id).first()
@@ -482,14 +846,14 @@ def get_submission_report(
             detail="You don't have permission to view this submission"
         )
 
-    return generate_submission_report(submission_id, db)
+    return FastJSONResponse(generate_submission_report(submission_id, db))
 
 
 @router.get("/report/exam/{result_id}")
 def get_exam_report(
         result_id: int,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ) -> Any:
     # Check permissions
     result = db.query(Result).filter(Result.id == result_id).first()
@@ -506,4 +870,4 @@ def get_exam_report(
             detail="You don't have permission to view this result"
         )
 
-    return generate_exam_grading_report(result_id, db)
\ No newline at end of file
+    return FastJSONResponse(generate_exam_grading_report(result_id, db))
\ No newline at end of file
@@ -5,9 +5,10 @@ from typing import Any, List
 from database import get_db
 from models import User, UserRole
 from schemas import UserResponse, UserUpdate
-from utils import get_current_user, get_password_hash, check_admin_privileges
+from utils import get_current_user, get_read_db, get_password_hash, check_admin_privileges
+from profiling import route_class
 
-router = APIRouter()
+router = APIRouter(route_class=route_class)
 
 
 @router.get("/", response_model=List[UserResponse])
@@ -15,7 +16,7 @@ def get_users(
         skip: int = 0,
         limit: int = 100,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ) -> Any:
     """
     Retrieve users. Only admins can access this endpoint.
@@ -32,7 +33,7 @@ def get_users(
 def get_user(
         user_id: int,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ) -> Any:
     """
     Get a specific user by id. Admin users can access any user.
@@ -1,7 +1,8 @@
 from pydantic import BaseModel, EmailStr, Field, validator
 from typing import List, Optional, Dict, Any, Union
 from datetime import datetime
-from models import UserRole, QuestionType, ExamStatus
+from models import UserRole, QuestionType, ExamStatus, RegradeStatus
+from grading.policy import compile_policy
 
 
 # Base schemas
@@ -12,6 +13,20 @@ class UserBase(BaseModel):
     role: Optional[UserRole] = UserRole.STUDENT
 
 
+class GradingPolicyConfig(BaseModel):
+    # Weights of the keyword, semantic and string scores for each grading tier
+    weights: Optional[Dict[str, Dict[str, float]]] = None
+    # Minimum combined score for each rung of the partial-credit ladder, best first
+    thresholds: Optional[List[float]] = None
+    # Share of the question's points for each rung
+    credit: Optional[List[float]] = None
+
+    @validator('credit', always=True)
+    def validate_policy(cls, v, values):
+        compile_policy({"weights": values.get('weights'), "thresholds": values.get('thresholds'), "credit": v})
+        return v
+
+
 class ExamBase(BaseModel):
     title: str
     description: Optional[str] = None
@@ -21,6 +36,7 @@ class ExamBase(BaseModel):
     status: ExamStatus = ExamStatus.DRAFT
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
+    grading_policy: Optional[GradingPolicyConfig] = None
 
 
 class QuestionBase(BaseModel):
@@ -30,6 +46,7 @@ class QuestionBase(BaseModel):
     order: Optional[int] = None
     options: Optional[List[Dict[str, Any]]] = None
     correct_answer: Optional[str] = None
+    reference_answers: Optional[List[str]] = None
 
     @validator('options')
     def validate_options(cls, v, values):
@@ -118,6 +135,34 @@ class SubmissionCreate(SubmissionBase):
         }
 
 
+class SubmissionGradeOverride(BaseModel):
+    submission_id: int
+    is_correct: Optional[bool] = None
+    points_earned: Optional[float] = None
+    feedback: Optional[str] = None
+
+
+class ClusterGrade(BaseModel):
+    question_id: int
+    submission_ids: List[int]
+    is_correct: bool
+    points_earned: float
+    feedback: Optional[str] = None
+    overrides: List[SubmissionGradeOverride] = []
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "question_id": 3,
+                "submission_ids": [12, 15, 31, 40],
+                "is_correct": True,
+                "points_earned": 4.0,
+                "feedback": "Covers the light and dark reactions.",
+                "overrides": [{"submission_id": 31, "points_earned": 3.0, "feedback": "Missing the role of ATP."}]
+            }
+        }
+
+
 # Update schemas
 class UserUpdate(BaseModel):
     email: Optional[EmailStr] = None
@@ -135,6 +180,7 @@ class ExamUpdate(BaseModel):
     is_randomized: Optional[bool] = None
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
+    grading_policy: Optional[GradingPolicyConfig] = None
 
 
 class QuestionUpdate(BaseModel):
@@ -144,6 +190,7 @@ class QuestionUpdate(BaseModel):
     order: Optional[int] = None
     options: Optional[List[Dict[str, Any]]] = None
     correct_answer: Optional[str] = None
+    reference_answers: Optional[List[str]] = None
 
 
 # Response schemas
@@ -188,6 +235,53 @@ class SubmissionResponse(SubmissionBase):
         orm_mode = True
 
 
+class ClusterGradeResponse(BaseModel):
+    question_id: int
+    submissions_graded: int
+    overrides_applied: int
+    results_updated: int
+
+
+class GradingSimulation(GradingPolicyConfig):
+    """Proposed policy values; fields left out keep the exam's current values"""
+
+    @validator('credit', always=True)
+    def validate_policy(cls, v, values):
+        # Only complete once merged with the exam's policy, so it is validated then
+        return v
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "weights": {"full_nlp": {"keyword": 0.3, "semantic": 0.6, "string": 0.1}},
+                "thresholds": [0.8, 0.65, 0.5, 0.3],
+                "credit": [1.0, 0.9, 0.7, 0.4]
+            }
+        }
+
+
+class RegradeJobResponse(BaseModel):
+    id: int
+    question_id: int
+    exam_id: int
+    status: RegradeStatus
+    total_submissions: int
+    processed_submissions: int
+    changed_submissions: int
+    results_updated: int
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class DraftAnswerResponse(SubmissionBase):
+    saved_at: datetime
+
+
 class ResultResponse(ResultBase):
     id: int
     created_at: datetime
@@ -0,0 +1,91 @@
+"""
+Fast response serialization for large list and report endpoints.
+
+List endpoints project the columns of their response schema straight from the database
+into dicts (skipping ORM object construction and Pydantic validation), and responses are
+encoded with orjson when it is installed, falling back to the standard json module.
+"""
+import datetime
+import enum
+import json
+from typing import Any, Dict, Iterable, List
+
+from fastapi.responses import JSONResponse
+
+from models import Question, Result, Submission
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Columns in the field order of schemas.ResultResponse
+RESULT_RESPONSE_COLUMNS = (
+    Result.student_id,
+    Result.exam_id,
+    Result.total_points,
+    Result.percentage_score,
+    Result.passed,
+    Result.started_at,
+    Result.completed_at,
+    Result.id,
+    Result.created_at,
+)
+
+# Columns in the field order of schemas.SubmissionResponse
+SUBMISSION_RESPONSE_COLUMNS = (
+    Submission.question_id,
+    Submission.answer,
+    Submission.id,
+    Submission.student_id,
+    Submission.exam_id,
+    Submission.is_correct,
+    Submission.points_earned,
+    Submission.submitted_at,
+    Submission.graded_at,
+)
+
+# Columns in the field order of schemas.QuestionResponse
+QUESTION_RESPONSE_COLUMNS = (
+    Question.text,
+    Question.question_type,
+    Question.points,
+    Question.order,
+    Question.options,
+    Question.correct_answer,
+    Question.reference_answers,
+    Question.id,
+    Question.exam_id,
+    Question.created_at,
+)
+
+
+def _json_default(value: Any) -> Any:
+    """Encode the types orjson handles natively when falling back to the json module"""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode content to compact JSON bytes"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, default=_json_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson when available"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def rows_to_dicts(rows: Iterable) -> List[Dict[str, Any]]:
+    """Turn rows of a column projection into plain dicts keyed by column name"""
+    return [row._asdict() for row in rows]
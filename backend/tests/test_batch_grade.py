@@ -0,0 +1,52 @@
+"""
+Offline batch grading from the command line: invalid questions and their answers.
+"""
+import csv
+import json
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_invalid_questions_are_reported_per_answer(tmp_path):
+    question = {"id": "1", "question_type": "true_false", "points": "2", "correct_answer": "true",
+                "reference_answers": "", "options": ""}
+    write_csv(tmp_path / "questions.csv", [
+        question,
+        {**question, "id": "2", "question_type": "essay"},
+        {**question, "id": "3", "points": "two"},
+        {**question, "id": "4", "options": "[{\"id\": \"A\""},
+    ])
+    write_csv(tmp_path / "answers.csv", [
+        {"student_id": str(student_id), "question_id": question_id, "answer": "true"}
+        for student_id in (1, 2) for question_id in ("1", "2", "3", "4", "5")
+    ])
+    output = tmp_path / "grades.jsonl"
+
+    completed = subprocess.run(
+        [sys.executable, "batch_grade.py", "--questions", str(tmp_path / "questions.csv"),
+         "--answers", str(tmp_path / "answers.csv"), "--output", str(output), "--workers", "1"],
+        cwd=BACKEND, capture_output=True, text=True, timeout=300,
+    )
+    assert completed.returncode == 0, completed.stderr
+    summary = json.loads(completed.stdout)
+    assert summary["answers"] == 10 and summary["invalid_questions"] == 3
+    assert "Question 2 is invalid" in completed.stderr
+
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [row["student_id"] for row in rows] == ["1"] * 5 + ["2"] * 5
+    errors = {row["question_id"]: row.get("error") for row in rows}
+    assert errors["1"] is None and rows[0]["points_earned"] == 2.0
+    assert errors["2"].startswith("invalid question: question_type must be one of")
+    assert errors["3"] == "invalid question: points must be a number, not 'two'"
+    assert errors["4"].startswith("invalid question: options is not valid JSON")
+    assert errors["5"] == "unknown question"
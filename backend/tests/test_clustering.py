@@ -0,0 +1,110 @@
+"""
+Answer clustering: greedy clusters around the densest answers, on TF-IDF vectors, and
+grading a cluster in one bulk update.
+"""
+from conftest import API
+from database import SessionLocal
+from grading.clustering import cluster_answers
+from models import Submission
+
+
+def members(cluster):
+    return [submission_id for submission_id, _ in cluster["members"]]
+
+
+def test_similar_answers_share_a_cluster():
+    clusters, representation = cluster_answers([
+        (1, "Photosynthesis turns light into chemical energy"),
+        (2, "photosynthesis turns light into chemical energy!"),
+        (3, "Photosynthesis turns light into chemical energy in plants"),
+        (4, "Mitochondria are the powerhouse of the cell"),
+    ], threshold=0.7)
+    assert representation == "tfidf"
+    assert [members(cluster) for cluster in clusters] == [[1, 2, 3], [4]]
+    # The representative comes first, fully similar to itself; identical answers are too
+    assert clusters[0]["representative_id"] == 1
+    assert clusters[0]["members"][:2] == [(1, 1.0), (2, 1.0)]
+    assert 0.7 <= clusters[0]["members"][2][1] < 1.0
+
+
+def test_every_answer_is_in_exactly_one_cluster():
+    answers = [(index, text) for index, text in enumerate(
+        ["a b c", "a b d", "a b e", "x y z", "x y", "q", "a b c", "x y z w"], start=1)]
+    clusters, _ = cluster_answers(answers, threshold=0.5)
+    assigned = [submission_id for cluster in clusters for submission_id in members(cluster)]
+    assert sorted(assigned) == [submission_id for submission_id, _ in answers]
+    assert all(cluster["representative_id"] == members(cluster)[0] for cluster in clusters)
+    assert [len(cluster["members"]) for cluster in clusters] == sorted(
+        (len(cluster["members"]) for cluster in clusters), reverse=True)
+
+
+def test_answers_without_words_get_their_own_cluster():
+    clusters, _ = cluster_answers([(1, "Light energy"), (2, ""), (3, "?!"), (4, None)])
+    assert sorted(members(cluster) for cluster in clusters) == [[1], [2, 3, 4]]
+    blank = next(cluster for cluster in clusters if cluster["representative_id"] == 2)
+    assert blank["members"] == [(2, 1.0), (3, 1.0), (4, 1.0)]
+
+
+def test_no_answers():
+    assert cluster_answers([]) == ([], "none")
+
+
+def test_cluster_grade_applies_overrides(client, auth_headers, teacher_headers, create_exam):
+    exam_id = create_exam([{"text": "Is water wet?", "question_type": "true_false", "correct_answer": "true",
+                            "points": 4.0}], passing_score=50.0)
+    question_id = client.get(f"{API}/exams/{exam_id}/questions", headers=teacher_headers).json()[0]["id"]
+    students = [auth_headers() for _ in range(4)]
+    for student in students:
+        response = client.post(f"{API}/submissions/exam", headers=student, json={
+            "exam_id": exam_id, "submissions": [{"question_id": question_id, "answer": "false"}]
+        })
+        assert response.status_code == 201, response.text
+    submission_ids = [client.get(f"{API}/submissions/student/{exam_id}", headers=student).json()[0]["id"]
+                      for student in students]
+
+    response = client.post(f"{API}/submissions/clusters/grade", headers=teacher_headers, json={
+        "question_id": question_id,
+        "submission_ids": submission_ids[:3],
+        "is_correct": True,
+        "points_earned": 3.0,
+        "feedback": "Mostly right.",
+        "overrides": [
+            {"submission_id": submission_ids[1], "points_earned": 1.0},
+            # An override can also bring in a submission outside the cluster
+            {"submission_id": submission_ids[3], "is_correct": False, "points_earned": 0.5, "feedback": "No."},
+        ],
+    })
+    assert response.status_code == 200, response.text
+    assert response.json() == {
+        "question_id": question_id, "submissions_graded": 4, "overrides_applied": 2, "results_updated": 4
+    }
+
+    db = SessionLocal()
+    try:
+        graded = {row.id: row for row in db.query(Submission).filter(Submission.id.in_(submission_ids))}
+    finally:
+        db.close()
+    assert [(graded[submission_id].is_correct, graded[submission_id].points_earned,
+             graded[submission_id].grading_feedback, graded[submission_id].graded_manually)
+            for submission_id in submission_ids] == [
+        (True, 3.0, "Mostly right.", True),
+        (True, 1.0, "Mostly right.", True),
+        (True, 3.0, "Mostly right.", True),
+        (False, 0.5, "No.", True),
+    ]
+    percentages = [client.get(f"{API}/submissions/results/users", headers=student).json()[0]["percentage_score"]
+                   for student in students]
+    assert percentages == [75.0, 25.0, 75.0, 12.5]
+
+
+def test_cluster_grade_rejects_answers_to_other_questions(client, headers, teacher_headers, exam_id):
+    first, second = [question["id"] for question in
+                     client.get(f"{API}/exams/{exam_id}/questions", headers=teacher_headers).json()[:2]]
+    client.post(f"{API}/submissions/exam", headers=headers, json={
+        "exam_id": exam_id, "submissions": [{"question_id": second, "answer": "true"}]
+    })
+    submission_id = client.get(f"{API}/submissions/student/{exam_id}", headers=headers).json()[0]["id"]
+    response = client.post(f"{API}/submissions/clusters/grade", headers=teacher_headers, json={
+        "question_id": first, "submission_ids": [submission_id], "is_correct": True, "points_earned": 1.0
+    })
+    assert response.status_code == 400
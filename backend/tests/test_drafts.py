@@ -0,0 +1,91 @@
+"""
+Draft answer write-behind buffer: chunked upserts and failed flushes.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import API
+from database import SessionLocal
+from drafts import DraftAnswerBuffer, upsert_draft_answers
+from models import DraftAnswer
+
+TRUE_FALSE = {"text": "The sky is blue.", "question_type": "true_false", "correct_answer": "true"}
+
+
+@pytest.fixture
+def sitting(client, headers, teacher_headers, create_exam):
+    """(student id, exam id, question ids) of a new student and a seven-question exam"""
+    exam_id = create_exam([TRUE_FALSE] * 7)
+    student_id = client.get(f"{API}/auth/me", headers=headers).json()["id"]
+    questions = client.get(f"{API}/exams/{exam_id}/questions", headers=teacher_headers).json()
+    return student_id, exam_id, [question["id"] for question in questions]
+
+
+def drafts(student_id):
+    db = SessionLocal()
+    try:
+        return {row.question_id: row.answer for row in db.query(DraftAnswer).filter(DraftAnswer.student_id == student_id)}
+    finally:
+        db.close()
+
+
+def test_upsert_in_chunks_keeps_newest(sitting, query_budget):
+    student_id, exam_id, question_ids = sitting
+    now = datetime.now()
+    rows = [{"student_id": student_id, "exam_id": exam_id, "question_id": question_id, "answer": "first",
+             "saved_at": now} for question_id in question_ids]
+    db = SessionLocal()
+    try:
+        with query_budget(4) as collector:
+            upsert_draft_answers(db, rows, chunk_size=2)
+        assert collector.count == 4
+        # An older save never replaces a stored draft, a newer one does
+        upsert_draft_answers(db, [
+            {**rows[0], "answer": "older", "saved_at": now - timedelta(seconds=1)},
+            {**rows[1], "answer": "newer", "saved_at": now + timedelta(seconds=1)},
+        ], chunk_size=2)
+        db.commit()
+    finally:
+        db.close()
+    assert drafts(student_id) == {**{question_id: "first" for question_id in question_ids}, question_ids[1]: "newer"}
+
+
+class FailingSession:
+    """Session whose statements fail, as during a database outage"""
+
+    def get_bind(self):
+        raise ConnectionError("database unavailable")
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_failed_flushes_drop_drafts_after_max_attempts(sitting):
+    student_id, exam_id, question_ids = sitting
+    first, second, third = question_ids[:3]
+    buffer = DraftAnswerBuffer(flush_interval=60, max_entries=100, session_factory=FailingSession, max_attempts=3)
+    buffer.save(student_id, exam_id, first, "kept until the third failure")
+    buffer.flush()
+    buffer.flush()
+    # A new save of a question starts its attempts over
+    buffer.save(student_id, exam_id, second, "first")
+    buffer.flush()
+    buffer.save(student_id, exam_id, second, "second")
+    assert [row["question_id"] for row in buffer.pending_for(student_id, exam_id)] == [second]
+    assert buffer.rows_dropped == 1
+
+    buffer.flush()
+    buffer.flush()
+    assert [row["answer"] for row in buffer.pending_for(student_id, exam_id)] == ["second"]
+    buffer.flush()
+    assert buffer.pending_for(student_id, exam_id) == [] and buffer.rows_dropped == 2
+
+    # Once the database is back, new saves are written
+    buffer.session_factory = SessionLocal
+    buffer.save(student_id, exam_id, third, "written")
+    assert buffer.flush() == 1
+    assert drafts(student_id) == {third: "written"}
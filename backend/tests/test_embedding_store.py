@@ -0,0 +1,100 @@
+"""
+Embedding store: lookups before inference, appends shared across processes, compaction.
+"""
+import os
+import zlib
+
+import numpy as np
+import pytest
+
+from grading.embedding_store import VECTORS_FILE, EmbeddingStore, text_key
+
+DIM = 16
+
+
+class CountingEncoder:
+    """Deterministic stand-in for the transformer, recording the texts it encodes"""
+
+    def __init__(self):
+        self.encoded = []
+
+    def __call__(self, texts):
+        self.encoded.extend(texts)
+        return np.stack([np.random.default_rng(zlib.crc32(text.encode())).standard_normal(DIM) for text in texts])
+
+
+@pytest.fixture
+def encoder():
+    return CountingEncoder()
+
+
+def test_texts_are_encoded_once(tmp_path, encoder):
+    store = EmbeddingStore(str(tmp_path), "org/model")
+    first = store.encode(encoder, ["light", "energy", "light"])
+    assert encoder.encoded == ["light", "energy"]
+    np.testing.assert_array_equal(first[0], first[2])
+    np.testing.assert_allclose(first[0], encoder(["light"])[0], rtol=1e-6)
+
+    encoder.encoded.clear()
+    again = store.encode(encoder, ["energy", "light", "glucose"])
+    assert encoder.encoded == ["glucose"]
+    np.testing.assert_array_equal(again[:2], first[[1, 0]])
+    assert store.stats()["entries"] == 3
+    assert os.path.isdir(tmp_path / "org_model")
+
+
+def test_similarities_match_vectors(tmp_path, encoder):
+    store = EmbeddingStore(str(tmp_path), "model")
+    vectors = encoder(["a", "b", "c"])
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    assert store.similarity(encoder, "a", "b") == pytest.approx(unit[0] @ unit[1], abs=1e-5)
+    assert store.similarities(encoder, "a", ["b", "c"]) == pytest.approx((unit[0] @ unit[1:].T).tolist(), abs=1e-5)
+    np.testing.assert_allclose(store.similarity_matrix(encoder, ["a"], ["b", "c"]), unit[:1] @ unit[1:].T, atol=1e-5)
+
+
+def test_appends_are_seen_by_other_processes(tmp_path, encoder):
+    writer = EmbeddingStore(str(tmp_path), "model")
+    reader = EmbeddingStore(str(tmp_path), "model")
+    assert reader.get([text_key("light")]) == [None]
+
+    writer.encode(encoder, ["light"])
+    # A store opened earlier picks up the new row on its next miss
+    (record,) = reader.get([text_key("light")])
+    np.testing.assert_array_equal(record["values"], writer.get([text_key("light")])[0]["values"])
+
+
+def test_partial_row_is_dropped_on_append(tmp_path, encoder):
+    store = EmbeddingStore(str(tmp_path), "model")
+    store.encode(encoder, ["light"])
+    vectors_path = tmp_path / "model" / "gen-000001" / VECTORS_FILE
+    # A writer that crashed mid-append left half a row behind
+    with open(vectors_path, "ab") as f:
+        f.write(b"\0" * (DIM * 4 // 2))
+
+    store.encode(encoder, ["energy"])
+    assert os.path.getsize(vectors_path) == 2 * DIM * 4
+    np.testing.assert_allclose(
+        EmbeddingStore(str(tmp_path), "model").encode(encoder, ["energy"])[0], encoder(["energy"])[0], rtol=1e-6
+    )
+
+
+def test_compaction_prunes_and_converts(tmp_path, encoder):
+    store = EmbeddingStore(str(tmp_path), "model")
+    store.encode(encoder, ["light", "energy", "glucose"])
+    reader = EmbeddingStore(str(tmp_path), "model")
+    reader.get([text_key("light")])
+
+    assert store.compact(keep_keys={text_key("light"), text_key("glucose")}, fmt="int8") == {"before": 3, "after": 2}
+    assert sorted(os.listdir(tmp_path / "model")) == [".lock", "CURRENT", "gen-000002"]
+    assert store.stats()["format"] == "int8"
+
+    # The reader keeps its mapped generation until its next miss, then switches
+    np.testing.assert_array_equal(reader.get([text_key("energy")])[0]["values"], encoder(["energy"])[0].astype("f4"))
+    reader.encode(encoder, ["sunlight"])
+    assert reader.format == "int8"
+    encoder.encoded.clear()
+    vectors = reader.encode(encoder, ["glucose", "energy"])
+    assert encoder.encoded == ["energy"]
+    original = encoder(["glucose"])[0]
+    cosine = vectors[0] @ original / (np.linalg.norm(vectors[0]) * np.linalg.norm(original))
+    assert cosine > 0.999
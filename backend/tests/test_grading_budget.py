@@ -0,0 +1,38 @@
+"""
+Time budgets and circuit breakers: unlimited deadlines of background grading.
+"""
+import pytest
+
+from grading.budget import (
+    STAGE_TRANSFORMER, SKIPPED_BREAKER, SKIPPED_BUDGET, GradingDeadline, breakers, guarded_stage, stage_skip_reason
+)
+
+
+@pytest.fixture
+def open_breaker():
+    breaker = breakers[STAGE_TRANSFORMER]
+    for _ in range(breaker.max_failures):
+        breaker.record(0.01, ok=False)
+    assert breaker.state == "open"
+    yield breaker
+    breaker.reset()
+
+
+def test_live_answers_skip_open_stage(open_breaker):
+    assert stage_skip_reason(STAGE_TRANSFORMER, GradingDeadline.for_answer()) == SKIPPED_BREAKER
+    assert stage_skip_reason(STAGE_TRANSFORMER, GradingDeadline(0)) == SKIPPED_BUDGET
+
+
+def test_unlimited_deadline_runs_every_stage(open_breaker):
+    deadline = GradingDeadline.for_answer(GradingDeadline.unlimited())
+    assert deadline.is_unlimited and not deadline.expired
+    assert stage_skip_reason(STAGE_TRANSFORMER, deadline, reserve_seconds=3600) is None
+
+
+def test_unlimited_deadline_leaves_breakers_alone():
+    breaker = breakers[STAGE_TRANSFORMER]
+    deadline = GradingDeadline.unlimited()
+    for _ in range(breaker.max_failures):
+        with pytest.raises(RuntimeError), guarded_stage(STAGE_TRANSFORMER, deadline):
+            raise RuntimeError("model crashed")
+    assert breaker.state == "closed" and breaker.failures == 0
@@ -0,0 +1,102 @@
+"""
+Grading policies: compilation, validation, merging and the per-exam cache.
+"""
+import dataclasses
+
+import pytest
+
+from conftest import API
+from grading.policy import (
+    DEFAULT_POLICY, DEFAULT_THRESHOLDS, NO_CREDIT, PolicyCache, compile_policy, merge_policy_config
+)
+
+
+def test_default_policy():
+    assert compile_policy() == compile_policy({}) == DEFAULT_POLICY
+    assert DEFAULT_POLICY.to_dict() == {
+        "weights": {
+            "full_nlp": {"keyword": 0.4, "semantic": 0.5, "string": 0.1},
+            "nlp": {"keyword": 0.7, "semantic": 0.0, "string": 0.3},
+            "basic": {"keyword": 0.5, "semantic": 0.0, "string": 0.5},
+        },
+        "thresholds": [0.85, 0.7, 0.55, 0.35],
+        "credit": [1.0, 0.9, 0.7, 0.4],
+    }
+    assert [rung.label for rung in DEFAULT_POLICY.rungs] == ["Excellent", "Good", "Adequate", "Poor"]
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        DEFAULT_POLICY.rungs = ()
+    with pytest.raises(TypeError):
+        DEFAULT_POLICY.weights["nlp"] = (1.0, 0.0, 0.0)
+
+
+def test_partial_config_keeps_defaults():
+    policy = compile_policy({"weights": {"nlp": {"keyword": 1.0}}, "thresholds": None})
+    assert policy.weights["nlp"] == (1.0, 0.0, 0.0)
+    assert policy.weights["basic"] == DEFAULT_POLICY.weights["basic"]
+    assert policy.thresholds == DEFAULT_THRESHOLDS
+    assert policy.combined_score("nlp", 0.6, 0.9, 0.9) == 0.6
+
+
+@pytest.mark.parametrize("score, share", [
+    (1.0, 1.0), (0.85, 1.0), (0.849, 0.9), (0.7, 0.9), (0.55, 0.7), (0.35, 0.4), (0.349, 0.0), (0.0, 0.0),
+])
+def test_rung_for_thresholds(score, share):
+    assert DEFAULT_POLICY.rung_for(score).share == share
+
+
+def test_custom_ladder():
+    policy = compile_policy({"thresholds": [0.8, 0.4], "credit": [1.0, 0.5]})
+    assert [(rung.label, rung.is_correct) for rung in policy.rungs] == [("Level 1", True), ("Level 2", True)]
+    assert policy.rung_for(0.5).feedback == "Answer earns 50% of the points."
+    assert policy.rung_for(0.1) is NO_CREDIT
+
+
+@pytest.mark.parametrize("config, message", [
+    ({"weights": {"transformer": {"keyword": 1.0}}}, "Unknown grading tiers"),
+    ({"weights": {"nlp": {"length": 1.0}}}, "Unknown score components"),
+    ({"weights": {"basic": {"keyword": -0.5, "string": 1.5}}}, "must not be negative"),
+    ({"thresholds": [0.5, 0.5, 0.3, 0.1]}, "strictly decreasing"),
+    ({"thresholds": [0.8, 0.5]}, "one credit share per threshold"),
+    ({"credit": [1.2, 0.9, 0.7, 0.4]}, "between 0 and 1"),
+])
+def test_invalid_configs(config, message):
+    with pytest.raises(ValueError, match=message):
+        compile_policy(config)
+
+
+def test_merge_policy_config():
+    base = {"weights": {"nlp": {"keyword": 1.0}}, "thresholds": [0.9, 0.6], "credit": [1.0, 0.5]}
+    merged = merge_policy_config(base, {"weights": {"basic": {"string": 1.0}}, "thresholds": None, "credit": [1.0, 0.4]})
+    assert merged == {
+        "weights": {"nlp": {"keyword": 1.0}, "basic": {"string": 1.0}},
+        "thresholds": [0.9, 0.6],
+        "credit": [1.0, 0.4],
+    }
+    assert merge_policy_config(None, None) == {}
+
+
+def test_policy_cache_recompiles_on_change():
+    cache = PolicyCache(max_exams=2)
+    config = {"thresholds": [0.8, 0.4], "credit": [1.0, 0.5]}
+    policy = cache.get(1, config)
+    assert cache.get(1, {"thresholds": [0.8, 0.4], "credit": [1.0, 0.5]}) is policy
+    assert cache.get(2, None) is DEFAULT_POLICY
+
+    # The cache keeps its own copy, so a configuration changed in place is still noticed
+    config["credit"][1] = 0.25
+    assert cache.get(1, config).credit == (1.0, 0.25)
+
+    # The least recently used exam is evicted
+    cache.get(3, None)
+    assert set(cache._policies) == {1, 3}
+
+
+def test_exam_policy_is_validated(client, teacher_headers, create_exam):
+    response = client.post(f"{API}/exams/", headers=teacher_headers, json={
+        "title": "Strict exam", "grading_policy": {"thresholds": [0.9, 0.7], "credit": [1.0]}
+    })
+    assert response.status_code == 422
+
+    exam_id = create_exam(grading_policy={"thresholds": [0.9, 0.7], "credit": [1.0, 0.5]})
+    exam = client.get(f"{API}/exams/{exam_id}", headers=teacher_headers).json()
+    assert exam["grading_policy"]["thresholds"] == [0.9, 0.7]
@@ -0,0 +1,141 @@
+"""
+Idempotency-Key handling of POST /submissions/exam: replays, key reuse for another body,
+requests still in flight and the takeover of abandoned keys.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from conftest import API
+from database import SessionLocal
+from idempotency import REPLAYED_HEADER, StoredResponse, hash_request, idempotency_store
+from models import IdempotencyKey, Result
+from schemas import ExamSubmission
+
+
+@pytest.fixture
+def user_id(client, headers):
+    return client.get(f"{API}/auth/me", headers=headers).json()["id"]
+
+
+@pytest.fixture
+def exam_body(client, headers, exam_id):
+    questions = client.get(f"{API}/exams/{exam_id}/questions", headers=headers).json()
+    return {
+        "exam_id": exam_id,
+        "submissions": [{"question_id": question["id"], "answer": "true"} for question in questions],
+    }
+
+
+def submit(client, headers, body, key):
+    return client.post(f"{API}/submissions/exam", headers={**headers, "Idempotency-Key": key}, json=body)
+
+
+def key_row(user_id, key):
+    db = SessionLocal()
+    try:
+        return db.query(IdempotencyKey).filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key).one()
+    finally:
+        db.close()
+
+
+def result_count(exam_id):
+    db = SessionLocal()
+    try:
+        return db.query(Result).filter(Result.exam_id == exam_id).count()
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("from_memory", [True, False])
+def test_retry_replays_the_stored_response(client, headers, exam_body, from_memory):
+    first = submit(client, headers, exam_body, "replay")
+    assert first.status_code == 201, first.text
+    if not from_memory:
+        idempotency_store.clear()
+
+    retry = submit(client, headers, exam_body, "replay")
+    assert retry.status_code == 201
+    assert retry.headers[REPLAYED_HEADER] == "true"
+    assert retry.content == first.content
+    assert result_count(exam_body["exam_id"]) == 1
+
+
+def test_key_reused_for_another_body_is_rejected(client, headers, exam_body):
+    assert submit(client, headers, exam_body, "reused").status_code == 201
+    idempotency_store.clear()
+
+    other_body = {**exam_body, "submissions": exam_body["submissions"][:1]}
+    assert submit(client, headers, other_body, "reused").status_code == 422
+
+
+def test_request_in_flight_gets_conflict(client, headers, user_id, exam_body):
+    # Another worker holds the key for the same request and is still running
+    request_hash = hash_request("submit_exam", ExamSubmission(**exam_body))
+    assert idempotency_store._reserve(user_id, "in-flight", "submit_exam", request_hash, "a" * 32) is None
+
+    response = submit(client, headers, exam_body, "in-flight")
+    assert response.status_code == 409
+    assert result_count(exam_body["exam_id"]) == 0
+
+
+def test_abandoned_key_is_taken_over(client, headers, user_id, exam_body):
+    # A worker reserved the key and died before finishing
+    abandoned = "b" * 32
+    assert idempotency_store._reserve(user_id, "abandoned", "submit_exam", "other", abandoned) is None
+    db = SessionLocal()
+    try:
+        db.query(IdempotencyKey).filter(IdempotencyKey.reservation == abandoned).update(
+            {"created_at": datetime.now() - idempotency_store.lock_timeout - timedelta(seconds=1)}
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    response = submit(client, headers, exam_body, "abandoned")
+    assert response.status_code == 201, response.text
+    row = key_row(user_id, "abandoned")
+    assert row.status_code == 201 and row.reservation != abandoned
+
+    # Should the first request still finish, it cannot complete the key any more
+    db = SessionLocal()
+    try:
+        stored = StoredResponse("submit_exam", "other", 201, b"{}", datetime.now())
+        with pytest.raises(HTTPException) as error:
+            idempotency_store._complete(db, user_id, "abandoned", abandoned, stored)
+        assert error.value.status_code == 409
+    finally:
+        db.rollback()
+        db.close()
+
+
+def test_completion_does_not_depend_on_timestamp_precision(client, headers, user_id, exam_body):
+    # A DATETIME column without fractional seconds (MySQL's default) rounds created_at
+    original_reserve = idempotency_store._reserve
+
+    def reserve_and_round(user_id, key, *args):
+        stored = original_reserve(user_id, key, *args)
+        db = SessionLocal()
+        try:
+            row = db.query(IdempotencyKey).filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key).one()
+            row.created_at = row.created_at.replace(microsecond=0)
+            db.commit()
+        finally:
+            db.close()
+        return stored
+
+    idempotency_store._reserve = reserve_and_round
+    try:
+        response = submit(client, headers, exam_body, "rounded")
+    finally:
+        idempotency_store._reserve = original_reserve
+    assert response.status_code == 201, response.text
+    assert key_row(user_id, "rounded").status_code == 201
+
+
+def test_failed_request_releases_its_key(client, headers, user_id, exam_body):
+    bad_body = {**exam_body, "submissions": [{"question_id": 10 ** 9, "answer": "true"}]}
+    assert submit(client, headers, bad_body, "failed").status_code == 400
+
+    assert submit(client, headers, exam_body, "failed").status_code == 201
@@ -0,0 +1,18 @@
+"""
+/metrics is only readable with the configured METRICS_TOKEN.
+"""
+import pytest
+
+
+@pytest.mark.parametrize("headers", [{}, {"Authorization": "Bearer wrong-token"}, {"Authorization": "test-metrics-token"}])
+def test_metrics_require_token(client, headers):
+    response = client.get("/metrics", headers=headers)
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == "Bearer"
+
+
+def test_metrics_with_token(client):
+    client.get("/")
+    response = client.get("/metrics", headers={"Authorization": "Bearer test-metrics-token"})
+    assert response.status_code == 200
+    assert "# TYPE http_request_duration_seconds histogram" in response.text
@@ -0,0 +1,73 @@
+"""
+Near-duplicate screening: MinHash/LSH candidates verified with exact Jaccard, and groups.
+"""
+import random
+from itertools import combinations
+
+import numpy as np
+
+from grading.plagiarism import (
+    NUM_PERM, candidate_pairs, find_near_duplicates, group_pairs, jaccard, minhash_signature, shingles
+)
+
+ORIGINAL = ("Photosynthesis converts light energy into chemical energy stored in glucose, "
+            "releasing oxygen as a by-product of splitting water in the chloroplasts")
+
+
+def cohort(size=60, seed=7):
+    """Answers drawn from a shared vocabulary, with copies edited more and more heavily"""
+    rng = random.Random(seed)
+    vocabulary = ORIGINAL.lower().replace(",", "").split() + ["plants", "sunlight", "carbon", "dioxide", "leaf"]
+    answers = [(index, " ".join(rng.choice(vocabulary) for _ in range(25))) for index in range(size)]
+    for edits in range(1, 9):
+        words = answers[edits][1].split()
+        for position in rng.sample(range(len(words)), edits):
+            words[position] = "mitochondria"
+        answers.append((size + edits, " ".join(words)))
+    return answers
+
+
+def test_minhash_estimates_jaccard():
+    a = shingles(ORIGINAL)
+    b = shingles(ORIGINAL.replace("glucose", "sugar").replace("water", "H2O"))
+    agreement = float(np.mean(minhash_signature(a) == minhash_signature(b)))
+    assert len(minhash_signature(a)) == NUM_PERM
+    assert abs(agreement - jaccard(a, b)) < 0.15
+    assert np.array_equal(minhash_signature(a), minhash_signature(set(a)))
+
+
+def test_reported_pairs_match_brute_force():
+    answers = cohort()
+    threshold = 0.6
+    expected = {
+        tuple(sorted((id_a, id_b)))
+        for (id_a, text_a), (id_b, text_b) in combinations(answers, 2)
+        if jaccard(shingles(text_a), shingles(text_b)) >= threshold
+    }
+    pairs = find_near_duplicates(answers, threshold)
+    assert expected and {tuple(pair["submission_ids"]) for pair in pairs} == expected
+    for pair in pairs:
+        texts = dict(answers)
+        id_a, id_b = pair["submission_ids"]
+        assert pair["jaccard"] == round(jaccard(shingles(texts[id_a]), shingles(texts[id_b])), 4)
+    assert [pair["jaccard"] for pair in pairs] == sorted((pair["jaccard"] for pair in pairs), reverse=True)
+
+
+def test_lsh_keeps_similar_and_prunes_unrelated_pairs():
+    answers = cohort()
+    sets = [shingles(text) for _, text in answers]
+    candidates = candidate_pairs([minhash_signature(shingle_set) for shingle_set in sets])
+    similar = {(i, j) for i, j in combinations(range(len(sets)), 2) if jaccard(sets[i], sets[j]) >= 0.7}
+    assert similar and similar <= candidates
+    assert len(candidates) < len(sets) * (len(sets) - 1) // 4
+
+
+def test_identical_and_short_answers():
+    pairs = find_near_duplicates([(1, ORIGINAL), (2, ORIGINAL.upper()), (3, "Light energy"), (4, "Light energy")])
+    assert pairs == [{"submission_ids": [1, 2], "jaccard": 1.0, "text_similarity": 1.0}]
+
+
+def test_group_pairs_joins_chains():
+    pairs = [{"submission_ids": ids} for ids in ([1, 2], [5, 6], [2, 3], [9, 3], [7, 8])]
+    assert group_pairs(pairs) == [[1, 2, 3, 9], [5, 6], [7, 8]]
+    assert group_pairs([]) == []
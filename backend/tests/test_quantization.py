@@ -0,0 +1,72 @@
+"""
+Embedding quantization: record sizes, round trips and cosine similarity on stored records.
+"""
+import numpy as np
+import pytest
+
+from grading.quantization import (
+    FORMATS, cosine_similarity, cosine_similarity_matrix, dequantize, paired_cosine_similarity, quantize,
+    record_dtype
+)
+
+DIM = 384
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(3)
+    vectors = rng.standard_normal((50, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def unit_cosines(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return a @ b.T
+
+
+def test_record_sizes():
+    assert [record_dtype(fmt, DIM).itemsize for fmt in FORMATS] == [1536, 768, 388]
+    with pytest.raises(ValueError, match="Unknown embedding format"):
+        record_dtype("bfloat16", DIM)
+
+
+def test_float32_round_trip_is_exact(vectors):
+    np.testing.assert_array_equal(dequantize(quantize(vectors, "float32"), "float32"), vectors)
+
+
+def test_float16_round_trip(vectors):
+    restored = dequantize(quantize(vectors, "float16"), "float16")
+    assert restored.dtype == np.float32
+    np.testing.assert_allclose(restored, vectors, rtol=1e-3, atol=1e-4)
+
+
+def test_int8_round_trip(vectors):
+    records = quantize(vectors, "int8")
+    # Each vector's largest component maps to +-127, and no component is off by more than half a step
+    assert (np.abs(records["codes"]).max(axis=1) == 127).all()
+    restored = dequantize(records, "int8")
+    assert (np.abs(restored - vectors) <= records["scale"][:, np.newaxis] / 2 + 1e-7).all()
+
+
+def test_single_and_zero_vectors():
+    records = quantize(np.zeros(8), "int8")
+    assert records.shape == (1,) and records["scale"][0] == 1.0
+    np.testing.assert_array_equal(dequantize(records, "int8"), np.zeros((1, 8)))
+    assert cosine_similarity(records[0], records[0], "int8") == 0.0
+
+
+@pytest.mark.parametrize("fmt, tolerance", [("float32", 1e-6), ("float16", 1e-3), ("int8", 1e-2)])
+def test_cosine_on_stored_records(vectors, fmt, tolerance):
+    records = quantize(vectors, fmt)
+    expected = unit_cosines(vectors[:10], vectors)
+    np.testing.assert_allclose(cosine_similarity_matrix(records[:10], records, fmt), expected, atol=tolerance)
+    np.testing.assert_allclose(
+        paired_cosine_similarity(records[:25], records[25:], fmt), np.diag(unit_cosines(vectors[:25], vectors[25:])),
+        atol=tolerance
+    )
+    assert cosine_similarity(records[3], records[3], fmt) == pytest.approx(1.0, abs=1e-6)
+    # The per-vector int8 scale cancels out: scaling a vector does not change its similarities
+    np.testing.assert_allclose(
+        cosine_similarity_matrix(quantize(vectors[:10] * 7.5, fmt), records, fmt), expected, atol=tolerance
+    )
@@ -0,0 +1,69 @@
+"""
+SQL statement budgets of the listing endpoints. Each budget holds however many rows are
+listed, so a query per row (N+1) fails the test.
+"""
+from conftest import API
+
+
+def submit_exam(client, headers, exam_id):
+    """Submit an answer to every question of an exam as the given student"""
+    questions = client.get(f"{API}/exams/{exam_id}/questions", headers=headers).json()
+    response = client.post(f"{API}/submissions/exam", headers=headers, json={
+        "exam_id": exam_id,
+        "submissions": [{"question_id": question["id"], "answer": "true"} for question in questions],
+    })
+    assert response.status_code == 201, response.text
+
+
+def test_exam_listing_query_budget(client, teacher_headers, headers, create_exam, query_budget):
+    for _ in range(4):
+        create_exam()
+
+    # The current user, the exams and the questions of all listed exams
+    for user_headers in (teacher_headers, headers):
+        with query_budget(3):
+            response = client.get(f"{API}/exams/", headers=user_headers)
+        assert response.status_code == 200
+        assert len(response.json()) >= 4
+        assert all(exam["questions"] for exam in response.json())
+
+
+def test_exam_results_query_budget(client, auth_headers, teacher_headers, headers, exam_id, query_budget):
+    for student_headers in [headers] + [auth_headers() for _ in range(3)]:
+        submit_exam(client, student_headers, exam_id)
+
+    # The current user, the exam and its results
+    with query_budget(3):
+        response = client.get(f"{API}/submissions/results/exams/{exam_id}", headers=teacher_headers)
+    assert len(response.json()) == 4
+
+    with query_budget(3):
+        response = client.get(f"{API}/submissions/results/exams/{exam_id}", headers=headers)
+    assert len(response.json()) == 1
+
+
+def test_result_listings_query_budget(client, auth_headers, teacher_headers, headers, create_exam, query_budget):
+    for _ in range(3):
+        exam_id = create_exam()
+        submit_exam(client, headers, exam_id)
+        submit_exam(client, auth_headers(), exam_id)
+
+    # The current user and the results
+    for url, user_headers in [
+        (f"{API}/submissions/results/users", headers),
+        (f"{API}/submissions/results/users", teacher_headers),
+        (f"{API}/submissions/results/all", teacher_headers),
+    ]:
+        with query_budget(2):
+            response = client.get(url, headers=user_headers)
+        assert response.status_code == 200
+        assert len(response.json()) >= 3
+
+
+def test_submission_listing_query_budget(client, headers, exam_id, query_budget):
+    submit_exam(client, headers, exam_id)
+
+    # The current user, the exam and the student's submissions
+    with query_budget(3):
+        response = client.get(f"{API}/submissions/student/{exam_id}", headers=headers)
+    assert len(response.json()) == 3
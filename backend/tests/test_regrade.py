@@ -0,0 +1,90 @@
+"""
+Regrading after an answer key change: changed grades, teacher grades and re-totalled results.
+"""
+from conftest import API
+from database import SessionLocal
+from models import Result, Submission
+
+TRUE_FALSE = {"text": "The sky is blue.", "question_type": "true_false", "correct_answer": "true"}
+
+
+def submit(client, headers, exam_id, answers):
+    response = client.post(f"{API}/submissions/exam", headers=headers, json={
+        "exam_id": exam_id,
+        "submissions": [{"question_id": question_id, "answer": answer} for question_id, answer in answers.items()],
+    })
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def question_ids(client, headers, exam_id):
+    return [question["id"] for question in client.get(f"{API}/exams/{exam_id}/questions", headers=headers).json()]
+
+
+def grades(question_id):
+    db = SessionLocal()
+    try:
+        return {row.student_id: (row.points_earned, row.graded_manually) for row in db.query(
+            Submission.student_id, Submission.points_earned, Submission.graded_manually
+        ).filter(Submission.question_id == question_id)}
+    finally:
+        db.close()
+
+
+def results(exam_id):
+    db = SessionLocal()
+    try:
+        return {row.student_id: (row.total_points, row.percentage_score, row.passed) for row in db.query(
+            Result.student_id, Result.total_points, Result.percentage_score, Result.passed
+        ).filter(Result.exam_id == exam_id)}
+    finally:
+        db.close()
+
+
+def test_key_change_regrades_automatic_grades_only(client, auth_headers, teacher_headers, create_exam):
+    exam_id = create_exam([TRUE_FALSE], passing_score=50.0)
+    (question_id,) = question_ids(client, teacher_headers, exam_id)
+    manual, automatic = auth_headers(), auth_headers()
+    manual_result = submit(client, manual, exam_id, {question_id: "true"})
+    automatic_result = submit(client, automatic, exam_id, {question_id: "true"})
+
+    # The teacher overrides one grade by hand
+    manual_submission = client.get(f"{API}/submissions/student/{exam_id}", headers=manual).json()[0]
+    response = client.post(f"{API}/submissions/manual-grade/{manual_submission['id']}", headers=teacher_headers,
+                           params={"is_correct": True, "points_earned": 0.5})
+    assert response.status_code == 200, response.text
+
+    response = client.put(f"{API}/exams/questions/{question_id}", headers=teacher_headers,
+                          json={"correct_answer": "false"})
+    assert response.status_code == 200
+    job = client.get(f"{API}/exams/regrade-jobs/{response.headers['X-Regrade-Job']}", headers=teacher_headers).json()
+    assert job["status"] == "completed"
+    assert job["total_submissions"] == 1 and job["changed_submissions"] == 1
+
+    assert grades(question_id) == {
+        manual_result["student_id"]: (0.5, True),
+        automatic_result["student_id"]: (0.0, False),
+    }
+    assert results(exam_id)[automatic_result["student_id"]] == (0.0, 0.0, False)
+
+
+def test_total_change_retotals_every_result(client, auth_headers, teacher_headers, create_exam):
+    exam_id = create_exam([TRUE_FALSE, {**TRUE_FALSE, "text": "Water is wet."}], passing_score=50.0)
+    first, second = question_ids(client, teacher_headers, exam_id)
+    answered = submit(client, auth_headers(), exam_id, {first: "true", second: "true"})["student_id"]
+    skipped = submit(client, auth_headers(), exam_id, {first: "true"})["student_id"]
+    assert results(exam_id)[skipped] == (1.0, 50.0, True)
+
+    # More points for the second question: the student who skipped it now fails
+    response = client.put(f"{API}/exams/questions/{second}", headers=teacher_headers, json={"points": 3.0})
+    assert response.status_code == 200
+    assert results(exam_id) == {answered: (4.0, 100.0, True), skipped: (1.0, 25.0, False)}
+
+    # A new question lowers every percentage
+    client.post(f"{API}/exams/questions/", headers=teacher_headers,
+                json={**TRUE_FALSE, "exam_id": exam_id, "points": 4.0})
+    assert results(exam_id) == {answered: (4.0, 50.0, True), skipped: (1.0, 12.5, False)}
+
+    # Deleting a question drops its points from both totals
+    assert client.delete(f"{API}/exams/questions/{second}", headers=teacher_headers).status_code == 204
+    assert results(exam_id) == {answered: (1.0, 20.0, False), skipped: (1.0, 20.0, False)}
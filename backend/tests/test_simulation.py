@@ -0,0 +1,65 @@
+"""
+What-if grading simulation: recomputing points from stored component scores.
+"""
+import pytest
+
+from conftest import API
+from grading import simulation
+from grading.engine import grading_engine
+from grading.policy import DEFAULT_POLICY, compile_policy
+from models import Question, QuestionType
+
+KEY = "Photosynthesis converts light energy into chemical energy stored in glucose and releases oxygen"
+ANSWERS = [
+    KEY,
+    KEY.lower() + ".",
+    "Light energy becomes chemical energy in glucose, and oxygen is released",
+    "Plants turn light into chemical energy stored as glucose",
+    "Plants make glucose from light",
+    "The mitochondria",
+    "",
+]
+LENIENT = {"thresholds": [0.6, 0.45, 0.3, 0.15], "credit": [1.0, 0.8, 0.6, 0.3]}
+
+
+@pytest.mark.parametrize("config", [None, LENIENT])
+def test_simulation_reproduces_the_grader(config):
+    policy = compile_policy(config)
+    question = Question(id=1, question_type=QuestionType.DESCRIPTIVE, points=5.0, correct_answer=KEY)
+    grades = [grading_engine.grade(question, answer, policy) for answer in ANSWERS]
+    rows = [(question.points, grade.points_earned, grade.scores) for grade in grades]
+
+    arrays = simulation.score_arrays(rows)
+    proposed = simulation.simulate_points(arrays, policy)
+    assert proposed.tolist() == [grade.points_earned for grade in grades]
+    assert simulation.changed_indices(arrays["current"], proposed) == []
+    # The answers cover full credit, partial credit and none
+    assert {"exact_match", "normalized_match", "empty_answer"} <= {grade.scores["tier"] for grade in grades}
+    assert len(set(proposed.tolist())) >= 3
+
+
+def test_simulate_exam_endpoint(client, auth_headers, teacher_headers, create_exam):
+    exam_id = create_exam([{"text": "What does photosynthesis do?", "question_type": "descriptive",
+                            "correct_answer": KEY, "points": 5.0}])
+    question_id = client.get(f"{API}/exams/{exam_id}/questions", headers=teacher_headers).json()[0]["id"]
+    for answer in ANSWERS[2:6]:
+        response = client.post(f"{API}/submissions/exam", headers=auth_headers(), json={
+            "exam_id": exam_id, "submissions": [{"question_id": question_id, "answer": answer}]
+        })
+        assert response.status_code == 201, response.text
+
+    # The exam's own policy changes nothing
+    response = client.post(f"{API}/submissions/simulate/exams/{exam_id}", headers=teacher_headers, json={})
+    assert response.status_code == 200, response.text
+    unchanged = response.json()
+    assert unchanged["submissions_simulated"] == 4 and unchanged["changes"] == []
+    assert unchanged["distribution"]["current"] == unchanged["distribution"]["proposed"]
+    assert unchanged["proposed_policy"] == DEFAULT_POLICY.to_dict()
+
+    lenient = client.post(f"{API}/submissions/simulate/exams/{exam_id}", headers=teacher_headers, json=LENIENT).json()
+    assert lenient["changes"] and lenient["points_delta"] > 0
+    assert all(change["proposed_points"] > change["current_points"] for change in lenient["changes"])
+
+    invalid = client.post(f"{API}/submissions/simulate/exams/{exam_id}", headers=teacher_headers,
+                          json={"thresholds": [0.5, 0.6, 0.2, 0.1]})
+    assert invalid.status_code == 422
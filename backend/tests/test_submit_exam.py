@@ -0,0 +1,150 @@
+"""
+submit_exam writes its submissions and result with bulk Core inserts. These tests check that
+the stored rows and the response are the same as those of the ORM path (submit_answer) for
+exams mixing choice and text questions.
+"""
+import pytest
+
+from conftest import API
+from config import settings
+from database import SessionLocal
+from grading.budget import breakers
+from models import Result, Submission
+from schemas import ResultResponse
+
+MIXED_QUESTIONS = [
+    {
+        "text": "Which keyword defines a function in Python?",
+        "question_type": "multiple_choice",
+        "points": 2.0,
+        "options": [
+            {"id": "A", "text": "def", "is_correct": True},
+            {"id": "B", "text": "func", "is_correct": False},
+        ],
+        "correct_answer": "A",
+    },
+    {"text": "Tuples are mutable.", "question_type": "true_false", "correct_answer": "false"},
+    {
+        "text": "What does CPU stand for?",
+        "question_type": "short_answer",
+        "points": 2.0,
+        "correct_answer": "central processing unit",
+        "reference_answers": ["the central processor"],
+    },
+    {
+        "text": "Explain what a hash table is.",
+        "question_type": "descriptive",
+        "points": 4.0,
+        "correct_answer": "A hash table stores key value pairs and uses a hash function to compute "
+                          "the index of the bucket where each value is kept, giving fast lookups.",
+    },
+]
+
+ANSWERS = [
+    "A",
+    "true",
+    "central processing unit",
+    "It maps keys to values with a hash function that picks the bucket for each key, so lookups are fast.",
+]
+
+# Columns of a submission that grading determines
+GRADED_COLUMNS = ("question_id", "answer", "is_correct", "points_earned", "grading_feedback", "grading_scores")
+
+
+@pytest.fixture(autouse=True)
+def unlimited_grading_time(monkeypatch):
+    """Grade every answer with all stages, so both paths grade at the same tier"""
+    monkeypatch.setattr(settings, "GRADING_ANSWER_BUDGET_MS", float("inf"))
+    monkeypatch.setattr(settings, "GRADING_SUBMISSION_BUDGET_MS", float("inf"))
+    for breaker in breakers.values():
+        breaker.reset()
+
+
+def graded_submissions(student_exam_filter):
+    db = SessionLocal()
+    try:
+        rows = db.query(*(getattr(Submission, column) for column in GRADED_COLUMNS)).filter(
+            *student_exam_filter
+        ).order_by(Submission.question_id).all()
+        return [row._asdict() for row in rows]
+    finally:
+        db.close()
+
+
+def question_ids(client, headers, exam_id):
+    return [question["id"] for question in client.get(f"{API}/exams/{exam_id}/questions", headers=headers).json()]
+
+
+def test_submit_exam_matches_single_submissions(client, auth_headers, create_exam):
+    exam_id = create_exam(MIXED_QUESTIONS)
+    exam_student, single_student = auth_headers(), auth_headers()
+    ids = question_ids(client, exam_student, exam_id)
+
+    response = client.post(f"{API}/submissions/exam", headers=exam_student, json={
+        "exam_id": exam_id,
+        "submissions": [{"question_id": question_id, "answer": answer} for question_id, answer in zip(ids, ANSWERS)],
+    })
+    assert response.status_code == 201, response.text
+    exam_student_id = response.json()["student_id"]
+
+    for question_id, answer in zip(ids, ANSWERS):
+        single = client.post(f"{API}/submissions/single", headers=single_student, json={
+            "exam_id": exam_id, "question_id": question_id, "answer": answer
+        })
+        assert single.status_code == 201, single.text
+    single_student_id = single.json()["student_id"]
+
+    exam_rows = graded_submissions((Submission.exam_id == exam_id, Submission.student_id == exam_student_id))
+    single_rows = graded_submissions((Submission.exam_id == exam_id, Submission.student_id == single_student_id))
+    assert len(exam_rows) == len(MIXED_QUESTIONS)
+    assert exam_rows == single_rows
+    # Text answers carry their feedback and scores
+    assert all(row["grading_feedback"] and row["grading_scores"] for row in exam_rows[2:])
+
+
+def test_submit_exam_result_row_and_response(client, headers, create_exam):
+    exam_id = create_exam(MIXED_QUESTIONS, passing_score=40.0)
+    ids = question_ids(client, headers, exam_id)
+
+    response = client.post(f"{API}/submissions/exam", headers=headers, json={
+        "exam_id": exam_id,
+        "submissions": [{"question_id": question_id, "answer": answer} for question_id, answer in zip(ids, ANSWERS)],
+    })
+    assert response.status_code == 201, response.text
+    body = response.json()
+
+    db = SessionLocal()
+    try:
+        result = db.query(Result).filter(Result.exam_id == exam_id).one()
+        points = [points for (points,) in db.query(Submission.points_earned).filter(
+            Submission.exam_id == exam_id, Submission.student_id == result.student_id
+        )]
+        # The response is the stored result, as the ORM path returned it
+        assert body == ResultResponse.model_validate(result, from_attributes=True).model_dump(mode="json")
+    finally:
+        db.close()
+
+    # Every question counts towards the total, including descriptive ones
+    possible = sum(question.get("points", 1.0) for question in MIXED_QUESTIONS)
+    assert len(points) == len(MIXED_QUESTIONS)
+    assert body["total_points"] == pytest.approx(sum(points))
+    assert body["percentage_score"] == pytest.approx(sum(points) / possible * 100)
+    assert body["passed"] == (body["percentage_score"] >= 40.0)
+    assert body["started_at"] and body["completed_at"] and body["created_at"]
+
+
+def test_submit_exam_rejects_foreign_question_without_writing(client, headers, exam_id, create_exam):
+    other_question = question_ids(client, headers, create_exam())[0]
+
+    response = client.post(f"{API}/submissions/exam", headers=headers, json={
+        "exam_id": exam_id,
+        "submissions": [{"question_id": other_question, "answer": "true"}],
+    })
+    assert response.status_code == 400
+
+    db = SessionLocal()
+    try:
+        assert db.query(Result).filter(Result.exam_id == exam_id).count() == 0
+        assert db.query(Submission).filter(Submission.exam_id == exam_id).count() == 0
+    finally:
+        db.close()
@@ -10,7 +10,7 @@ from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 
 from config import settings
-from database import get_db
+from database import get_db, get_read_session
 from models import User, UserRole
 
 # Password hashing
@@ -92,9 +92,20 @@ async def get_current_user(
             detail="Inactive user"
         )
 
+    # Tag the session so writes made on behalf of this user can be tracked
+    db.info["user_id"] = user.id
+
     return user
 
 
+def get_read_db(current_user: User = Depends(get_current_user)):
+    """
+    Get a DB session for read-only endpoints.
+    Reads go to the replica, except shortly after the user's own writes.
+    """
+    yield from get_read_session(current_user.id)
+
+
 def check_admin_privileges(user: User) -> None:
     """
     Check if a user has admin privileges.